@@ -6,10 +6,37 @@ expanded Peach's Castle hub with floor-based portals.
 Team Flames / CatSDK
 """
 
+import time
+STARTED = time.perf_counter()   # boot timings are measured from here
+
 import pygame
+import array
+import bisect
+import functools
+import hashlib
+import inspect
+import json
+import linecache
 import math
+import mmap
+import os
+import queue
+import struct
 import sys
-from random import randint, seed
+import threading
+import tracemalloc
+from collections import OrderedDict, namedtuple
+from random import Random
+
+from sm64engine import (BakedMesh, CollectiblePool, Engine, Entity, FixedStep,
+                        FrameProfiler, HeldKeys, LiveInput, Mesh, ProfileCapture,
+                        RandomWalkInput, TextCache, TriggerGrid, compose_card,
+                        make_renderer, show_card)
+
+try:
+    import numpy as np
+except ImportError:  # only recorded in the --bench report
+    np = None
 
 # ============================================================
 # CONFIG
@@ -18,16 +45,57 @@ from random import randint, seed
 WIDTH, HEIGHT = 800, 600
 FPS = 60
 FOV = 500
+# Default far plane: faces past a level's view_distance are not drawn,
+# and fog blends them into the sky from FOG_START of the way there.
 VIEW_DISTANCE = 5000
+FOG_START = 0.7
+# Coins and stars farther than this many view distances from the camera
+# sleep: they are neither animated nor drawn (see sm64engine.entities).
+SLEEP_DISTANCE = 1.5
 
 MOVE_SPEED = 12
 JUMP_FORCE = 18
 GRAVITY = 0.9
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("SM64 PY PORT – ALL MAPS")
-clock = pygame.time.Clock()
+# Simulation runs at a fixed TICK_RATE (the physics constants above are
+# per tick); a slow frame runs up to MAX_CATCHUP_STEPS ticks before the
+# remaining time is dropped.
+TICK_RATE = 60
+MAX_CATCHUP_STEPS = 5
+
+# Approximate bytes of level geometry kept resident before the least
+# recently visited levels are evicted (the current level is always kept).
+LEVEL_CACHE_BYTES = 512 * 1024
+
+# Portal targets within this distance of Mario are preloaded in the
+# background, nearest first.
+PREFETCH_RADIUS = 400
+PREFETCH_MAX_TARGETS = 3
+
+# Cell size of the per-level trigger grid (portals, hazard volumes).
+TRIGGER_CELL = 128
+
+# Floor index: grid cell size, and how far Mario steps up onto a surface
+# above his feet (stairs) without jumping.
+FLOOR_CELL = 128
+STEP_HEIGHT = 24
+
+# Built levels are cached as binary files here and memory-mapped on load.
+USE_BAKED_LEVELS = True
+BAKE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baked")
+
+# --adaptive lets QualityGovernor trade resolution, view distance, detail,
+# fog and polygon budget for frame time, aiming at TARGET_FRAME_MS
+# (--adaptive=MS overrides it).
+TARGET_FRAME_MS = 1000 / FPS
+
+# F4 (or SM64_PROFILE_FRAMES=N in the environment, from the first frame)
+# captures cProfile stats and sampled stacks for PROFILE_FRAMES frames
+# into PROFILE_DIR; see ProfileCapture.
+PROFILE_FRAMES = 120
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+
+CAPTION = "SM64 PY PORT – ALL MAPS"
 
 # ============================================================
 # COLORS
@@ -62,91 +130,14 @@ DARK_PURPLE = (60, 20, 80)
 ICE_BLUE = (180, 220, 255)
 DEEP_BLUE = (10, 30, 80)
 
-PARCHMENT = (245, 235, 205)
-PARCHMENT_BORDER = (190, 150, 100)
-INK = (70, 40, 25)
-
 # ============================================================
 # 3D CORE CLASSES
 # ============================================================
 
-class Vec3:
-    __slots__ = ("x", "y", "z")
-    def __init__(self, x, y, z):
-        self.x, self.y, self.z = x, y, z
-
-class Face:
-    __slots__ = ("idx", "col")
-    def __init__(self, idx, col):
-        self.idx = idx
-        self.col = col
-
-class Mesh:
-    def __init__(self, x=0, y=0, z=0):
-        self.x, self.y, self.z = x, y, z
-        self.yaw = 0
-        self.verts = []
-        self.faces = []
-
-    def cube(self, w, h, d, ox, oy, oz, col):
-        s = len(self.verts)
-        hw, hh, hd = w / 2, h / 2, d / 2
-        pts = [
-            (-hw, -hh, -hd), (hw, -hh, -hd), (hw, hh, -hd), (-hw, hh, -hd),
-            (-hw, -hh, hd), (hw, -hh, hd), (hw, hh, hd), (-hw, hh, hd),
-        ]
-        for px, py, pz in pts:
-            self.verts.append(Vec3(px + ox, py + oy, pz + oz))
-        for f in [
-            [0, 1, 2, 3], [5, 4, 7, 6], [4, 0, 3, 7],
-            [1, 5, 6, 2], [3, 2, 6, 7], [4, 5, 1, 0],
-        ]:
-            self.faces.append(Face([i + s for i in f], col))
-
-    def wedge(self, w, h, d, ox, oy, oz, col):
-        """Triangular prism for ramps/slopes."""
-        s = len(self.verts)
-        hw, hd = w / 2, d / 2
-        self.verts.append(Vec3(-hw + ox, oy, -hd + oz))       # 0 base front-left
-        self.verts.append(Vec3(hw + ox, oy, -hd + oz))        # 1 base front-right
-        self.verts.append(Vec3(hw + ox, oy, hd + oz))         # 2 base back-right
-        self.verts.append(Vec3(-hw + ox, oy, hd + oz))        # 3 base back-left
-        self.verts.append(Vec3(-hw + ox, oy + h, hd + oz))    # 4 top back-left
-        self.verts.append(Vec3(hw + ox, oy + h, hd + oz))     # 5 top back-right
-        for f in [
-            [s, s+1, s+2, s+3],     # bottom
-            [s+3, s+2, s+5, s+4],   # back wall
-            [s, s+3, s+4, s+4],     # left triangle (degenerate quad)
-            [s+1, s+5, s+5, s+2],   # right triangle
-            [s, s+1, s+5, s+4],     # slope face
-        ]:
-            self.faces.append(Face(f, col))
-
-
-def render(mesh, cam, polys):
-    cy = math.cos(mesh.yaw)
-    sy = math.sin(mesh.yaw)
-    for face in mesh.faces:
-        pts = []
-        avgz = 0
-        for i in face.idx:
-            v = mesh.verts[i]
-            rx = v.x * cy - v.z * sy
-            rz = v.x * sy + v.z * cy
-            ry = v.y
-            wx = rx + mesh.x - cam["x"]
-            wy = ry + mesh.y - cam["y"]
-            wz = rz + mesh.z - cam["z"]
-            if wz <= 1:
-                break
-            scale = FOV / wz
-            sx = wx * scale + WIDTH // 2
-            syy = -wy * scale + HEIGHT // 2
-            pts.append((sx, syy))
-            avgz += wz
-        else:
-            avgz /= len(pts)
-            polys.append((avgz, pts, face.col))
+# Mesh and BakedMesh come from sm64engine, shared with the other
+# ports. The backend (SM64_RENDERER=python|numpy) does the
+# per-vertex and per-face work of every frame.
+RENDERER = make_renderer((WIDTH, HEIGHT), FOV)
 
 
 # ============================================================
@@ -171,6 +162,8 @@ class Mario(Mesh):
         self.cube(12, 15, 12, 8, 0, 0, BLUE)
 
     def update(self, floor_y=0):
+        # Anything up to STEP_HEIGHT above his feet is stepped onto
+        # (callers pass the floor found under y + STEP_HEIGHT).
         self.dy -= GRAVITY
         self.y += self.dy
         if self.y < floor_y:
@@ -182,26 +175,85 @@ class Mario(Mesh):
             self.dy = JUMP_FORCE
 
 
-class Coin(Mesh):
+class Coin(Entity):
     def __init__(self, x, y, z):
         super().__init__(x, y, z)
         self.cube(20, 5, 20, 0, 0, 0, YELLOW)
-        self.spin = 0
 
-    def animate(self):
-        self.spin += 0.05
-        self.yaw = self.spin
+    @staticmethod
+    def animate(entities):
+        """Spin every awake coin in ``entities``."""
+        entities.spin(0.05)
 
 
-class Star(Mesh):
+class Star(Entity):
     def __init__(self, x, y, z):
         super().__init__(x, y, z)
         self.cube(15, 15, 15, 0, 7.5, 0, GOLD)
-        self.bob = 0
 
-    def animate(self):
-        self.bob += 0.03
-        self.y += math.sin(self.bob) * 0.5
+    @staticmethod
+    def animate(entities):
+        """Bob every awake star in ``entities`` up and down."""
+        entities.bob(0.03, 0.5)
+
+
+# ============================================================
+# FLOOR INDEX (stacked walkable surfaces)
+# ============================================================
+
+def surface_height(surf, z):
+    x1, x2, z1, z2, y0, y1 = surf
+    if y0 == y1 or z2 == z1:
+        return y0
+    return y0 + (y1 - y0) * (z - z1) / (z2 - z1)
+
+
+class FloorIndex:
+    """Walkable surfaces bucketed into an XZ grid, sorted by height per cell.
+
+    Built once per level from the terrain's cube tops and wedge slopes.
+    ``floor_at`` bisects the cell's surfaces on their lowest point and
+    walks down from there, stopping as soon as nothing lower can beat the
+    best hit, so stacked interiors cost O(log k) per query.
+    """
+
+    def __init__(self, surfaces, cell=FLOOR_CELL):
+        self.cell = cell
+        buckets = {}
+        for surf in surfaces:
+            x1, x2, z1, z2 = surf[:4]
+            for cx in range(math.floor(x1 / cell), math.floor(x2 / cell) + 1):
+                for cz in range(math.floor(z1 / cell), math.floor(z2 / cell) + 1):
+                    buckets.setdefault((cx, cz), []).append(surf)
+        self.cells = {}
+        for key, surfs in buckets.items():
+            surfs.sort(key=lambda s: min(s[4], s[5]))
+            lows = [min(s[4], s[5]) for s in surfs]
+            highs = []      # running max of each surface's highest point
+            top = -math.inf
+            for s in surfs:
+                top = max(top, s[4], s[5])
+                highs.append(top)
+            self.cells[key] = (lows, highs, surfs)
+
+    def floor_at(self, x, y, z):
+        """Height of the highest surface under (x, z) at or below y, or None."""
+        c = self.cell
+        entry = self.cells.get((math.floor(x / c), math.floor(z / c)))
+        if entry is None:
+            return None
+        lows, highs, surfs = entry
+        best = None
+        for j in range(bisect.bisect_right(lows, y) - 1, -1, -1):
+            if best is not None and best >= highs[j]:
+                break
+            surf = surfs[j]
+            if not (surf[0] <= x <= surf[1] and surf[2] <= z <= surf[3]):
+                continue
+            h = surface_height(surf, z)
+            if h <= y and (best is None or h > best):
+                best = h
+        return best
 
 
 # ============================================================
@@ -210,22 +262,40 @@ class Star(Mesh):
 
 class Level:
     def __init__(self, name, terrain, stars, coins, entry_point=(0, 0, 400),
-                 sky_color=DD_SKY, floor_y=0):
+                 sky_color=DD_SKY, floor_y=0, view_distance=VIEW_DISTANCE):
         self.name = name
         self.terrain = terrain
-        self.stars = stars
-        self.coins = coins
+        sleep = view_distance * SLEEP_DISTANCE
+        self.stars = CollectiblePool(stars, 50, 50, Star.animate, sleep)
+        self.coins = CollectiblePool(coins, 40, 40, Coin.animate, sleep)
         self.entry_point = entry_point
         self.portals = []
+        self.triggers = TriggerGrid(TRIGGER_CELL)
         self.sky_color = sky_color
         self.floor_y = floor_y
+        self.view_distance = view_distance
+        self.floors = FloorIndex(terrain.surfaces)
 
     def add_portal(self, x1, x2, z1, z2, target_level, spawn):
-        self.portals.append({
+        portal = {
             "rect": (x1, x2, z1, z2),
             "target": target_level,
             "spawn": spawn,
-        })
+        }
+        self.portals.append(portal)
+        self.triggers.add("portal", x1, x2, z1, z2, data=portal)
+
+    def floor_at(self, x, y, z):
+        """Floor Mario stands on at (x, y, z); never below ``floor_y``."""
+        t = self.terrain
+        h = self.floors.floor_at(x - t.x, y + STEP_HEIGHT - t.y, z - t.z)
+        if h is None:
+            return self.floor_y
+        return max(h + t.y, self.floor_y)
+
+    def add_trigger(self, kind, x1, x2, z1, z2, y1=-math.inf, y2=math.inf, data=None):
+        """Register a trigger volume (hazard, switch, ...) of any kind."""
+        return self.triggers.add(kind, x1, x2, z1, z2, y1, y2, data)
 
 
 # ============================================================
@@ -233,10 +303,10 @@ class Level:
 # ============================================================
 
 def scatter_coins(n, xr, zr, y=20, s=42):
-    seed(s)
-    c = [Coin(randint(-xr, xr), y, randint(-zr, zr)) for _ in range(n)]
-    seed()
-    return c
+    # Private generator: levels may be built on the prefetch thread, so the
+    # global random state must not be reseeded here.
+    rng = Random(s)
+    return [Coin(rng.randint(-xr, xr), y, rng.randint(-zr, zr)) for _ in range(n)]
 
 
 # ============================================================
@@ -898,7 +968,9 @@ def make_rainbow_ride():
         Star(200, 180, -300), Star(-200, 280, 200), Star(100, 520, -100),
     ]
     coins = scatter_coins(8, 400, 400, 200, 15)
-    lv = Level("Rainbow Ride", t, stars, coins, (0, 60, 0), (120, 140, 220))
+    # Open sky: nothing far off is worth drawing
+    lv = Level("Rainbow Ride", t, stars, coins, (0, 60, 0), (120, 140, 220),
+               view_distance=2500)
     _return_portal(lv)
     return lv
 
@@ -983,7 +1055,8 @@ def make_bowser_in_the_sky():
 
     stars = [Star(0, 810, 200)]
     coins = scatter_coins(5, 300, 300, 100, 102)
-    lv = Level("Bowser in the Sky", t, stars, coins, (0, 30, 400), (80, 60, 120))
+    lv = Level("Bowser in the Sky", t, stars, coins, (0, 30, 400), (80, 60, 120),
+               view_distance=3000)
     _return_portal(lv)
     return lv
 
@@ -1113,30 +1186,561 @@ def make_princess_slide():
 
 
 # ============================================================
-# UI: Dear Mario card
+# STRESS LEVELS (seeded synthetic geometry for --bench --stress)
 # ============================================================
+# Not reachable in play and never baked: they only exist to show how
+# the renderers scale far past the few hundred cubes of a real course.
+
+STRESS_KINDS = ("field", "city", "tower", "coins")
+STRESS_CUBES = (1000, 4000, 16000)
+
+
+def _stress_field(t, rng, n):
+    """Low blocks and ramps scattered over an open plain."""
+    side = int(140 * math.sqrt(n))
+    t.cube(side, 20, side, 0, -10, 0, GREEN)
+    for _ in range(n - 1):
+        x, z = rng.uniform(-side / 2, side / 2), rng.uniform(-side / 2, side / 2)
+        w, h = rng.randint(30, 90), rng.randint(10, 120)
+        g = rng.randint(90, 170)
+        if rng.random() < 0.25:
+            t.wedge(w, h, w, x, 0, z, (g, g - 20, 60))
+        else:
+            t.cube(w, h, w, x, h / 2, z, (40, g, 40))
+    return side
+
+
+def _stress_city(t, rng, n):
+    """Blocks of tall buildings between streets, like Wet-Dry World's."""
+    lots = max(1, int(math.sqrt(n / 2)))     # a building and a roof per lot
+    lot = 160
+    side = lots * lot + (lots // 4 + 1) * 80
+    t.cube(side, 10, side, 0, -5, 0, (90, 90, 100))
+    placed = 1
+    for i in range(lots):
+        for j in range(lots):
+            if placed >= n:
+                return side
+            # A street after every fourth lot
+            x = -side / 2 + 80 * (i // 4 + 1) + lot * (i + 0.5)
+            z = -side / 2 + 80 * (j // 4 + 1) + lot * (j + 0.5)
+            w, h = rng.randint(80, 140), rng.randint(100, 800)
+            shade = rng.randint(120, 200)
+            t.cube(w, h, w, x, h / 2, z, (shade, shade, shade + 20))
+            t.cube(w * 0.6, 20, w * 0.6, x, h + 10, z, (shade - 40, shade - 40, shade - 20))
+            placed += 2
+    return side
+
+
+def _stress_tower(t, rng, n):
+    """Storeys of walls, gear platforms and ramps stacked into a tower,
+    like Tick Tock Clock's. The front is open, so climb() looks in."""
+    storeys = max(1, int(math.sqrt(n)))
+    per = max(1, (n - 1) // storeys - 3)     # besides the three walls
+    side = max(600, int(60 * math.sqrt(per)))
+    t.cube(side, 10, side, 0, -5, 0, CLOCK_BRONZE)
+    half = side / 2
+    for s in range(storeys):
+        y = s * 100
+        for x, z, w, d in ((-half, 0, 20, side), (half, 0, 20, side),
+                           (0, half, side, 20)):
+            t.cube(w, 100, d, x, y + 50, z, (100, 90, 70))
+        for _ in range(per):
+            x, z = rng.uniform(-half + 60, half - 60), rng.uniform(-half + 60, half - 60)
+            w = rng.randint(40, 120)
+            if rng.random() < 0.2:
+                t.wedge(w, 100, w, x, y, z, (140, 100, 40))
+            else:
+                t.cube(w, 15, w, x, y + rng.randint(10, 90), z, CLOCK_BRONZE)
+    return side
+
+
+def _stress_coins(t, rng, n):
+    """A bare floor; the coins are the load."""
+    side = int(80 * math.sqrt(n))
+    t.cube(side, 20, side, 0, -10, 0, LIGHT_GREEN)
+    return side
+
+
+def make_stress_level(kind, cubes, seed=0):
+    """A synthetic level of about ``cubes`` boxes of the given STRESS_KINDS
+    structure; the same arguments always build the same level.
+
+    Terrain kinds spread their boxes over a floor sized to keep the
+    density of a real course, and carry a coin per hundred boxes. The
+    "coins" kind is a bare floor with ``cubes`` coins (each a one-box
+    entity) and a star per hundred.
+    """
+    builders = {"field": _stress_field, "city": _stress_city,
+                "tower": _stress_tower, "coins": _stress_coins}
+    if kind not in builders:
+        raise ValueError(f"unknown stress kind {kind!r} "
+                         f"(choose from {', '.join(STRESS_KINDS)})")
+    rng = Random(seed)
+    t = Mesh()
+    build = builders[kind]
+    side = build(t, rng, cubes)
+    r = side / 2 - 20
+    n_coins = cubes if kind == "coins" else cubes // 100
+    coins = [Coin(rng.uniform(-r, r), 20, rng.uniform(-r, r)) for _ in range(n_coins)]
+    stars = [Star(rng.uniform(-r, r), rng.randint(20, 400), rng.uniform(-r, r))
+             for _ in range(n_coins // 100)]
+    return Level(f"Stress {kind} {cubes}", t, stars, coins, (0, 0, side / 2))
 
-def dear_card():
-    title = pygame.font.SysFont("Times New Roman", 34, bold=True)
-    body = pygame.font.SysFont("Times New Roman", 24)
 
-    fade = 0
-    while True:
-        dt = clock.tick(FPS)
-        fade = min(255, fade + dt * 0.7)
+# ============================================================
+# LEVEL REGISTRY (lazy construction + LRU eviction)
+# ============================================================
 
-        for e in pygame.event.get():
-            if e.type == pygame.QUIT:
-                pygame.quit(); sys.exit()
-            if e.type == pygame.KEYDOWN and e.key in (pygame.K_RETURN, pygame.K_SPACE):
+LEVEL_BUILDERS = {
+    "Peach's Castle": make_castle,
+    # 15 courses
+    "Bob-omb Battlefield": make_bobomb_battlefield,
+    "Whomp's Fortress": make_whomps_fortress,
+    "Jolly Roger Bay": make_jolly_roger_bay,
+    "Cool Cool Mountain": make_cool_cool_mountain,
+    "Big Boo's Haunt": make_big_boos_haunt,
+    "Hazy Maze Cave": make_hazy_maze_cave,
+    "Lethal Lava Land": make_lethal_lava_land,
+    "Shifting Sand Land": make_shifting_sand_land,
+    "Dire Dire Docks": make_dire_dire_docks,
+    "Snowman's Land": make_snowmans_land,
+    "Wet-Dry World": make_wet_dry_world,
+    "Tall Tall Mountain": make_tall_tall_mountain,
+    "Tiny-Huge Island": make_tiny_huge_island,
+    "Tick Tock Clock": make_tick_tock_clock,
+    "Rainbow Ride": make_rainbow_ride,
+    # 3 Bowser stages
+    "Bowser Dark World": make_bowser_dark_world,
+    "Bowser Fire Sea": make_bowser_fire_sea,
+    "Bowser in the Sky": make_bowser_in_the_sky,
+    # 5 secret areas
+    "Wing Cap Tower": make_wing_cap_tower,
+    "Metal Cap Cavern": make_metal_cap_cavern,
+    "Vanish Cap Ruins": make_vanish_cap_ruins,
+    "Secret Aquarium": make_secret_aquarium,
+    "Princess Slide": make_princess_slide,
+}
+
+
+def _mesh_bytes(mesh):
+    if isinstance(mesh, BakedMesh):
+        return mesh.nbytes
+    total = sys.getsizeof(mesh.verts) + sys.getsizeof(mesh.faces)
+    for v in mesh.verts:
+        total += sys.getsizeof(v)
+    for f in mesh.faces:
+        total += sys.getsizeof(f) + sys.getsizeof(f.idx)
+    return total
+
+
+def level_bytes(level):
+    """Rough resident size of a level's meshes, used for the cache budget."""
+    total = _mesh_bytes(level.terrain)
+    for pool in (level.coins, level.stars):
+        for obj in pool:
+            total += _mesh_bytes(obj)
+    return total
+
+
+def make_registry(budget=LEVEL_CACHE_BYTES):
+    """Registry over every level, loading from bakes when enabled."""
+    builders = LEVEL_BUILDERS
+    if USE_BAKED_LEVELS:
+        builders = {n: baked_builder(n, b) for n, b in builders.items()}
+    return LevelRegistry(builders, budget)
+
+
+class LevelRegistry:
+    """Builds levels the first time they are requested.
+
+    Levels are kept in least-recently-visited order and evicted once the
+    resident total exceeds ``budget`` bytes; the level last returned by
+    ``get`` is never evicted. Which coins and stars were collected is
+    remembered per level, so an evicted level comes back without them
+    when it is rebuilt. ``load`` may be called from a worker thread.
+    """
+
+    def __init__(self, builders, budget=LEVEL_CACHE_BYTES):
+        self.builders = builders
+        self.budget = budget
+        self.resident = OrderedDict()   # name -> (level, bytes)
+        self.collected = {}             # name -> (coin ids, star ids)
+        self.current = None
+        self.builds = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._building = {}             # name -> Event set when built
+
+    def __contains__(self, name):
+        return name in self.builders
+
+    def is_resident(self, name):
+        return name in self.resident
+
+    def get(self, name):
+        """Return the named level, building it if needed; None if unknown."""
+        level = self.load(name)
+        if level is not None:
+            with self._lock:
+                self.current = name
+                self.resident.move_to_end(name)
+                self.evict()
+        return level
+
+    def load(self, name):
+        """Make the named level resident without making it current."""
+        while True:
+            with self._lock:
+                entry = self.resident.get(name)
+                if entry is not None:
+                    return entry[0]
+                if name not in self.builders:
+                    return None
+                pending = self._building.get(name)
+                if pending is None:
+                    pending = self._building[name] = threading.Event()
+                    break
+            # Another thread is already building it; wait and re-check
+            pending.wait()
+
+        try:
+            level = self.build(name)
+            size = level_bytes(level)
+            with self._lock:
+                self.resident[name] = (level, size)
+                self.evict(keep=name)
+        finally:
+            with self._lock:
+                del self._building[name]
+            pending.set()
+        return level
+
+    def build(self, name):
+        level = self.builders[name]()
+        self.builds += 1
+        # Builders always produce collectibles in the same order, so pool
+        # indices identify them across rebuilds.
+        coin_ids, star_ids = self.collected.get(name, ((), ()))
+        for i in coin_ids:
+            level.coins.kill(i)
+        for i in star_ids:
+            level.stars.kill(i)
+        return level
+
+    def evict(self, keep=None):
+        """Drop least recently visited levels until back under budget.
+
+        The current level and ``keep`` are spared. Must be called with the
+        registry lock held.
+        """
+        used = sum(size for _, size in self.resident.values())
+        for name in list(self.resident):
+            if used <= self.budget:
+                break
+            if name == self.current or name == keep:
+                continue
+            level, size = self.resident.pop(name)
+            self.remember(name, level)
+            self.evictions += 1
+            used -= size
+
+    def remember(self, name, level):
+        self.collected[name] = (level.coins.dead(), level.stars.dead())
+
+
+# ============================================================
+# BAKED LEVELS (binary cache, memory-mapped on load)
+# ============================================================
+#
+# File layout (native byte order, recorded in the metadata):
+#   header       BAKE_HEADER: magic, source key, metadata length, counts
+#   metadata     UTF-8 JSON: name, entry point, sky, floor, portals,
+#                star/coin positions, colour palette, terrain radius;
+#                padded to 4 bytes
+#   xyz          float32 x n_verts * 3
+#   index        uint32  x n_index
+#   starts       uint32  x (n_faces + 1)
+#   surfaces     float32 x n_surfaces * 6   (walkable tops, see Mesh)
+#   colors       uint16  x n_faces   (palette index per face)
+
+BAKE_MAGIC = b"SM64LVL4"
+BAKE_HEADER = struct.Struct("<8s32sIIIII")
+
+# Everything a builder's output depends on besides its own body; editing
+# any of these invalidates every bake.
+_BAKE_DEPENDENCIES = ("Mesh", "Level", "Coin", "Star", "scatter_coins",
+                      "_return_portal", "CollectiblePool", "FloorIndex")
+
+
+def _source(obj):
+    # getsource() on a class re-parses the whole module; hashing its
+    # methods one by one is just as good and far cheaper.
+    if isinstance(obj, type):
+        return obj.__name__ + "".join(
+            _source(v) for _, v in sorted(vars(obj).items())
+            if inspect.isfunction(v))
+    return inspect.getsource(obj)
+
+
+_bake_keys = {}
+
+
+def bake_key(builder):
+    """Digest of the builder's source plus the helpers it builds with."""
+    key = _bake_keys.get(builder)
+    if key is None:
+        h = hashlib.sha256(BAKE_MAGIC)
+        g = globals()
+        for obj in (builder,) + tuple(g[n] for n in _BAKE_DEPENDENCIES):
+            h.update(_source(obj).encode("utf-8"))
+        key = _bake_keys[builder] = h.digest()
+    return key
+
+
+def bake_path(name):
+    slug = "".join(ch if ch.isalnum() else "_" for ch in name.lower())
+    return os.path.join(BAKE_DIR, slug + ".lvl")
+
+
+def bake_level(level, key, path):
+    """Serialize a built level to ``path``."""
+    t = level.terrain
+    xyz = array.array("f")
+    for v in t.verts:
+        xyz.extend((v.x, v.y, v.z))
+    index = array.array("I")
+    starts = array.array("I", [0])
+    colors = array.array("H")
+    palette = {}
+    for face in t.faces:
+        index.extend(face.idx)
+        starts.append(len(index))
+        colors.append(palette.setdefault(tuple(face.col), len(palette)))
+    surfaces = array.array("f")
+    for surf in t.surfaces:
+        surfaces.extend(surf)
+
+    meta = json.dumps({
+        "byteorder": sys.byteorder,
+        "name": level.name,
+        "entry_point": level.entry_point,
+        "sky_color": level.sky_color,
+        "floor_y": level.floor_y,
+        "view_distance": level.view_distance,
+        "portals": level.portals,
+        "stars": [(o.x, o.y, o.z) for o in level.stars.items],
+        "coins": [(o.x, o.y, o.z) for o in level.coins.items],
+        "palette": list(palette),
+        # Measured on the float32 copy, so it bounds the mapped vertices
+        "radius": math.sqrt(max(
+            (x * x + y * y + z * z for x, y, z in zip(xyz[0::3], xyz[1::3], xyz[2::3])),
+            default=0)),
+    }).encode("utf-8")
+    meta += b" " * (-len(meta) % 4)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(BAKE_HEADER.pack(BAKE_MAGIC, key, len(meta), len(t.verts),
+                                     len(index), len(colors), len(t.surfaces)))
+            f.write(meta)
+            for arr in (xyz, index, starts, surfaces, colors):
+                f.write(arr.tobytes())
+        os.replace(tmp, path)
+    except OSError:
+        # Don't leave a half-written file behind (e.g. on a full disk)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load_baked_level(path, key):
+    """Map a baked level file; returns None if missing, stale or damaged."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(BAKE_HEADER.size)
+            if len(head) < BAKE_HEADER.size:
+                return None
+            (magic, file_key, meta_len,
+             n_verts, n_index, n_faces, n_surfaces) = BAKE_HEADER.unpack(head)
+            if magic != BAKE_MAGIC or file_key != key:
+                return None
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        return _map_level(mm, meta_len, n_verts, n_index, n_faces, n_surfaces)
+    except (ValueError, KeyError, TypeError):
+        # A truncated body or a metadata block that isn't ours
+        return None
+
+
+def _map_level(mm, meta_len, n_verts, n_index, n_faces, n_surfaces):
+    pos = BAKE_HEADER.size
+    meta = json.loads(bytes(mm[pos:pos + meta_len]))
+    if meta["byteorder"] != sys.byteorder:
+        return None
+    pos += meta_len
+
+    view = memoryview(mm)
+    arrays = []
+    for fmt, count in (("f", n_verts * 3), ("I", n_index), ("I", n_faces + 1),
+                       ("f", n_surfaces * 6), ("H", n_faces)):
+        size = struct.calcsize(fmt) * count
+        if pos + size > len(view):
+            raise ValueError("baked level is truncated")
+        arrays.append(view[pos:pos + size].cast(fmt))
+        pos += size
+    xyz, index, starts, surfaces, colors = arrays
+
+    terrain = BakedMesh(xyz, index, starts, colors,
+                        [tuple(c) for c in meta["palette"]],
+                        [tuple(surfaces[i:i + 6]) for i in range(0, len(surfaces), 6)],
+                        meta["radius"])
+    level = Level(meta["name"], terrain,
+                  [Star(*p) for p in meta["stars"]],
+                  [Coin(*p) for p in meta["coins"]],
+                  tuple(meta["entry_point"]), tuple(meta["sky_color"]),
+                  meta["floor_y"], meta["view_distance"])
+    for p in meta["portals"]:
+        x1, x2, z1, z2 = p["rect"]
+        level.add_portal(x1, x2, z1, z2, p["target"], tuple(p["spawn"]))
+    return level
+
+
+def baked_builder(name, builder):
+    """Wrap a make_* builder so it loads from, or refreshes, the bake.
+
+    The bake is only a cache: if it can't be written (a read-only
+    install, say) or read back, the level built in memory is returned.
+    """
+    def build():
+        key = bake_key(builder)
+        path = bake_path(name)
+        level = load_baked_level(path, key)
+        if level is None:
+            level = builder()
+            try:
+                bake_level(level, key, path)
+            except OSError:
+                return level
+            level = load_baked_level(path, key) or level
+        return level
+    return build
+
+
+def refresh_bake(name, builder):
+    """Rewrite the named level's bake if missing or stale; True if it was
+    rewritten.
+
+    Only the header is read, so a fresh bake costs one small file read.
+    """
+    key = bake_key(builder)
+    path = bake_path(name)
+    try:
+        with open(path, "rb") as f:
+            head = f.read(BAKE_HEADER.size)
+    except OSError:
+        head = b""
+    if len(head) == BAKE_HEADER.size and BAKE_HEADER.unpack(head)[:2] == (BAKE_MAGIC, key):
+        return False
+    try:
+        bake_level(builder(), key, path)
+    except OSError:
+        return False    # the cache can't be written; levels build in memory
+    return True
+
+
+def bake_all(builders=None):
+    """Rebuild and write every level's bake file."""
+    for name, builder in (builders or LEVEL_BUILDERS).items():
+        path = bake_path(name)
+        bake_level(builder(), bake_key(builder), path)
+        print(f"baked {name} -> {os.path.relpath(path)}")
+
+
+# ============================================================
+# PORTAL PREFETCHER
+# ============================================================
+
+class PortalPrefetcher:
+    """Loads the portal targets nearest to Mario on a worker thread.
+
+    ``update`` is called once per tick with Mario's position; every portal
+    within ``radius`` of him (distance to its rectangle on the XZ plane)
+    queues its target, nearest first, up to ``max_targets`` at a time.
+    ``enter`` performs the actual level switch and counts a hit when the
+    target was already resident, a miss when it had to be built inline.
+    """
+
+    def __init__(self, registry, radius=PREFETCH_RADIUS,
+                 max_targets=PREFETCH_MAX_TARGETS):
+        self.registry = registry
+        self.radius = radius
+        self.max_targets = max_targets
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.queued = set()
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self._work, name="level-prefetch",
+                                       daemon=True)
+        self.worker.start()
+
+    def update(self, level, x, z):
+        near = sorted((d, t.data["target"]) for d, t in
+                      level.triggers.near(x, z, self.radius, "portal"))
+        for _, name in near[:self.max_targets]:
+            if (name in self.registry and name not in self.queued
+                    and not self.registry.is_resident(name)):
+                self.queued.add(name)
+                self.requests.put(name)
+
+    def enter(self, name):
+        """Switch to a portal target, recording whether it was ready."""
+        if self.registry.is_resident(name):
+            self.hits += 1
+        else:
+            self.misses += 1
+        return self.registry.get(name)
+
+    def stop(self):
+        self.requests.put(None)
+        self.worker.join()
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0
+        return (f"prefetch: {self.hits} hits, {self.misses} misses "
+                f"({rate:.0f}% hit rate), {self.prefetched} levels preloaded")
+
+    def _work(self):
+        while True:
+            name = self.requests.get()
+            if name is None:
                 return
+            if self.registry.load(name) is not None:
+                self.prefetched += 1
+            self.queued.discard(name)
 
-        screen.fill(DD_SKY)
-        card = pygame.Surface((580, 380), pygame.SRCALPHA)
-        card.fill(PARCHMENT)
-        pygame.draw.rect(card, PARCHMENT_BORDER, card.get_rect(), 6)
 
-        card.blit(title.render("Dear Mario,", True, INK), (40, 30))
+# ============================================================
+# UI: Dear Mario card
+# ============================================================
+
+_dear_cards = {}
+
+
+def compose_dear_card(engine):
+    """The parchment card with its text, composited once and cached."""
+    card = _dear_cards.get("card")
+    if card is None:
+        title = engine.font("Times New Roman", 34, bold=True)
+        body = engine.font("Times New Roman", 24)
         lines = [
             "You're invited to Peach's Castle!",
             "Please come right away!",
@@ -1147,33 +1751,47 @@ def dear_card():
             "",
             "  — Peach",
         ]
-        for i, line in enumerate(lines):
-            card.blit(body.render(line, True, INK), (40, 80 + i * 32))
+        card = _dear_cards["card"] = compose_card(
+            (580, 380), [(title, "Dear Mario,", (40, 30))]
+            + [(body, line, (40, 80 + i * 32)) for i, line in enumerate(lines)])
+    return card
 
-        card.set_alpha(int(fade))
-        screen.blit(card, (110, 110))
-        pygame.display.flip()
+
+def dear_card(engine):
+    if not show_card(engine, compose_dear_card(engine), DD_SKY, (110, 110)):
+        pygame.quit(); sys.exit()
 
 
 # ============================================================
 # MENU
 # ============================================================
 
-def menu():
-    title_font = pygame.font.SysFont("Arial", 48, bold=True)
-    sub_font = pygame.font.SysFont("Arial", 22)
-    prompt_font = pygame.font.SysFont("Arial", 28, bold=True)
+def menu(engine, boot=None):
+    """Title screen; with ``boot``, shown while startup work finishes.
+
+    Start is only accepted once ``boot`` is ready; until then a progress
+    bar replaces the prompt and ``boot.frame()`` runs after every flip.
+    """
+    screen = engine.screen
     t = 0
 
     while True:
-        clock.tick(FPS)
+        engine.clock.tick(FPS)
         t += 1
+        ready = boot is None or boot.ready
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
                 pygame.quit(); sys.exit()
-            if e.type == pygame.KEYDOWN and e.key in (pygame.K_RETURN, pygame.K_SPACE):
+            if (e.type == pygame.KEYDOWN and ready
+                    and e.key in (pygame.K_RETURN, pygame.K_SPACE)):
                 return
 
+        # Until Boot has resolved the real faces this draws with the
+        # bundled font, which needs no system font scan.
+        title_font = engine.font_or_default("Arial", 48, bold=True)
+        sub_font = engine.font_or_default("Arial", 22)
+        prompt_font = engine.font_or_default("Arial", 28, bold=True)
+
         screen.fill(DD_SKY)
 
         # Animated stars background
@@ -1193,43 +1811,252 @@ def menu():
         credits = sub_font.render("Team Flames / CatSDK", True, (180, 180, 180))
         screen.blit(credits, (WIDTH // 2 - credits.get_width() // 2, 240))
 
-        # Blinking prompt
-        if (t // 30) % 2 == 0:
+        if not ready:
+            # Loading bar in place of the prompt
+            bar = pygame.Rect(WIDTH // 2 - 150, 350, 300, 12)
+            pygame.draw.rect(screen, (80, 80, 120), bar, 1)
+            fill = bar.inflate(-4, -4)
+            fill.width = int(fill.width * boot.progress)
+            pygame.draw.rect(screen, GOLD, fill)
+            status = sub_font.render(boot.status, True, (180, 180, 180))
+            screen.blit(status, (WIDTH // 2 - status.get_width() // 2, 372))
+        elif (t // 30) % 2 == 0:
+            # Blinking prompt
             prompt = prompt_font.render("PRESS START", True, WHITE)
             screen.blit(prompt, (WIDTH // 2 - prompt.get_width() // 2, 340))
 
         pygame.display.flip()
+        if boot is not None:
+            boot.frame()
 
 
 # ============================================================
 # HUD
 # ============================================================
 
-def draw_hud(mario, level_name, show_map):
-    font = pygame.font.SysFont("Arial", 22, bold=True)
-    small = pygame.font.SysFont("Arial", 16)
+_hud_text = TextCache()
 
-    # Star counter
-    star_txt = font.render(f"Stars: {mario.stars}", True, GOLD)
-    screen.blit(star_txt, (20, 15))
 
-    # Coin counter
-    coin_txt = font.render(f"Coins: {mario.coins}", True, YELLOW)
-    screen.blit(coin_txt, (20, 42))
+def draw_hud(engine, stars, coins, health, level_name):
+    screen = engine.screen
+    font = engine.font("Arial", 22, bold=True)
+    small = engine.font("Arial", 16)
+    text = _hud_text.blit
 
-    # Health
-    health_txt = font.render(f"HP: {mario.health}", True, RED)
-    screen.blit(health_txt, (20, 69))
+    # Star, coin and health counters
+    text(screen, font, f"Stars: {stars}", GOLD, (20, 15))
+    text(screen, font, f"Coins: {coins}", YELLOW, (20, 42))
+    text(screen, font, f"HP: {health}", RED, (20, 69))
 
     # Level name
-    name_txt = font.render(level_name, True, WHITE)
+    name_txt = _hud_text.render(font, level_name, WHITE)
     screen.blit(name_txt, (WIDTH - name_txt.get_width() - 20, 15))
 
     # Controls hint
-    hint = small.render("WASD=Move  Space=Jump  M=Map  Esc=Quit", True, (160, 160, 160))
+    hint = _hud_text.render(
+        small, "WASD=Move  Space=Jump  M=Map  F3=Profiler  F4=Capture  Esc=Quit",
+        (160, 160, 160))
     screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 28))
 
 
+def hud_state(mario, level):
+    """draw_hud's arguments after ``engine``, copied out of the game."""
+    return mario.stars, mario.coins, mario.health, level.name
+
+
+# ============================================================
+# FRAME
+# ============================================================
+# A frame is built (projected, culled and sorted into a RenderList) and
+# then presented (filled, HUD drawn). Only presenting touches the screen,
+# and a RenderList holds copies, so a frame can be drawn while the game
+# has already moved on (see PIPELINE).
+
+FRAME_STAGES = ("transform", "cull", "sort", "draw", "hud")
+
+# polys: sorted (depth, points, color) tuples; fog: as for Renderer.draw;
+# faces/culled: submitted and dropped face counts; times: seconds spent
+# in the first three FRAME_STAGES
+RenderList = namedtuple("RenderList", "polys fog sky scale faces culled times")
+
+_render_targets = {}
+
+
+def build_frame(level, mario, cam, quality=None):
+    """The RenderList for ``level`` and Mario as seen from ``cam``.
+
+    ``quality`` is one of QUALITY_LADDER (the first, full quality, by
+    default).
+    """
+    q = quality or QUALITY_LADDER[0]
+    now = time.perf_counter
+    t0 = now()
+    sky = level.sky_color
+    scale = q["resolution"]
+    far = level.view_distance * q["distance"]
+    # Meshes drawn smaller than this many pixels across are skipped
+    detail = q["detail_px"] / (FOV * scale)
+    culled = 0
+    meshes = []
+    # Whole meshes entirely behind the camera, past the far plane or too
+    # small to see are dropped before any vertex is transformed
+    for mesh in [level.terrain, mario, *level.coins.awake(), *level.stars.awake()]:
+        dz = mesh.z - cam["z"]
+        if (dz - mesh.radius > far or dz + mesh.radius <= 1
+                or 2 * mesh.radius < dz * detail):
+            culled += mesh.face_count
+        else:
+            meshes.append(mesh)
+    projected = [RENDERER.transform(mesh, cam, scale) for mesh in meshes]
+    t1 = now()
+
+    polys = []
+    for mesh, (pts, depth) in zip(meshes, projected):
+        culled += RENDERER.cull(mesh, pts, depth, polys, far)
+    t2 = now()
+
+    RENDERER.sort(polys)
+    # Over budget, the farthest polygons go first
+    budget = q["budget"]
+    if budget is not None and len(polys) > budget:
+        culled += len(polys) - budget
+        polys = polys[-budget:]
+    t3 = now()
+
+    # Fog fades faces into the sky over the last stretch before the far
+    # plane, so nothing pops when it crosses it
+    fog = (far * FOG_START, far, sky) if q["fog"] else None
+    return RenderList(tuple(polys), fog, sky, scale, len(polys) + culled, culled,
+                      (t1 - t0, t2 - t1, t3 - t2))
+
+
+def present_frame(engine, frame, hud):
+    """Fill ``frame`` into the screen and draw the HUD over it.
+
+    ``hud`` is hud_state()'s tuple. Returns the seconds spent in the
+    last two FRAME_STAGES and the number of polygons drawn.
+    """
+    now = time.perf_counter
+    t0 = now()
+    screen = engine.screen
+    target = screen
+    if frame.scale != 1.0:
+        size = (int(WIDTH * frame.scale), int(HEIGHT * frame.scale))
+        target = _render_targets.get(size)
+        if target is None:
+            target = _render_targets[size] = pygame.Surface(size).convert()
+    target.fill(frame.sky)
+    drawn = RENDERER.draw(target, frame.polys, frame.fog)
+    if target is not screen:
+        pygame.transform.scale(target, (WIDTH, HEIGHT), screen)
+    t1 = now()
+
+    draw_hud(engine, *hud)
+    return (t1 - t0, now() - t1), drawn
+
+
+def draw_frame(engine, level, mario, cam, quality=None):
+    """Build and present one frame of ``level`` as seen from ``cam``.
+
+    Returns ``(seconds, faces, culled, drawn)``: the time spent in each
+    of FRAME_STAGES, the faces submitted, those culled (near plane, view
+    distance, detail or polygon budget) and the polygons actually drawn.
+    Timing is a handful of perf_counter() calls per frame, so it is
+    always on.
+    """
+    frame = build_frame(level, mario, cam, quality)
+    times, drawn = present_frame(engine, frame, hud_state(mario, level))
+    return frame.times + times, frame.faces, frame.culled, drawn
+
+
+# ============================================================
+# QUALITY GOVERNOR
+# ============================================================
+
+# Rungs from best to cheapest. resolution scales the 3D view (the HUD
+# stays sharp), distance scales the level's view distance, detail_px
+# skips meshes drawn smaller than that, fog blends the far stretch into
+# the sky and budget caps the polygons drawn (farthest dropped first).
+QUALITY_LADDER = [
+    {"name": "full", "resolution": 1.0, "distance": 1.0, "detail_px": 0,
+     "fog": True, "budget": None},
+    {"name": "high", "resolution": 1.0, "distance": 0.8, "detail_px": 1,
+     "fog": True, "budget": 1500},
+    {"name": "medium", "resolution": 0.75, "distance": 0.6, "detail_px": 2,
+     "fog": True, "budget": 800},
+    {"name": "low", "resolution": 0.5, "distance": 0.45, "detail_px": 3,
+     "fog": False, "budget": 400},
+]
+
+
+class QualityGovernor:
+    """Moves along QUALITY_LADDER to hold frames near ``target_ms``.
+
+    Frame times are averaged over windows of ``window`` frames. One slow
+    window (above ``target_ms * slow``) steps down a rung; stepping back
+    up takes ``calm_windows`` windows in a row under ``target_ms * fast``,
+    so quality does not flap around the target. Every change is printed
+    and kept in ``log``; ``draw()`` shows the current rung in the HUD.
+    """
+
+    def __init__(self, target_ms=TARGET_FRAME_MS, window=30, slow=1.1,
+                 fast=0.7, calm_windows=3, ladder=QUALITY_LADDER):
+        self.target_ms = target_ms
+        self.window = window
+        self.slow = slow
+        self.fast = fast
+        self.calm_windows = calm_windows
+        self.ladder = ladder
+        self.rung = 0
+        self.samples = []
+        self.calm = 0
+        self.average = 0.0
+        self.log = []
+
+    @property
+    def quality(self):
+        return self.ladder[self.rung]
+
+    def update(self, frame_ms):
+        self.samples.append(frame_ms)
+        if len(self.samples) < self.window:
+            return
+        self.average = avg = sum(self.samples) / len(self.samples)
+        self.samples = []
+        if avg > self.target_ms * self.slow:
+            self.calm = 0
+            if self.rung < len(self.ladder) - 1:
+                self._step(1, avg)
+        elif avg < self.target_ms * self.fast and self.rung > 0:
+            self.calm += 1
+            if self.calm >= self.calm_windows:
+                self.calm = 0
+                self._step(-1, avg)
+        else:
+            self.calm = 0
+
+    def _step(self, delta, avg):
+        old = self.quality["name"]
+        self.rung += delta
+        message = (f"quality: {old} -> {self.quality['name']} "
+                   f"({avg:.1f} ms average, target {self.target_ms:.1f} ms)")
+        self.log.append(message)
+        print(message)
+
+    def draw(self, surface, font):
+        text = (f"Quality: {self.quality['name']}  "
+                f"{self.average:.1f}/{self.target_ms:.1f} ms")
+        surface.blit(font.render(text, True, (200, 200, 200)), (20, 98))
+
+
+# ============================================================
+# PROFILER
+# ============================================================
+
+# Stages of one game() frame as shown by the F3 overlay
+PROFILE_STAGES = ("events", "sim") + FRAME_STAGES + ("flip",)
+
+
 # ============================================================
 # MAP SCREEN
 # ============================================================
@@ -1247,16 +2074,26 @@ ALL_LEVEL_NAMES = [
 ]
 
 
-def draw_map_screen(current_name):
-    """Full-screen map overlay showing all levels."""
-    font = pygame.font.SysFont("Arial", 20, bold=True)
-    small = pygame.font.SysFont("Arial", 16)
+_map_overlays = {}
+
+
+def draw_map_screen(engine, current_name):
+    """Full-screen map overlay showing all levels.
+
+    The overlay is composited once per current level and cached; the game
+    loop blits it over a frozen snapshot of the last rendered frame.
+    """
+    overlay = _map_overlays.get(current_name)
+    if overlay is not None:
+        return overlay
+
+    font = engine.font("Arial", 20, bold=True)
+    small = engine.font("Arial", 16)
     overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
     overlay.fill((0, 0, 0, 200))
-    screen.blit(overlay, (0, 0))
 
     title = font.render("=== CASTLE MAP — ALL LEVELS ===", True, GOLD)
-    screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 20))
+    overlay.blit(title, (WIDTH // 2 - title.get_width() // 2, 20))
 
     # Three columns
     col_w = WIDTH // 3
@@ -1270,82 +2107,232 @@ def draw_map_screen(current_name):
     for col, (header, names) in enumerate(zip(headers, groups)):
         x = col * col_w + 20
         h = font.render(header, True, WHITE)
-        screen.blit(h, (x, 55))
+        overlay.blit(h, (x, 55))
         for i, name in enumerate(names):
             color = GOLD if name == current_name else (200, 200, 200)
             prefix = "> " if name == current_name else "  "
             txt = small.render(f"{prefix}{name}", True, color)
-            screen.blit(txt, (x, 85 + i * 24))
+            overlay.blit(txt, (x, 85 + i * 24))
 
     hint = small.render("Press M to close map", True, (160, 160, 160))
-    screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 30))
-    pygame.display.flip()
+    overlay.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 30))
+
+    overlay = overlay.convert_alpha()
+    _map_overlays[current_name] = overlay
+    return overlay
 
 
 # ============================================================
-# GAME LOOP
+# RECORD / REPLAY
 # ============================================================
+# An input stream file is a header, a JSON metadata block and a run of
+# varint records. Each record is varint((tick_delta << 2) | op) followed
+# by one varint operand, so a tick where nothing changes costs nothing:
+#   op 0 HELD     bitmask over RECORD_KEYS, written only when it changes
+#   op 1 KEYDOWN  pygame key code, delivered before that tick runs
+#   op 2 QUIT     window closed
+#   op 3 END      operand is the length of a trailing JSON block holding
+#                 the recorded run's final state, used to verify replays
+# Coin layouts are seeded per level (scatter_coins), so the input plus
+# the metadata (world key, RandomWalkInput seed) pins down the whole run.
+
+RECORD_MAGIC = b"SM64INP1"
+RECORD_HEADER = struct.Struct("<8sHI")   # magic, tick rate, metadata length
+RECORD_KEYS = (pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d)
+REC_HELD, REC_KEYDOWN, REC_QUIT, REC_END = range(4)
+
+
+def _put_varint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def _get_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _held_from_mask(mask):
+    return HeldKeys(k for i, k in enumerate(RECORD_KEYS) if mask >> i & 1)
+
+
+def world_key():
+    """Hex digest of every level builder plus Mario's physics.
+
+    Replays are only exact against the world they were recorded in; a
+    mismatch is reported but the replay still runs.
+    """
+    h = hashlib.sha256(RECORD_MAGIC)
+    for builder in LEVEL_BUILDERS.values():
+        h.update(bake_key(builder))
+    h.update(_source(Mario).encode("utf-8"))
+    return h.hexdigest()
+
+
+class InputRecorder:
+    """Wraps a controller and logs what game() sees, tick by tick.
+
+    Events are stamped with the number of ticks run so far, i.e. the tick
+    they take effect before. Held keys are reduced to RECORD_KEYS so the
+    live run sees exactly what a replay will.
+    """
+
+    def __init__(self, controller, path, **meta):
+        self.controller = controller
+        self.path = path
+        self.meta = dict(meta, tick_rate=TICK_RATE, world=world_key())
+        self.buf = bytearray()
+        self.tick = 0
+        self.last = 0
+        self.mask = 0
+
+    def _put(self, op, value):
+        _put_varint(self.buf, (self.tick - self.last) << 2 | op)
+        _put_varint(self.buf, value)
+        self.last = self.tick
+
+    def events(self):
+        events = self.controller.events()
+        for e in events:
+            if e.type == pygame.KEYDOWN:
+                self._put(REC_KEYDOWN, e.key)
+            elif e.type == pygame.QUIT:
+                self._put(REC_QUIT, 0)
+        return events
+
+    def pressed(self):
+        keys = self.controller.pressed()
+        mask = 0
+        for i, k in enumerate(RECORD_KEYS):
+            if keys[k]:
+                mask |= 1 << i
+        if mask != self.mask:
+            self._put(REC_HELD, mask)
+            self.mask = mask
+        self.tick += 1
+        return _held_from_mask(mask)
+
+    def save(self, stats):
+        """Write the stream, ending with the run's final state."""
+        final = json.dumps({k: stats[k] for k in REPLAY_CHECKED}).encode()
+        self._put(REC_END, len(final))
+        meta = json.dumps(self.meta).encode()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "wb") as f:
+            f.write(RECORD_HEADER.pack(RECORD_MAGIC, TICK_RATE, len(meta)))
+            f.write(meta)
+            f.write(self.buf)
+            f.write(final)
+        return len(meta) + len(self.buf) + len(final) + RECORD_HEADER.size
+
+
+# Final-state fields a replay must reproduce exactly.
+REPLAY_CHECKED = ("ticks", "level", "coins", "stars", "pos")
+
+
+class ReplayInput:
+    """Feeds a recorded stream back into game(), one tick per pressed().
+
+    Run it with game(headless=True) so exactly one tick follows each
+    events() call, matching how the stream was stamped.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, rate, meta_len = RECORD_HEADER.unpack_from(data)
+        if magic != RECORD_MAGIC:
+            raise ValueError(f"{path}: not an input recording")
+        pos = RECORD_HEADER.size
+        self.meta = json.loads(data[pos:pos + meta_len])
+        pos += meta_len
+        if rate != TICK_RATE:
+            print(f"replay: recorded at {rate} ticks/s, running at {TICK_RATE}")
+        if self.meta.get("world") != world_key():
+            print("replay: levels or physics changed since recording; "
+                  "the run may diverge")
+
+        self.records = []
+        self.final = None
+        tick = 0
+        while self.final is None:
+            head, pos = _get_varint(data, pos)
+            value, pos = _get_varint(data, pos)
+            tick += head >> 2
+            op = head & 3
+            if op == REC_END:
+                self.final = json.loads(data[pos:pos + value])
+            self.records.append((tick, op, value))
+
+        self.next = 0
+        self.tick = 0
+        self.held = HeldKeys()
+        self.pending = []
+
+    def _advance(self):
+        records = self.records
+        while self.next < len(records) and records[self.next][0] <= self.tick:
+            _, op, value = records[self.next]
+            self.next += 1
+            if op == REC_HELD:
+                self.held = _held_from_mask(value)
+            elif op == REC_KEYDOWN:
+                self.pending.append(pygame.event.Event(pygame.KEYDOWN, key=value))
+            else:   # QUIT, or the end of the stream
+                self.pending.append(pygame.event.Event(pygame.QUIT))
+
+    def events(self):
+        self._advance()
+        events, self.pending = self.pending, []
+        return events
+
+    def pressed(self):
+        self._advance()
+        self.tick += 1
+        return self.held
+
+    def verify(self, stats):
+        """Fields where the replay's final state differs from the recording."""
+        return [k for k in REPLAY_CHECKED
+                if json.loads(json.dumps(stats[k])) != self.final[k]]
 
-def game():
-    # Build ALL levels
-    levels = {
-        "Peach's Castle": make_castle(),
-        # 15 courses
-        "Bob-omb Battlefield": make_bobomb_battlefield(),
-        "Whomp's Fortress": make_whomps_fortress(),
-        "Jolly Roger Bay": make_jolly_roger_bay(),
-        "Cool Cool Mountain": make_cool_cool_mountain(),
-        "Big Boo's Haunt": make_big_boos_haunt(),
-        "Hazy Maze Cave": make_hazy_maze_cave(),
-        "Lethal Lava Land": make_lethal_lava_land(),
-        "Shifting Sand Land": make_shifting_sand_land(),
-        "Dire Dire Docks": make_dire_dire_docks(),
-        "Snowman's Land": make_snowmans_land(),
-        "Wet-Dry World": make_wet_dry_world(),
-        "Tall Tall Mountain": make_tall_tall_mountain(),
-        "Tiny-Huge Island": make_tiny_huge_island(),
-        "Tick Tock Clock": make_tick_tock_clock(),
-        "Rainbow Ride": make_rainbow_ride(),
-        # 3 Bowser stages
-        "Bowser Dark World": make_bowser_dark_world(),
-        "Bowser Fire Sea": make_bowser_fire_sea(),
-        "Bowser in the Sky": make_bowser_in_the_sky(),
-        # 5 secret areas
-        "Wing Cap Tower": make_wing_cap_tower(),
-        "Metal Cap Cavern": make_metal_cap_cavern(),
-        "Vanish Cap Ruins": make_vanish_cap_ruins(),
-        "Secret Aquarium": make_secret_aquarium(),
-        "Princess Slide": make_princess_slide(),
-    }
-
-    current_level = levels["Peach's Castle"]
-    mario = Mario()
-    mario.x, mario.y, mario.z = current_level.entry_point
-
-    cam = {"x": mario.x, "y": mario.y + 200, "z": mario.z + 400}
-    show_map = False
-
-    running = True
-    while running:
-        clock.tick(FPS)
 
-        for e in pygame.event.get():
-            if e.type == pygame.QUIT:
-                running = False
-                return
-            if e.type == pygame.KEYDOWN:
-                if e.key == pygame.K_SPACE:
-                    mario.jump()
-                if e.key == pygame.K_ESCAPE:
-                    running = False
-                if e.key == pygame.K_m:
-                    show_map = not show_map
+# ============================================================
+# WORLD
+# ============================================================
 
-        if show_map:
-            draw_map_screen(current_level.name)
-            continue
+class World:
+    """The simulated game: current level, Mario, camera and tick count.
+
+    ``tick`` advances one fixed step with the keys held during it. The
+    previous tick's Mario and camera positions are kept so ``build`` can
+    draw the moment ``alpha`` of the way between them.
+    """
+
+    def __init__(self, levels):
+        self.prefetch = PortalPrefetcher(levels)
+        self.level = levels.get("Peach's Castle")
+        self.mario = mario = Mario()
+        mario.x, mario.y, mario.z = self.level.entry_point
+        self.cam = {"x": mario.x, "y": mario.y + 200, "z": mario.z + 400}
+        self.prev_pos = (mario.x, mario.y, mario.z)
+        self.prev_cam = dict(self.cam)
+        self.ticks = 0
+
+    def tick(self, keys):
+        mario, cam, level = self.mario, self.cam, self.level
+        self.prev_pos = (mario.x, mario.y, mario.z)
+        self.prev_cam = dict(cam)
+        self.ticks += 1
 
-        keys = pygame.key.get_pressed()
         dx, dz = 0, 0
         if keys[pygame.K_w]:
             dz -= MOVE_SPEED
@@ -1364,32 +2351,28 @@ def game():
 
         mario.x += dx
         mario.z += dz
-        mario.update(current_level.floor_y)
-
-        # Collectibles
-        for coin in current_level.coins[:]:
-            if math.dist((mario.x, mario.z), (coin.x, coin.z)) < 40 and abs(mario.y - coin.y) < 40:
-                current_level.coins.remove(coin)
-                mario.coins += 1
-        for star in current_level.stars[:]:
-            if math.dist((mario.x, mario.z), (star.x, star.z)) < 50 and abs(mario.y - star.y) < 50:
-                current_level.stars.remove(star)
-                mario.stars += 1
-
-        # Animate collectibles
-        for coin in current_level.coins:
-            coin.animate()
-        for star in current_level.stars:
-            star.animate()
-
-        # Portal checks
-        for portal in current_level.portals:
-            x1, x2, z1, z2 = portal["rect"]
-            if x1 <= mario.x <= x2 and z1 <= mario.z <= z2:
-                target = levels.get(portal["target"])
+        mario.update(level.floor_at(mario.x, mario.y, mario.z))
+        self.prefetch.update(level, mario.x, mario.z)
+
+        # Collectibles (one distance test per pool)
+        mario.coins += len(level.coins.collect(mario.x, mario.y, mario.z))
+        mario.stars += len(level.stars.collect(mario.x, mario.y, mario.z))
+
+        # Animate collectibles (those far from the camera sleep)
+        level.coins.animate(cam["x"], cam["z"])
+        level.stars.animate(cam["x"], cam["z"])
+
+        # Trigger events (only the triggers in Mario's grid cell are tested)
+        entered, _ = level.triggers.update(mario.x, mario.y, mario.z)
+        for trig in entered:
+            if trig.kind == "portal":
+                portal = trig.data
+                target = self.prefetch.enter(portal["target"])
                 if target:
-                    current_level = target
+                    self.level = target
                     mario.x, mario.y, mario.z = portal["spawn"]
+                    target.triggers.place(*portal["spawn"])
+                    self.prev_pos = portal["spawn"]
                 break
 
         # Camera follow (smooth)
@@ -1397,32 +2380,842 @@ def game():
         cam["y"] += (mario.y + 200 - cam["y"]) * 0.06
         cam["z"] += (mario.z + 400 - cam["z"]) * 0.08
 
-        # Render
-        screen.fill(current_level.sky_color)
+    def view(self, alpha):
+        """The camera ``alpha`` of the way from the previous tick."""
+        prev, cam = self.prev_cam, self.cam
+        return {k: prev[k] + (cam[k] - prev[k]) * alpha for k in cam}
+
+    def build(self, view, alpha, quality=None):
+        """build_frame() from ``view`` with Mario drawn between ticks."""
+        mario = self.mario
+        sim_pos = (mario.x, mario.y, mario.z)
+        mario.x, mario.y, mario.z = (p + (c - p) * alpha
+                                     for p, c in zip(self.prev_pos, sim_pos))
+        frame = build_frame(self.level, mario, view, quality)
+        mario.x, mario.y, mario.z = sim_pos
+        return frame
+
+    def stats(self):
+        mario = self.mario
+        return {
+            "ticks": self.ticks,
+            "level": self.level.name,
+            "coins": mario.coins,
+            "stars": mario.stars,
+            "pos": [mario.x, mario.y, mario.z],
+        }
+
+
+# ============================================================
+# PIPELINE
+# ============================================================
+# In pipelined mode (--pipelined) the World lives on a worker thread.
+# Each frame the main thread reads input and hands it over, then draws
+# and flips the previous frame's snapshot while the worker simulates
+# and builds the next one; drawing is a frame behind the simulation.
+# Snapshots are immutable copies, one being drawn and one being built,
+# so the two threads never share mutable state.
+
+# frame: RenderList; hud: hud_state(); view: the camera it was built
+# from; sim: seconds the worker spent ticking
+Snapshot = namedtuple("Snapshot", "frame hud view sim")
+
+
+class Pipeline:
+    """Runs a World's ticks and frame building on a worker thread.
+
+    ``submit`` hands over one frame's input (Space presses, the keys
+    held for each tick, interpolation alpha and quality rung); ``take``
+    returns the Snapshot built from it. At most one is in flight, so
+    after ``submit`` the main thread is free until it next calls
+    ``take``.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self.pending = False
+        self.inputs = queue.Queue(maxsize=1)
+        self.outputs = queue.Queue(maxsize=1)
+        self.worker = threading.Thread(target=self._work, name="sim-pipeline",
+                                       daemon=True)
+        self.worker.start()
+
+    def submit(self, jumps, keys, alpha, quality):
+        self.inputs.put((jumps, keys, alpha, quality))
+        self.pending = True
+
+    def take(self):
+        self.pending = False
+        snapshot = self.outputs.get()
+        if isinstance(snapshot, BaseException):
+            raise snapshot
+        return snapshot
+
+    def stop(self):
+        """Finish the frame in flight and end the worker."""
+        if self.pending:
+            self.take()
+        self.inputs.put(None)
+        self.worker.join()
+
+    def _work(self):
+        world = self.world
+        now = time.perf_counter
+        while True:
+            job = self.inputs.get()
+            if job is None:
+                return
+            try:
+                jumps, keys, alpha, quality = job
+                t0 = now()
+                for _ in range(jumps):
+                    world.mario.jump()
+                for held in keys:
+                    world.tick(held)
+                sim = now() - t0
+                view = world.view(alpha)
+                frame = world.build(view, alpha, quality)
+                self.outputs.put(Snapshot(frame, hud_state(world.mario, world.level),
+                                          view, sim))
+            except BaseException as e:   # re-raised on the main thread
+                self.outputs.put(e)
+                return
+
 
-        polys = []
-        render(current_level.terrain, cam, polys)
-        render(mario, cam, polys)
-        for coin in current_level.coins:
-            render(coin, cam, polys)
-        for star in current_level.stars:
-            render(star, cam, polys)
+# ============================================================
+# GAME LOOP
+# ============================================================
+
+def game(engine, controller=None, headless=False, draw=True, max_ticks=None,
+         target_ms=None, levels=None, pipelined=False):
+    """Play until Esc/quit (or ``max_ticks``); returns run statistics.
+
+    ``controller`` supplies events and held keys (LiveInput by default).
+    ``headless`` runs one tick per loop iteration with no frame cap, and
+    ``draw=False`` skips rendering entirely, leaving pure simulation.
+    ``target_ms`` turns on the QualityGovernor, aiming at that frame time.
+    ``levels`` is a fresh registry to start from, e.g. the one Boot
+    preloaded the castle into; by default a new one is made.
+    ``pipelined`` simulates and builds each frame on a worker thread
+    while the previous one is drawn (see PIPELINE); it has no effect
+    with ``draw=False``.
+    """
+    if controller is None:
+        controller = LiveInput()
+    screen = engine.screen
+
+    if levels is None:
+        levels = make_registry()
+    world = World(levels)
+    pipeline = Pipeline(world) if pipelined and draw else None
+    # What is on screen: the level name and camera the map screen and
+    # captures are tagged with
+    shown_level, shown_view = world.level.name, dict(world.cam)
+
+    stepper = FixedStep(TICK_RATE, MAX_CATCHUP_STEPS)
+    show_map = False
+    map_backdrop = None   # frozen copy of the last game frame
+    map_dirty = False
+    profiler = FrameProfiler(PROFILE_STAGES)
+    capture = ProfileCapture(PROFILE_DIR)
+    governor = QualityGovernor(target_ms) if target_ms else None
+    quality = None
+    if os.environ.get("SM64_PROFILE_FRAMES"):
+        capture.start(int(os.environ["SM64_PROFILE_FRAMES"]), shown_level, shown_view)
+    now = time.perf_counter
+
+    sim_ticks = 0
+    jumps = 0
+    frames = 0
+    started = time.perf_counter()
+
+    running = True
+    while running:
+        if not headless:
+            engine.clock.tick(FPS)
+        capture.frame()
+        frame_start = now()
+
+        for e in controller.events():
+            map_dirty = True
+            if e.type == pygame.QUIT:
+                running = False
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_SPACE:
+                    jumps += 1
+                if e.key == pygame.K_ESCAPE:
+                    running = False
+                if e.key == pygame.K_m:
+                    show_map = not show_map
+                    if show_map:
+                        map_backdrop = screen.copy()
+                if e.key == pygame.K_F3:
+                    profiler.toggle()
+                if e.key == pygame.K_F4:
+                    capture.start(PROFILE_FRAMES, shown_level, shown_view)
+
+        if not running:
+            break
+        if pipeline is None:
+            for _ in range(jumps):
+                world.mario.jump()
+            jumps = 0
+        events_done = now()
 
-        polys.sort(reverse=True)
-        for _, pts, col in polys:
-            if len(pts) >= 3:
-                pygame.draw.polygon(screen, col, pts)
+        if show_map:
+            stepper.pause()
+            # Only recomposite when something happened; otherwise the
+            # previous flip is still on screen.
+            if map_dirty:
+                screen.blit(map_backdrop, (0, 0))
+                screen.blit(draw_map_screen(engine, shown_level), (0, 0))
+                pygame.display.flip()
+                map_dirty = False
+            continue
 
-        draw_hud(mario, current_level.name, show_map)
+        # Simulate in fixed ticks, keeping the previous tick's state
+        keys = [controller.pressed() for _ in range(1 if headless else stepper.advance())]
+        sim_ticks += len(keys)
+        if max_ticks is not None and sim_ticks >= max_ticks:
+            running = False
+        # Draw Mario and the camera between the last two ticks
+        alpha = 1.0 if headless else stepper.alpha
+
+        if pipeline is not None:
+            snapshot = pipeline.take() if pipeline.pending else None
+            pipeline.submit(jumps, keys, alpha, quality)
+            jumps = 0
+            if snapshot is None:   # nothing built yet
+                continue
+            frame, hud, sim = snapshot.frame, snapshot.hud, snapshot.sim
+            shown_level, shown_view = hud[-1], snapshot.view
+        else:
+            for held in keys:
+                world.tick(held)
+            sim = now() - events_done
+            if not draw:
+                continue
+            shown_view = world.view(alpha)
+            shown_level = world.level.name
+            frame = world.build(shown_view, alpha, quality)
+            hud = hud_state(world.mario, world.level)
+
+        times, drawn = present_frame(engine, frame, hud)
+        times = frame.times + times
+        frames += 1
+        if governor:
+            governor.draw(screen, engine.font("Arial", 14))
+        if profiler.enabled:
+            profiler.draw(screen, engine.font("Arial", 13), 1000 / FPS)
+        flip_start = now()
         pygame.display.flip()
+        frame_end = now()
+        if profiler.enabled:
+            profiler.record((events_done - frame_start, sim) + times
+                            + (frame_end - flip_start,),
+                            (frame.faces, frame.culled, drawn))
+        if governor:
+            governor.update(1000 * (frame_end - frame_start))
+            quality = governor.quality
+
+    if pipeline is not None:
+        pipeline.stop()
+    elapsed = time.perf_counter() - started
+    capture.finish()
+    world.prefetch.stop()
+    print(world.prefetch.summary())
+    if not headless:
+        print(stepper.summary())
+    stats = world.stats()
+    stats.update({
+        "seconds": elapsed,
+        "ticks_per_second": stats["ticks"] / elapsed if elapsed else 0.0,
+        "frames": frames,
+        "frames_per_second": frames / elapsed if elapsed else 0.0,
+        "mode": "pipelined" if pipeline is not None else "serial",
+    })
+    return stats
+
+
+def _arg(argv, flag, default=None):
+    return argv[argv.index(flag) + 1] if flag in argv else default
+
+
+def _adaptive_target(argv):
+    """Frame-time target from --adaptive[=MS], or None when it is off."""
+    for a in argv:
+        if a == "--adaptive":
+            return TARGET_FRAME_MS
+        if a.startswith("--adaptive="):
+            return float(a.split("=", 1)[1])
+    return None
+
+
+def _level_names(argv, mode):
+    """Level names from --levels (every level by default), or None after
+    a usage message when some are not in LEVEL_BUILDERS."""
+    if "--levels" not in argv:
+        return list(LEVEL_BUILDERS)
+    names = _arg(argv, "--levels").split(",")
+    unknown = [n for n in names if n not in LEVEL_BUILDERS]
+    if unknown:
+        print(f"usage: {mode} --levels A,B; unknown level "
+              f"{', '.join(map(repr, unknown))} (choose from "
+              f"{', '.join(LEVEL_BUILDERS)})", file=sys.stderr)
+        return None
+    return names
+
+
+def _report(kind, stats):
+    print(f"{kind}: {stats['ticks']} ticks in {stats['seconds']:.2f}s "
+          f"({stats['ticks_per_second']:.0f} ticks/s), ended in "
+          f"{stats['level']} with {stats['coins']} coins, {stats['stars']} stars")
+    if stats["frames"]:
+        print(f"{kind}: {stats['frames']} frames, {stats['mode']} "
+              f"({stats['frames_per_second']:.1f} frames/s)")
+
+
+def run_headless(argv):
+    """--headless [--no-render] [--ticks N] [--seed S] [--record FILE]
+    [--pipelined]."""
+    seed = int(_arg(argv, "--seed", 0))
+    controller = RandomWalkInput(seed)
+    record = _arg(argv, "--record")
+    if record:
+        controller = InputRecorder(controller, record, seed=seed)
+    engine = Engine((WIDTH, HEIGHT), CAPTION, headless=True)
+    stats = game(engine, controller, headless=True,
+                 draw="--no-render" not in argv,
+                 max_ticks=int(_arg(argv, "--ticks", 3600)),
+                 target_ms=_adaptive_target(argv),
+                 pipelined="--pipelined" in argv)
+    engine.quit()
+    _report("headless", stats)
+    if record:
+        print(f"recorded {controller.save(stats)} bytes to {record}")
+
+
+def run_replay(argv):
+    """--replay FILE [--no-render] [--pipelined]: re-run a recording and
+    check the result.
+
+    Replays step one tick per loop like --headless, so a recording made
+    at 60 fps plays back as fast as the machine allows.
+    """
+    replay = ReplayInput(_arg(argv, "--replay"))
+    engine = Engine((WIDTH, HEIGHT), CAPTION, headless="--headless" in argv)
+    stats = game(engine, replay, headless=True, draw="--no-render" not in argv,
+                 pipelined="--pipelined" in argv)
+    engine.quit()
+    _report("replay", stats)
+    diverged = replay.verify(stats)
+    if diverged:
+        print("replay DIVERGED in: " + ", ".join(diverged))
+        for k in diverged:
+            print(f"  {k}: recorded {replay.final[k]!r}, replayed {stats[k]!r}")
+        return 1
+    print("replay matches the recording")
+    return 0
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+BENCH_FRAMES = 240
+BENCH_WARMUP = 10
+
+
+def flythrough(level, frames):
+    """Fixed camera path for ``level``: a dolly from in front of its
+    walkable area to the far side, weaving across it and bobbing up and
+    down, so every run of a level sees the same frames."""
+    surfaces = level.terrain.surfaces
+    x1 = min(s[0] for s in surfaces)
+    x2 = max(s[1] for s in surfaces)
+    z1 = min(s[2] for s in surfaces)
+    z2 = max(s[3] for s in surfaces)
+    y = max(max(s[4], s[5]) for s in surfaces) + level.terrain.y
+    cx = (x1 + x2) / 2
+    for i in range(frames):
+        t = i / max(frames - 1, 1)
+        yield {
+            "x": cx + (x2 - x1) * 0.4 * math.sin(4 * math.pi * t),
+            "y": y + 200 + 150 * math.sin(2 * math.pi * t),
+            "z": z1 - 600 + (z2 - z1 + 600) * t,
+        }
+
+
+def climb(level, frames):
+    """Camera path rising up the front of ``level`` from its floor to its
+    top, weaving across it: flythrough() for a tall level, which that
+    would only skim the top of."""
+    surfaces = level.terrain.surfaces
+    x1 = min(s[0] for s in surfaces)
+    x2 = max(s[1] for s in surfaces)
+    z1 = min(s[2] for s in surfaces)
+    top = max(max(s[4], s[5]) for s in surfaces) + level.terrain.y
+    cx = (x1 + x2) / 2
+    for i in range(frames):
+        t = i / max(frames - 1, 1)
+        yield {
+            "x": cx + (x2 - x1) * 0.4 * math.sin(4 * math.pi * t),
+            "y": level.floor_y + 100 + top * t,
+            "z": z1 - 600,
+        }
+
+
+def level_cubes(level):
+    """Boxes in ``level``: terrain cubes and wedges, coins and stars."""
+    return (len(level.terrain.surfaces) + len(level.coins.items)
+            + len(level.stars.items))
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def _timing_summary(samples):
+    ordered = sorted(samples)
+    return {
+        "mean_ms": 1000 * sum(ordered) / len(ordered),
+        "p50_ms": 1000 * _percentile(ordered, 50),
+        "p95_ms": 1000 * _percentile(ordered, 95),
+        "p99_ms": 1000 * _percentile(ordered, 99),
+    }
+
+
+def benchmark_level(engine, level, frames=BENCH_FRAMES, warmup=BENCH_WARMUP,
+                    quality=None, path=flythrough):
+    """Fly through ``level`` along ``path`` and summarise the per-stage
+    frame times."""
+    mario = Mario()
+    mario.x, mario.y, mario.z = level.entry_point
+    stages = [[] for _ in FRAME_STAGES]
+    totals = []
+    faces = []
+    culled = []
+    drawn = []
+    for i, cam in enumerate(path(level, warmup + frames)):
+        level.coins.animate(cam["x"], cam["z"])
+        level.stars.animate(cam["x"], cam["z"])
+        times, n_faces, n_culled, n_drawn = draw_frame(engine, level, mario, cam,
+                                                       quality=quality)
+        if i < warmup:
+            continue
+        for stage, t in zip(stages, times):
+            stage.append(t)
+        totals.append(sum(times))
+        faces.append(n_faces)
+        culled.append(n_culled)
+        drawn.append(n_drawn)
+    return {
+        "frames": frames,
+        "cubes": level_cubes(level),
+        "frame": _timing_summary(totals),
+        "stages": {name: _timing_summary(samples)
+                   for name, samples in zip(FRAME_STAGES, stages)},
+        "polygons": {
+            "faces": max(faces),
+            "culled_mean": sum(culled) / frames,
+            "drawn_mean": sum(drawn) / frames,
+            "drawn_max": max(drawn),
+        },
+    }
+
+
+def run_benchmark(argv):
+    """--bench [--frames N] [--levels A,B] [--quality RUNG] [--out FILE]
+    [--stress KIND,KIND|all --cubes N,N --seed S].
+
+    Loads each level through the game's registry, flies the camera along
+    flythrough() and writes per-level p50/p95/p99 frame and stage times
+    with box and polygon counts as JSON (to stdout unless --out is
+    given). --quality picks a QUALITY_LADDER rung by name (default full).
+
+    --stress benchmarks make_stress_level() of every STRESS_KINDS kind
+    named at every --cubes size (default STRESS_CUBES) instead; towers
+    are climbed rather than flown over. Run it once per SM64_RENDERER
+    backend for frame time against box count curves: every report
+    names its renderer.
+    """
+    frames = int(_arg(argv, "--frames", BENCH_FRAMES))
+    rung = _arg(argv, "--quality", QUALITY_LADDER[0]["name"])
+    quality = next((q for q in QUALITY_LADDER if q["name"] == rung), None)
+    if quality is None:
+        print(f"usage: --bench --quality RUNG; unknown rung {rung!r} (choose from "
+              f"{', '.join(q['name'] for q in QUALITY_LADDER)})", file=sys.stderr)
+        return 2
+    stress = _arg(argv, "--stress")
+    if stress:
+        kinds = STRESS_KINDS if stress == "all" else stress.split(",")
+        unknown = [k for k in kinds if k not in STRESS_KINDS]
+        if unknown:
+            print(f"usage: --bench --stress KIND,KIND|all; unknown kind "
+                  f"{', '.join(map(repr, unknown))} (choose from "
+                  f"{', '.join(STRESS_KINDS)})", file=sys.stderr)
+            return 2
+        sizes = [int(n) for n in _arg(argv, "--cubes", ",".join(
+            map(str, STRESS_CUBES))).split(",")]
+        seed = int(_arg(argv, "--seed", 0))
+        runs = [(f"Stress {kind} {n}",
+                 functools.partial(make_stress_level, kind, n, seed),
+                 climb if kind == "tower" else flythrough)
+                for kind in kinds for n in sizes]
+    else:
+        names = _level_names(argv, "--bench")
+        if names is None:
+            return 2
+        levels = make_registry()
+        runs = [(name, functools.partial(levels.get, name), flythrough)
+                for name in names]
+    engine = Engine((WIDTH, HEIGHT), CAPTION, headless=True)
+    report = {
+        "frames": frames,
+        "warmup": BENCH_WARMUP,
+        "resolution": [WIDTH, HEIGHT],
+        "quality": quality,
+        "baked": USE_BAKED_LEVELS,
+        "numpy": np is not None,
+        "renderer": RENDERER.name,
+        "python": sys.version.split()[0],
+        "levels": {},
+    }
+    if stress:
+        report["seed"] = seed
+    started = time.perf_counter()
+    for name, load, path in runs:
+        result = report["levels"][name] = benchmark_level(
+            engine, load(), frames, quality=quality, path=path)
+        print(f"{name:<22} p50 {result['frame']['p50_ms']:6.2f} ms  "
+              f"p99 {result['frame']['p99_ms']:6.2f} ms  "
+              f"{result['polygons']['drawn_mean']:6.0f} polys  "
+              f"{result['cubes']:6d} boxes", file=sys.stderr)
+    report["seconds"] = time.perf_counter() - started
+    engine.quit()
+
+    out = _arg(argv, "--out")
+    text = json.dumps(report, indent=2)
+    if out:
+        with open(out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+# ============================================================
+# MEMORY REPORT
+# ============================================================
+
+def deep_sizeof(obj, seen):
+    """sys.getsizeof() of ``obj`` and everything it holds that is not in
+    ``seen`` (ids). Functions, classes and modules are not counted, and
+    neither is the buffer behind a memoryview (see BakedMesh.nbytes)."""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if inspect.isroutine(obj) or inspect.isclass(obj) or inspect.ismodule(obj):
+        return 0
+    if type(obj) is int and -5 <= obj <= 256:   # interned by CPython
+        return 0
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += deep_sizeof(k, seen) + deep_sizeof(v, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, seen)
+    elif not isinstance(obj, (str, bytes, int, float, memoryview, array.array)):
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(vars(obj), seen)
+        for slot in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, slot):
+                size += deep_sizeof(getattr(obj, slot), seen)
+    return size
+
+
+def _shared_ids():
+    # Module-level values (the color constants above all) are shared by
+    # every level, so no level is charged for them.
+    return {id(v) for v in globals().values()}
+
+
+def measure_level(build, top=5):
+    """Build a level under tracemalloc and account for where it went."""
+    before = tracemalloc.take_snapshot()
+    level = build()
+    traced = tracemalloc.take_snapshot()
+    diff = traced.compare_to(before, "lineno")
+
+    terrain = level.terrain
+    shared = _shared_ids()
+    if isinstance(terrain, BakedMesh):
+        vertices = len(terrain.xyz) // 3
+        faces = terrain.face_count
+        vert_bytes = terrain.xyz.nbytes
+        face_bytes = terrain.index.nbytes + terrain.starts.nbytes + terrain.colors.nbytes
+        mapped = terrain.nbytes
+    else:
+        vertices = len(terrain.verts)
+        faces = len(terrain.faces)
+        vert_bytes = deep_sizeof(terrain.verts, set(shared))
+        face_bytes = deep_sizeof(terrain.faces, set(shared))
+        mapped = 0
+    parts = {name: deep_sizeof(getattr(level, name), set(shared))
+             for name in ("terrain", "coins", "stars", "floors", "triggers")}
+    parts["terrain"] += mapped
+    return {
+        "vertices": vertices,
+        "faces": faces,
+        "bytes_per_vertex": vert_bytes / vertices if vertices else 0,
+        "bytes_per_face": face_bytes / faces if faces else 0,
+        "parts": parts,
+        "total": deep_sizeof(level, set(shared)) + mapped,
+        "mapped": mapped,
+        "traced": sum(stat.size_diff for stat in diff),
+        "top": [_site(stat) for stat in diff[:top]],
+    }, diff
+
+
+def _site(stat):
+    frame = stat.traceback[0]
+    return {
+        "site": f"{os.path.basename(frame.filename)}:{frame.lineno}",
+        "code": linecache.getline(frame.filename, frame.lineno).strip(),
+        "bytes": stat.size_diff,
+        "blocks": stat.count_diff,
+    }
+
+
+def run_memory_report(argv):
+    """--memory [--levels A,B] [--top N] [--out FILE]: per-level memory.
+
+    Builds every level from source and again from its bake, and reports
+    vertex and face counts, bytes per vertex and per face, a getsizeof()
+    walk of each part of the Level, the tracemalloc total and the top
+    allocation sites, as JSON (to stdout unless --out is given).
+    """
+    top = int(_arg(argv, "--top", 5))
+    names = _level_names(argv, "--memory")
+    if names is None:
+        return 2
+    report = {"levels": {}}
+    sites = {}
+    for name in names:
+        builder = LEVEL_BUILDERS[name]
+        baked = baked_builder(name, builder)
+        baked()   # write the bake if it is stale, outside the trace
+        tracemalloc.start()
+        built, diff = measure_level(builder, top)
+        loaded, _ = measure_level(baked, top)
+        tracemalloc.stop()
+        for stat in diff:
+            if stat.size_diff > 0:
+                site = _site(stat)
+                entry = sites.setdefault(site["site"], dict(site, bytes=0, blocks=0))
+                entry["bytes"] += stat.size_diff
+                entry["blocks"] += stat.count_diff
+        report["levels"][name] = {"built": built, "baked": loaded}
+        print(f"{name:<22} {built['vertices']:5} verts {built['faces']:5} faces  "
+              f"{built['bytes_per_vertex']:5.0f} B/vert {built['bytes_per_face']:5.0f} B/face  "
+              f"built {built['total'] / 1024:7.1f} KB  baked {loaded['total'] / 1024:7.1f} KB",
+              file=sys.stderr)
+    report["top_sites"] = sorted(sites.values(), key=lambda s: -s["bytes"])[:top]
+    report["total"] = {
+        kind: sum(lv[kind]["total"] for lv in report["levels"].values())
+        for kind in ("built", "baked")
+    }
+
+    out = _arg(argv, "--out")
+    text = json.dumps(report, indent=2)
+    if out:
+        with open(out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+# ============================================================
+# BOOT (startup work behind the title screen)
+# ============================================================
+
+# Every face the menu, card, HUD, map and F3/quality overlays ask the
+# engine for
+BOOT_FONTS = (
+    ("Arial", 48, True), ("Arial", 28, True), ("Arial", 22, False),
+    ("Arial", 22, True), ("Arial", 20, True), ("Arial", 16, False),
+    ("Arial", 14, False), ("Arial", 13, False),
+    ("Times New Roman", 34, True), ("Times New Roman", 24, False),
+)
+
+
+class Boot:
+    """Startup work for an interactive launch, run while the title is up.
+
+    Two worker threads start at once: one builds pygame's system font
+    index (the slow part of the first SysFont call, a font directory scan
+    or an fc-list run), the other makes the castle resident in a fresh
+    registry, from its bake or by baking it. Work that creates fonts or
+    surfaces stays on the main thread; ``frame()``, called by the menu
+    after each flip, runs one such step per frame once its inputs are
+    ready: resolving BOOT_FONTS, then compositing the dear card and the
+    castle's map overlay. ``progress`` and ``status`` drive the menu's
+    loading bar and ``ready`` unlocks Start.
+
+    Times are measured from STARTED, before pygame is imported. When the
+    last step finishes, time to the first title frame and time until
+    playable are printed along with the cost of each step. The castle
+    worker then rewrites any other level's stale bake in the background;
+    that does not hold up ``ready``.
+
+    An exception in either worker is kept and re-raised by the next
+    ``frame`` call, on the main thread.
+    """
+
+    CASTLE = "Peach's Castle"
+
+    def __init__(self, engine, opened):
+        self.engine = engine
+        self.steps = {"imports": opened - STARTED,
+                      "window": time.perf_counter() - opened}
+        self.first_frame = None
+        self.playable = None
+        self.registry = None
+        self.error = None
+        self._indexed = threading.Event()
+        self._castle = threading.Event()
+        self._main_steps = [("fonts", self._resolve_fonts),
+                            ("card", lambda: compose_dear_card(engine)),
+                            ("map", lambda: draw_map_screen(engine, self.CASTLE))]
+        self._total = len(self._main_steps) + 2
+        for name, work in (("font index", self._index_fonts),
+                           ("castle", self._load_castle)):
+            threading.Thread(target=work, name=f"boot-{name}", daemon=True).start()
+
+    @property
+    def ready(self):
+        return self.playable is not None
+
+    @property
+    def progress(self):
+        return (len(self.steps) - 2) / self._total
+
+    @property
+    def status(self):
+        if self.ready:
+            return "Ready"
+        if not self._indexed.is_set():
+            return "Indexing fonts"
+        if self._main_steps:
+            return f"Preparing {self._main_steps[0][0]}"
+        return "Loading Peach's Castle"
+
+    def _timed(self, name, work):
+        t = time.perf_counter()
+        work()
+        self.steps[name] = time.perf_counter() - t
+
+    def _worker_step(self, name, work, done):
+        """Time ``work`` on a worker thread, then set ``done`` even if it
+        raised; frame() re-raises the error. True if it succeeded."""
+        try:
+            self._timed(name, work)
+            return True
+        except Exception as e:
+            self.error = e
+            return False
+        finally:
+            done.set()
+
+    def _index_fonts(self):
+        self._worker_step("font index", pygame.font.get_fonts, self._indexed)
+
+    def _load_castle(self):
+        def load():
+            self.registry = make_registry()
+            self.registry.get(self.CASTLE)
+        if self._worker_step("castle", load, self._castle) and USE_BAKED_LEVELS:
+            t = time.perf_counter()
+            stale = [n for n, b in LEVEL_BUILDERS.items()
+                     if n != self.CASTLE and refresh_bake(n, b)]
+            if stale:
+                print(f"boot: rebaked {len(stale)} stale levels in "
+                      f"{1000 * (time.perf_counter() - t):.0f} ms")
+
+    def _resolve_fonts(self):
+        for face in BOOT_FONTS:
+            self.engine.font(*face)
+
+    def frame(self):
+        """Called after each menu flip: run one main-thread step."""
+        now = time.perf_counter()
+        if self.first_frame is None:
+            self.first_frame = now - STARTED
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if self.ready or not self._indexed.is_set():
+            return
+        if self._main_steps:
+            name, work = self._main_steps[0]
+            self._timed(name, work)
+            self._main_steps.pop(0)
+        elif self._castle.is_set():
+            self.playable = time.perf_counter() - STARTED
+            self.report()
+
+    def report(self):
+        steps = ", ".join(f"{name} {1000 * t:.0f}" for name, t in self.steps.items())
+        print(f"boot: first frame {1000 * self.first_frame:.0f} ms, "
+              f"playable {1000 * self.playable:.0f} ms ({steps} ms)")
+
+    def take_registry(self):
+        """The preloaded registry for the first game; later games get None."""
+        registry, self.registry = self.registry, None
+        return registry
 
 
 # ============================================================
 # MAIN
 # ============================================================
 
-if __name__ == "__main__":
+def main(argv=sys.argv):
+    """Entry point: the window only opens once a mode is chosen."""
+    if "--bake" in argv:
+        bake_all()
+        return 0
+    if "--bench" in argv:
+        return run_benchmark(argv)
+    if "--memory" in argv:
+        return run_memory_report(argv)
+    if "--replay" in argv:
+        return run_replay(argv)
+    if "--headless" in argv:
+        run_headless(argv)
+        return 0
+
+    opened = time.perf_counter()
+    engine = Engine((WIDTH, HEIGHT), CAPTION)
+    boot = Boot(engine, opened)
+    target_ms = _adaptive_target(argv)
+    pipelined = "--pipelined" in argv
+    if "--record" in argv:
+        # Record one session from the castle, then exit
+        menu(engine, boot)
+        dear_card(engine)
+        recorder = InputRecorder(LiveInput(), _arg(argv, "--record"))
+        stats = game(engine, recorder, target_ms=target_ms,
+                     levels=boot.take_registry(), pipelined=pipelined)
+        print(f"recorded {recorder.save(stats)} bytes")
+        return 0
     while True:
-        menu()
-        dear_card()
-        game()
+        menu(engine, boot)
+        dear_card(engine)
+        game(engine, target_ms=target_ms, levels=boot.take_registry(),
+             pipelined=pipelined)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
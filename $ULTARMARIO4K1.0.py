@@ -14,6 +14,9 @@ import math
 import sys
 from random import randint
 
+from sm64engine import (Engine, Mesh, TextCache, TriggerGrid, compose_card,
+                        make_renderer, show_card)
+
 # ============================================================
 # CONFIG
 # ============================================================
@@ -27,10 +30,10 @@ MOVE_SPEED = 12
 JUMP_FORCE = 18
 GRAVITY = 0.9
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("SM64 PY PORT – EXPANDED CASTLE")
-clock = pygame.time.Clock()
+# Cell size of the per-level trigger grid (portals, hazard volumes).
+TRIGGER_CELL = 128
+
+CAPTION = "SM64 PY PORT – EXPANDED CASTLE"
 
 # ============================================================
 # COLORS
@@ -55,75 +58,13 @@ DARK_BROWN = (101, 67, 33)
 PURPLE = (128, 0, 128)
 ORANGE = (255, 165, 0)
 
-PARCHMENT = (245, 235, 205)
-PARCHMENT_BORDER = (190, 150, 100)
-INK = (70, 40, 25)
-
 # ============================================================
 # 3D CORE CLASSES
 # ============================================================
 
-class Vec3:
-    def __init__(self, x, y, z):
-        self.x, self.y, self.z = x, y, z
-
-class Face:
-    def __init__(self, idx, col):
-        self.idx = idx
-        self.col = col
-
-class Mesh:
-    def __init__(self, x=0, y=0, z=0):
-        self.x, self.y, self.z = x, y, z
-        self.yaw = 0
-        self.verts = []
-        self.faces = []
-
-    def cube(self, w, h, d, ox, oy, oz, col):
-        """Add a cube centered at (ox, oy, oz) relative to the mesh's origin."""
-        s = len(self.verts)
-        hw, hh, hd = w/2, h/2, d/2
-        pts = [(-hw, -hh, -hd), ( hw, -hh, -hd), ( hw,  hh, -hd), (-hw,  hh, -hd),
-               (-hw, -hh,  hd), ( hw, -hh,  hd), ( hw,  hh,  hd), (-hw,  hh,  hd)]
-        for px, py, pz in pts:
-            self.verts.append(Vec3(px + ox, py + oy, pz + oz))
-
-        faces = [[0,1,2,3], [5,4,7,6], [4,0,3,7],
-                 [1,5,6,2], [3,2,6,7], [4,5,1,0]]
-        for f in faces:
-            self.faces.append(Face([i + s for i in f], col))
-
-def render(mesh, cam, polys):
-    """Collect visible polygons from mesh, transformed and projected."""
-    cy = math.cos(mesh.yaw)
-    sy = math.sin(mesh.yaw)
-
-    for face in mesh.faces:
-        pts = []
-        avgz = 0
-        for i in face.idx:
-            v = mesh.verts[i]
-            # rotate around Y
-            rx = v.x * cy - v.z * sy
-            rz = v.x * sy + v.z * cy
-            ry = v.y
-
-            # translate to world
-            wx = rx + mesh.x - cam["x"]
-            wy = ry + mesh.y - cam["y"]
-            wz = rz + mesh.z - cam["z"]
-
-            if wz <= 1:
-                break   # behind camera
-
-            scale = FOV / wz
-            sx = wx * scale + WIDTH // 2
-            syy = -wy * scale + HEIGHT // 2
-            pts.append((sx, syy))
-            avgz += wz
-        else:
-            avgz /= len(pts)
-            polys.append((avgz, pts, face.col))
+# Vec3, Face and Mesh come from sm64engine, shared with the other ports;
+# SM64_RENDERER=python|numpy picks the backend.
+RENDERER = make_renderer((WIDTH, HEIGHT), FOV)
 
 # ============================================================
 # GAME OBJECTS
@@ -171,13 +112,20 @@ class Level:
         self.coins = coins
         self.entry_point = entry_point
         self.portals = []
+        self.triggers = TriggerGrid(TRIGGER_CELL)
 
     def add_portal(self, x1, x2, z1, z2, target_level, spawn):
-        self.portals.append({
+        portal = {
             "rect": (x1, x2, z1, z2),
             "target": target_level,
             "spawn": spawn
-        })
+        }
+        self.portals.append(portal)
+        self.triggers.add("portal", x1, x2, z1, z2, data=portal)
+
+    def add_trigger(self, kind, x1, x2, z1, z2, y1=-math.inf, y2=math.inf, data=None):
+        """Register a trigger volume (hazard, switch, ...) of any kind."""
+        return self.triggers.add(kind, x1, x2, z1, z2, y1, y2, data)
 
 # ============================================================
 # ENHANCED CASTLE BUILDER
@@ -408,44 +356,26 @@ def make_lethal_lava_land():
 # UI: Dear Mario card
 # ============================================================
 
-def dear_card():
-    title = pygame.font.SysFont("Times New Roman", 34, bold=True)
-    body = pygame.font.SysFont("Times New Roman", 26)
-
-    fade = 0
-    while True:
-        dt = clock.tick(FPS)
-        fade = min(255, fade + dt * 0.7)
-
-        for e in pygame.event.get():
-            if e.type == pygame.QUIT:
-                pygame.quit(); sys.exit()
-            if e.type == pygame.KEYDOWN:
-                if e.key in (pygame.K_RETURN, pygame.K_SPACE):
-                    return
-
-        screen.fill(DD_SKY)
-
-        card = pygame.Surface((560, 360), pygame.SRCALPHA)
-        card.fill(PARCHMENT)
-        pygame.draw.rect(card, PARCHMENT_BORDER, card.get_rect(), 6)
-
-        card.blit(title.render("Dear Mario,", True, INK), (40, 40))
-        card.blit(body.render("You're invited to Peach's Castle.", True, INK), (40, 100))
-        card.blit(body.render("Please come right away!", True, INK), (40, 140))
-
-        card.set_alpha(fade)
-        screen.blit(card, (120, 120))
-        pygame.display.flip()
+def dear_card(engine):
+    title = engine.font("Times New Roman", 34, bold=True)
+    body = engine.font("Times New Roman", 26)
+    card = compose_card((560, 360), [
+        (title, "Dear Mario,", (40, 40)),
+        (body, "You're invited to Peach's Castle.", (40, 100)),
+        (body, "Please come right away!", (40, 140)),
+    ])
+    if not show_card(engine, card, DD_SKY, (120, 120)):
+        pygame.quit(); sys.exit()
 
 # ============================================================
 # MENU
 # ============================================================
 
-def menu():
-    font = pygame.font.SysFont("Arial", 40, bold=True)
+def menu(engine):
+    screen = engine.screen
+    font = engine.font("Arial", 40, bold=True)
     while True:
-        clock.tick(FPS)
+        engine.clock.tick(FPS)
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
                 pygame.quit(); sys.exit()
@@ -460,7 +390,8 @@ def menu():
 # GAME LOOP
 # ============================================================
 
-def game():
+def game(engine):
+    screen = engine.screen
     # Build all levels
     levels = {
         "Peach's Castle": make_castle(),
@@ -477,11 +408,12 @@ def game():
 
     cam = {"x": mario.x, "y": mario.y + 200, "z": mario.z + 400}
 
-    font = pygame.font.SysFont("Arial", 24)
+    font = engine.font("Arial", 24)
+    hud = TextCache()
 
     running = True
     while running:
-        clock.tick(FPS)
+        engine.clock.tick(FPS)
 
         for e in pygame.event.get():
             if e.type == pygame.QUIT:
@@ -511,13 +443,14 @@ def game():
                 current_level.stars.remove(star)
                 mario.stars += 1
 
-        # Portal checks
-        for portal in current_level.portals:
-            x1, x2, z1, z2 = portal["rect"]
-            if x1 <= mario.x <= x2 and z1 <= mario.z <= z2:
-                target = levels[portal["target"]]
-                current_level = target
+        # Trigger events (only the triggers in Mario's grid cell are tested)
+        entered, _ = current_level.triggers.update(mario.x, mario.y, mario.z)
+        for trig in entered:
+            if trig.kind == "portal":
+                portal = trig.data
+                current_level = levels[portal["target"]]
                 mario.x, mario.y, mario.z = portal["spawn"]
+                current_level.triggers.place(*portal["spawn"])
                 break
 
         # Camera follow
@@ -540,23 +473,19 @@ def game():
         screen.fill(sky)
 
         polys = []
-        render(current_level.terrain, cam, polys)
-        render(mario, cam, polys)
+        RENDERER.render(current_level.terrain, cam, polys)
+        RENDERER.render(mario, cam, polys)
         for coin in current_level.coins:
-            render(coin, cam, polys)
+            RENDERER.render(coin, cam, polys)
         for star in current_level.stars:
-            render(star, cam, polys)
+            RENDERER.render(star, cam, polys)
 
-        polys.sort(reverse=True)
-        for _, pts, col in polys:
-            if len(pts) == 4:
-                pygame.draw.polygon(screen, col, pts)
+        RENDERER.sort(polys)
+        RENDERER.draw(screen, polys)
 
         # HUD
-        hud_text = font.render(f"Stars: {mario.stars}   Coins: {mario.coins}", True, WHITE)
-        screen.blit(hud_text, (20, 20))
-        level_name = font.render(current_level.name, True, WHITE)
-        screen.blit(level_name, (20, 50))
+        hud.blit(screen, font, f"Stars: {mario.stars}   Coins: {mario.coins}", WHITE, (20, 20))
+        hud.blit(screen, font, current_level.name, WHITE, (20, 50))
 
         pygame.display.flip()
 
@@ -564,8 +493,13 @@ def game():
 # MAIN
 # ============================================================
 
-if __name__ == "__main__":
+def main():
+    engine = Engine((WIDTH, HEIGHT), CAPTION)
     while True:
-        menu()
-        dear_card()
-        game()
+        menu(engine)
+        dear_card(engine)
+        game(engine)
+
+
+if __name__ == "__main__":
+    main()
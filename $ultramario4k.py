@@ -3,6 +3,8 @@ import math
 import sys
 from random import randint
 
+from sm64engine import Engine, Mesh, TextCache, compose_card, make_renderer, show_card
+
 # ============================================================
 # CONFIG
 # ============================================================
@@ -17,10 +19,7 @@ MOVE_SPEED = 12
 JUMP_FORCE = 18
 GRAVITY = 0.9
 
-pygame.init()
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("SM64 PY PORT – COMPLETE")
-clock = pygame.time.Clock()
+CAPTION = "SM64 PY PORT – COMPLETE"
 
 # ============================================================
 # COLORS
@@ -37,74 +36,13 @@ BROWN = (139, 69, 19)
 GREEN = (30, 140, 30)
 LIGHT_GREEN = (50, 200, 50)
 
-PARCHMENT = (245, 235, 205)
-PARCHMENT_BORDER = (190, 150, 100)
-INK = (70, 40, 25)
-
 # ============================================================
 # 3D CORE
 # ============================================================
 
-class Vec3:
-    def __init__(self, x, y, z):
-        self.x, self.y, self.z = x, y, z
-
-class Face:
-    def __init__(self, idx, col):
-        self.idx = idx
-        self.col = col
-
-class Mesh:
-    def __init__(self, x=0, y=0, z=0):
-        self.x, self.y, self.z = x, y, z
-        self.yaw = 0
-        self.verts = []
-        self.faces = []
-
-    def cube(self, w, h, d, ox, oy, oz, col):
-        s = len(self.verts)
-        hw, hh, hd = w/2, h/2, d/2
-        pts = [(-hw,-hh,-hd),(hw,-hh,-hd),(hw,hh,-hd),(-hw,hh,-hd),
-               (-hw,-hh,hd),(hw,-hh,hd),(hw,hh,hd),(-hw,hh,hd)]
-        for px,py,pz in pts:
-            self.verts.append(Vec3(px+ox,py+oy,pz+oz))
-
-        faces = [[0,1,2,3],[5,4,7,6],[4,0,3,7],[1,5,6,2],[3,2,6,7],[4,5,1,0]]
-        for f in faces:
-            self.faces.append(Face([i+s for i in f], col))
-
-def render(mesh, cam, polys, bg):
-    cy = math.cos(mesh.yaw)
-    sy = math.sin(mesh.yaw)
-
-    for face in mesh.faces:
-        pts = []
-        avgz = 0
-
-        for i in face.idx:
-            v = mesh.verts[i]
-
-            rx = v.x*cy - v.z*sy
-            rz = v.x*sy + v.z*cy
-            ry = v.y
-
-            wx = rx + mesh.x - cam["x"]
-            wy = ry + mesh.y - cam["y"]
-            wz = rz + mesh.z - cam["z"]
-
-            cz = wz
-            if cz <= 1:
-                break
-
-            scale = FOV/cz
-            sx = wx*scale + WIDTH//2
-            syy = -wy*scale + HEIGHT//2
-
-            pts.append((sx,syy))
-            avgz += cz
-        else:
-            avgz/=len(pts)
-            polys.append((avgz, pts, face.col))
+# Vec3, Face and Mesh come from sm64engine, shared with the other ports;
+# SM64_RENDERER=python|numpy picks the backend.
+RENDERER = make_renderer((WIDTH, HEIGHT), FOV)
 
 # ============================================================
 # OBJECTS
@@ -156,41 +94,23 @@ def make_inside():
 # UI
 # ============================================================
 
-def dear_card():
-    title = pygame.font.SysFont("Times New Roman",34,bold=True)
-    body = pygame.font.SysFont("Times New Roman",26)
-
-    fade = 0
-    while True:
-        dt = clock.tick(FPS)
-        fade = min(255, fade+dt*0.7)
-
-        for e in pygame.event.get():
-            if e.type==pygame.QUIT:
-                pygame.quit();sys.exit()
-            if e.type==pygame.KEYDOWN:
-                if e.key in (pygame.K_RETURN,pygame.K_SPACE):
-                    return
-
-        screen.fill(DD_SKY)
-
-        card = pygame.Surface((560,360),pygame.SRCALPHA)
-        card.fill(PARCHMENT)
-        pygame.draw.rect(card,PARCHMENT_BORDER,card.get_rect(),6)
-
-        card.blit(title.render("Dear Mario,",True,INK),(40,40))
-        card.blit(body.render("You're invited to Peach's Castle.",True,INK),(40,100))
-        card.blit(body.render("Please come right away!",True,INK),(40,140))
-
-        card.set_alpha(fade)
-        screen.blit(card,(120,120))
-        pygame.display.flip()
+def dear_card(engine):
+    title = engine.font("Times New Roman",34,bold=True)
+    body = engine.font("Times New Roman",26)
+    card = compose_card((560,360), [
+        (title,"Dear Mario,",(40,40)),
+        (body,"You're invited to Peach's Castle.",(40,100)),
+        (body,"Please come right away!",(40,140)),
+    ])
+    if not show_card(engine,card,DD_SKY,(120,120)):
+        pygame.quit();sys.exit()
 
 # ============================================================
 # GAME LOOP
 # ============================================================
 
-def game():
+def game(engine):
+    screen = engine.screen
     mario = Mario()
     cam = {"x":0,"y":200,"z":800}
 
@@ -198,10 +118,11 @@ def game():
     level = make_outside()
     coins = [Coin(randint(-300,300),randint(-200,400)) for _ in range(5)]
 
-    font = pygame.font.SysFont("Arial",18)
+    font = engine.font("Arial",18)
+    hud = TextCache()
 
     while True:
-        clock.tick(FPS)
+        engine.clock.tick(FPS)
         for e in pygame.event.get():
             if e.type==pygame.QUIT:
                 return
@@ -228,17 +149,15 @@ def game():
         screen.fill(DD_SKY if scene=="outside" else INDOOR_SKY)
 
         polys=[]
-        render(level,cam,polys,DD_SKY)
-        render(mario,cam,polys,DD_SKY)
+        RENDERER.render(level,cam,polys)
+        RENDERER.render(mario,cam,polys)
         for c in coins:
-            render(c,cam,polys,DD_SKY)
+            RENDERER.render(c,cam,polys)
 
-        polys.sort(reverse=True)
-        for _,pts,col in polys:
-            pygame.draw.polygon(screen,col,pts)
+        RENDERER.sort(polys)
+        RENDERER.draw(screen,polys)
 
-        hud = font.render(f"Coins: {mario.coins}",True,WHITE)
-        screen.blit(hud,(20,20))
+        hud.blit(screen,font,f"Coins: {mario.coins}",WHITE,(20,20))
 
         pygame.display.flip()
 
@@ -246,10 +165,11 @@ def game():
 # MENU
 # ============================================================
 
-def menu():
-    font = pygame.font.SysFont("Arial",40,bold=True)
+def menu(engine):
+    screen = engine.screen
+    font = engine.font("Arial",40,bold=True)
     while True:
-        clock.tick(FPS)
+        engine.clock.tick(FPS)
         for e in pygame.event.get():
             if e.type==pygame.QUIT:
                 pygame.quit();sys.exit()
@@ -264,7 +184,12 @@ def menu():
 # MAIN
 # ============================================================
 
-while True:
-    menu()
-    dear_card()
-    game()
+def main():
+    engine = Engine((WIDTH, HEIGHT), CAPTION)
+    while True:
+        menu(engine)
+        dear_card(engine)
+        game(engine)
+
+if __name__ == "__main__":
+    main()
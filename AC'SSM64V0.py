@@ -1,8 +1,13 @@
 import pygame
 import math
 import sys
+import time
 from random import randint
 
+from sm64engine import (Engine, Entities, Entity, FrameProfiler, LiveInput,
+                        Mesh, RandomWalkInput, Solid, SweepAndPrune,
+                        TextCache, make_renderer)
+
 # ============================================================
 #  AC'S SM64 PY PORT 1.X - program.py
 #  Title Menu (SM64-ish) -> Peach's Castle gameplay
@@ -11,14 +16,18 @@ from random import randint
 # --- CONFIGURATION ---
 WIDTH, HEIGHT = 800, 600
 FPS = 60
+CAPTION = "AC'S SM64 PY PORT 1.X"
 FOV = 500
-VIEW_DISTANCE = 5000
+VIEW_DISTANCE = 5000  # far plane; fog reaches the sky color here
 
 DEFAULT_ROTATION_SPEED = 0.05
 DEFAULT_MOVE_SPEED = 12
 JUMP_FORCE = 18
 GRAVITY = 0.9
 COIN_ROTATION_SPEED = 0.1
+# Coins and goombas this far from the camera sleep: they are not
+# animated, and goombas patrol in strides (see sm64engine.entities)
+SLEEP_DISTANCE = VIEW_DISTANCE * 1.5
 
 # --- COLORS ---
 DD_SKY = (20, 20, 60)
@@ -41,76 +50,11 @@ GOOMBA_PUPIL = (0, 0, 0)
 COIN_COLOR = (255, 215, 0)
 HEALTH_BAR = (220, 20, 60)
 
-# --- 3D MATH UTILITIES ---
-
-class Vector3:
-    __slots__ = ('x', 'y', 'z')
-    def __init__(self, x, y, z):
-        self.x = x
-        self.y = y
-        self.z = z
-
-class Face:
-    __slots__ = ('indices', 'color', 'avg_z', 'normal')
-    def __init__(self, indices, color):
-        self.indices = indices
-        self.color = color
-        self.avg_z = 0
-        self.normal = None
-
-def normalize(vx, vy, vz):
-    length = math.sqrt(vx*vx + vy*vy + vz*vz)
-    if length == 0:
-        return (0, 0, 1)
-    return (vx/length, vy/length, vz/length)
-
-def cross(ax, ay, az, bx, by, bz):
-    return (ay*bz - az*by, az*bx - ax*bz, ax*by - ay*bx)
-
-# --- BASE MESH CLASS ---
-
-class Mesh:
-    def __init__(self, x=0, y=0, z=0):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.yaw = 0
-        self.vertices = []
-        self.faces = []
-        self.active = True
-
-    def add_cube(self, w, h, d, offset_x, offset_y, offset_z, color):
-        """Add a cube to the mesh at local offset."""
-        start_idx = len(self.vertices)
-        hw, hh, hd = w/2, h/2, d/2
-        corners = [
-            (-hw, -hh, -hd), ( hw, -hh, -hd), ( hw,  hh, -hd), (-hw,  hh, -hd), # back
-            (-hw, -hh,  hd), ( hw, -hh,  hd), ( hw,  hh,  hd), (-hw,  hh,  hd)  # front
-        ]
-        for cx, cy, cz in corners:
-            self.vertices.append(Vector3(cx + offset_x, cy + offset_y, cz + offset_z))
-
-        # Face definitions (indices relative to start_idx)
-        cube_faces = [
-            ([0,1,2,3], color), # back
-            ([5,4,7,6], color), # front
-            ([4,0,3,7], color), # left
-            ([1,5,6,2], color), # right
-            ([3,2,6,7], color), # top
-            ([4,5,1,0], color)  # bottom
-        ]
-        for idx_list, col in cube_faces:
-            shifted = [i + start_idx for i in idx_list]
-            face = Face(shifted, col)
-            # Precompute face normal (not used directly, but kept for future)
-            v0 = self.vertices[shifted[0]]
-            v1 = self.vertices[shifted[1]]
-            v2 = self.vertices[shifted[2]]
-            ax, ay, az = v1.x - v0.x, v1.y - v0.y, v1.z - v0.z
-            bx, by, bz = v2.x - v0.x, v2.y - v0.y, v2.z - v0.z
-            nx, ny, nz = cross(ax, ay, az, bx, by, bz)
-            face.normal = normalize(nx, ny, nz)
-            self.faces.append(face)
+# --- 3D CORE ---
+# Vector3, Face and Mesh come from sm64engine, shared with the other
+# ports; meshes are built with Mesh.add_cube. SM64_RENDERER=python|numpy
+# picks the renderer backend.
+RENDERER = make_renderer((WIDTH, HEIGHT), FOV)
 
 # --- SPECIFIC GAME OBJECTS ---
 
@@ -174,11 +118,10 @@ class Mario(Mesh):
         self.x += dx
         self.z += dz
 
-class Coin(Mesh):
+class Coin(Entity):
     """Simple rotating coin."""
     def __init__(self, x, y, z):
         super().__init__(x, y, z)
-        self.angle = 0
         self.collected = False
         self.build_coin()
 
@@ -187,13 +130,12 @@ class Coin(Mesh):
         self.add_cube(10, 2, 10, 0, 2, 0, YELLOW)
         self.add_cube(8, 2, 8, 0, 4, 0, YELLOW)
 
-    def update(self):
-        self.angle += COIN_ROTATION_SPEED
-        if self.angle > 2*math.pi:
-            self.angle -= 2*math.pi
-        self.yaw = self.angle
+    @staticmethod
+    def spin(spinners):
+        """Spin every coin in the ``spinners`` store."""
+        spinners.spin(COIN_ROTATION_SPEED)
 
-class Goomba(Mesh):
+class Goomba(Entity):
     """Simple enemy that walks back and forth."""
     def __init__(self, x, y, z):
         super().__init__(x, y, z)
@@ -212,18 +154,25 @@ class Goomba(Mesh):
         self.add_cube(8, 4, 12, -8, 0, 0, BROWN)
         self.add_cube(8, 4, 12,  8, 0, 0, BROWN)
 
-    def update(self, dt):
-        self.x += self.direction * self.speed * (dt / 16.67)
-        if self.x > 600:
-            self.direction = -1
-        elif self.x < -600:
-            self.direction = 1
+    @staticmethod
+    def patrol(walkers, dt):
+        """Walk every goomba in the ``walkers`` store back and forth."""
+        walkers.patrol(dt / 16.67, -600, 600)
 
 class Level(Mesh):
     def __init__(self):
         super().__init__(0, 0, 0)
+        self.solids = []
         self.build_castle()
 
+    def add_cube(self, w, h, d, offset_x, offset_y, offset_z, color):
+        super().add_cube(w, h, d, offset_x, offset_y, offset_z, color)
+        # Anything standing on the courtyard blocks walkers
+        bottom, top = offset_y - h/2, offset_y + h/2
+        if bottom <= 5 and top > 0:
+            self.solids.append(Solid(offset_x - w/2, offset_x + w/2, bottom, top,
+                                     offset_z - d/2, offset_z + d/2))
+
     def build_castle(self):
         """Construct Peach's Castle using cubes."""
         ground_size = 2000
@@ -278,126 +227,98 @@ class Level(Mesh):
         self.add_cube(10, 60, 10, 0, 400, 0, YELLOW)
         self.add_cube(60, 10, 10, 0, 400, 0, YELLOW)
 
-# --- MAIN RENDERER ---
-
-def render_mesh(mesh, cam, render_list):
-    if not mesh.active:
-        return
-
-    world_x, world_y, world_z = mesh.x, mesh.y, mesh.z
-    yaw = mesh.yaw
-
-    c_yaw = math.cos(yaw)
-    s_yaw = math.sin(yaw)
+# --- COLLISION DETECTION (sweep-and-prune broadphase) ---
 
-    cx, cy = cam['cx'], cam['cy']
-    cam_x, cam_y, cam_z = cam['x'], cam['y'], cam['z']
-    cam_yaw = cam['yaw']
+# Box half-extents; Mario + coin/goomba add up to the 40-unit pickup and
+# hit radius used by the narrowphase.
+MARIO_HALF = 28
+COIN_HALF = 12
+GOOMBA_HALF = 12
 
-    c_cam = math.cos(-cam_yaw)
-    s_cam = math.sin(-cam_yaw)
 
-    for face in mesh.faces:
-        cam_verts = []
-        valid = True
-        for idx in face.indices:
-            v = mesh.vertices[idx]
-
-            # Object rotation
-            rx = v.x * c_yaw - v.z * s_yaw
-            rz = v.x * s_yaw + v.z * c_yaw
-            ry = v.y
-
-            # World
-            wx = rx + world_x
-            wy = ry + world_y
-            wz = rz + world_z
-
-            # Camera translate
-            tx = wx - cam_x
-            ty = wy - cam_y
-            tz = wz - cam_z
-
-            # Camera yaw rotate
-            dx = tx * c_cam - tz * s_cam
-            dz = tx * s_cam + tz * c_cam
-            dy = ty
-
-            if dz < 1:
-                valid = False
-                break
-            cam_verts.append((dx, dy, dz))
+# ============================================================
+#  INPUT (live keyboard, or a scripted stand-in for headless runs)
+# ============================================================
 
-        if not valid or len(cam_verts) < 3:
-            continue
+# Key combinations the stand-in holds: Q/E strafe and A/D turn here
+SOAK_MOVES = [(), (pygame.K_w,), (pygame.K_s,), (pygame.K_q,), (pygame.K_e,),
+              (pygame.K_w, pygame.K_a), (pygame.K_w, pygame.K_d),
+              (pygame.K_s, pygame.K_q), (pygame.K_s, pygame.K_e)]
 
-        screen_pts = []
-        avg_z = 0
-        for dx, dy, dz in cam_verts:
-            scale = FOV / dz
-            sx = int(dx * scale + cx)
-            sy = int(-dy * scale + cy)
-            screen_pts.append((sx, sy))
-            avg_z += dz
-        avg_z /= len(cam_verts)
-
-        # Backface cull (signed area in screen space)
-        area = 0
-        n = len(screen_pts)
-        for i in range(n):
-            x1, y1 = screen_pts[i]
-            x2, y2 = screen_pts[(i+1) % n]
-            area += (x2 - x1) * (y2 + y1)
-        if area <= 0:
-            continue
+# ============================================================
+#  PROFILER (F3 in game)
+# ============================================================
 
-        # Simple frustum-ish: skip if fully offscreen
-        off_screen = True
-        for sx, sy in screen_pts:
-            if 0 <= sx < WIDTH and 0 <= sy < HEIGHT:
-                off_screen = False
-                break
-        if off_screen:
-            continue
+PROFILE_STAGES = ("events", "sim", "render", "sort", "draw", "hud", "flip")
 
-        render_list.append({
-            'poly': screen_pts,
-            'depth': avg_z,
-            'color': face.color
-        })
 
 # ============================================================
 #  GAME LOOP (your original main loop) wrapped in a function
 # ============================================================
 
-def run_game(screen, clock, settings):
-    """Runs the Peach's Castle gameplay. Returns 'menu' to go back, or 'quit'."""
+def run_game(engine, settings, controller=None, headless=False, draw=True,
+             max_ticks=None, stats=None):
+    """Runs the Peach's Castle gameplay. Returns 'menu' to go back, or 'quit'.
+
+    ``controller`` supplies events and held keys (LiveInput by default).
+    ``headless`` steps once per loop with no frame cap, ``draw=False``
+    skips rendering, and ``max_ticks`` ends the run. If a ``stats`` dict
+    is passed it receives the tick count and the Mario object.
+    """
+    if controller is None:
+        controller = LiveInput()
+    screen, clock = engine.screen, engine.clock
+    if stats is None:
+        stats = {}
+    stats['ticks'] = 0
     # Create game objects
     mario = Mario(0, 20, 0)
     level = Level()
     coins = [Coin(randint(-500, 500), 50, randint(-500, 500)) for _ in range(5)]
     goombas = [Goomba(randint(-400, 400), 0, randint(-400, 400)) for _ in range(3)]
+    spinners = Entities(coins, SLEEP_DISTANCE)
+    walkers = Entities(goombas, SLEEP_DISTANCE)
+
+    # Broadphase: every dynamic entity plus the castle's standing solids
+    broadphase = SweepAndPrune()
+    broadphase.add(mario, 'mario', MARIO_HALF)
+    for coin in coins:
+        broadphase.add(coin, 'coin', COIN_HALF)
+    for goomba in goombas:
+        broadphase.add(goomba, 'goomba', GOOMBA_HALF, oy=GOOMBA_HALF)
+    for solid in level.solids:
+        broadphase.add_solid(solid)
 
     # Camera
     camera = {
         'x': 0, 'y': 300, 'z': 800,
-        'yaw': 0, 'pitch': 0.2,
-        'cx': WIDTH // 2, 'cy': HEIGHT // 2
+        'yaw': 0, 'pitch': 0.2
     }
 
-    small_font = pygame.font.SysFont('Arial', 18)
+    small_font = engine.font('Arial', 18)
+    hud = TextCache()
 
     coins_collected = 0
     mario_health = 100
+    stats['mario'] = mario
+    profiler = FrameProfiler(PROFILE_STAGES)
+    now = time.perf_counter
 
     running = True
     while running:
-        dt = clock.tick(FPS)
-        if dt > 50:
-            dt = 16
+        if headless:
+            dt = 1000 / FPS
+        else:
+            dt = clock.tick(FPS)
+            if dt > 50:
+                dt = 16
+        stats['ticks'] += 1
+        if max_ticks is not None and stats['ticks'] > max_ticks:
+            return "menu"
+        t_start = now()
 
         # --- EVENTS ---
-        for event in pygame.event.get():
+        for event in controller.events():
             if event.type == pygame.QUIT:
                 return "quit"
             if event.type == pygame.KEYDOWN:
@@ -406,8 +327,11 @@ def run_game(screen, clock, settings):
                 if event.key == pygame.K_ESCAPE:
                     # ESC returns to menu instead of hard quitting
                     return "menu"
+                if event.key == pygame.K_F3:
+                    profiler.toggle()
 
-        keys = pygame.key.get_pressed()
+        t_events = now()
+        keys = controller.pressed()
 
         # --- CAMERA ROTATION ---
         if keys[pygame.K_a]:
@@ -434,39 +358,70 @@ def run_game(screen, clock, settings):
 
         # --- PHYSICS UPDATE ---
         mario.update(dt)
-        for coin in coins:
-            coin.update()
-        for goomba in goombas:
-            goomba.update(dt)
-
-        # --- COLLISIONS (distance-based) ---
-        for coin in coins[:]:
-            if not coin.collected:
+        for store in (spinners, walkers):
+            store.tick(camera['x'], camera['z'])
+        Coin.spin(spinners)
+        Goomba.patrol(walkers, dt)
+
+        # --- COLLISIONS ---
+        # Only pairs whose boxes overlap reach the narrowphase below
+        for a, b in broadphase.pairs():
+            if a.kind > b.kind:
+                a, b = b, a
+            kinds = (a.kind, b.kind)
+
+            if kinds == ('coin', 'mario'):
+                coin = a.obj
+                if coin.collected:
+                    continue
                 dx = mario.x - coin.x
                 dz = mario.z - coin.z
                 dy = mario.y - coin.y
                 dist = math.sqrt(dx*dx + dz*dz + dy*dy)
                 if dist < 40:
                     coin.collected = True
+                    coins.remove(coin)
+                    spinners.kill(coin)
+                    broadphase.remove(coin)
                     coins_collected += 1
                     mario.coins += 1
-        coins = [c for c in coins if not c.collected]
-
-        for goomba in goombas[:]:
-            dx = mario.x - goomba.x
-            dz = mario.z - goomba.z
-            dy = mario.y - goomba.y
-            dist = math.sqrt(dx*dx + dz*dz + dy*dy)
-            if dist < 40:
-                mario_health -= 10
-                if mario_health <= 0:
-                    # game over -> back to menu
-                    return "menu"
-                mario.x += dx * 2
-                mario.z += dz * 2
-                goomba.health -= 1
+
+            elif kinds == ('goomba', 'mario'):
+                goomba = a.obj
                 if goomba.health <= 0:
-                    goombas.remove(goomba)
+                    continue
+                dx = mario.x - goomba.x
+                dz = mario.z - goomba.z
+                dy = mario.y - goomba.y
+                dist = math.sqrt(dx*dx + dz*dz + dy*dy)
+                if dist < 40:
+                    mario_health -= 10
+                    if mario_health <= 0:
+                        # game over -> back to menu
+                        return "menu"
+                    mario.x += dx * 2
+                    mario.z += dz * 2
+                    goomba.health -= 1
+                    if goomba.health <= 0:
+                        goombas.remove(goomba)
+                        walkers.kill(goomba)
+                        broadphase.remove(goomba)
+
+            elif kinds == ('goomba', 'goomba'):
+                # Walk apart
+                left, right = sorted((a.obj, b.obj), key=lambda g: g.x)
+                left.direction = -1
+                right.direction = 1
+
+            elif kinds == ('goomba', 'wall'):
+                # Step back out of the wall and turn around
+                goomba, wall = a.obj, b
+                if goomba.x < wall.obj.x:
+                    goomba.x = wall.minx - GOOMBA_HALF
+                    goomba.direction = -1
+                else:
+                    goomba.x = wall.maxx + GOOMBA_HALF
+                    goomba.direction = 1
 
         # Keep bounds
         if mario.x > 900: mario.x = 900
@@ -483,28 +438,27 @@ def run_game(screen, clock, settings):
         camera['y'] += (target_cam_y - camera['y']) * 0.08
         camera['z'] += (target_cam_z - camera['z']) * 0.08
 
+        if not draw:
+            continue
+
         # --- RENDER ---
+        t_sim = now()
         screen.fill(DD_SKY)
-        render_list = []
-
-        render_mesh(level, camera, render_list)
-        render_mesh(mario, camera, render_list)
-        for coin in coins:
-            render_mesh(coin, camera, render_list)
-        for goomba in goombas:
-            render_mesh(goomba, camera, render_list)
-
-        render_list.sort(key=lambda x: x['depth'], reverse=True)
-
-        for item in render_list:
-            depth = item['depth']
-            fog = min(1.0, depth / VIEW_DISTANCE)
-            r, g, b = item['color']
-            sr, sg, sb = DD_SKY
-            fr = int(r + (sr - r) * fog)
-            fg = int(g + (sg - g) * fog)
-            fb = int(b + (sb - b) * fog)
-            pygame.draw.polygon(screen, (fr, fg, fb), item['poly'])
+        polys = []
+
+        # Near plane, view distance, back faces and off-screen faces are
+        # culled; fog reaches the sky color at VIEW_DISTANCE
+        culled = 0
+        for mesh in (level, mario, *coins, *goombas):
+            culled += RENDERER.render(mesh, camera, polys, VIEW_DISTANCE,
+                                      backface=True, clip=True)
+        t_render = now()
+
+        RENDERER.sort(polys)
+        t_sort = now()
+
+        drawn = RENDERER.draw(screen, polys, (0, VIEW_DISTANCE, DD_SKY))
+        t_draw = now()
 
         # --- HUD ---
         hud_surf = pygame.Surface((WIDTH, 60))
@@ -512,20 +466,26 @@ def run_game(screen, clock, settings):
         hud_surf.fill((0, 0, 0))
         screen.blit(hud_surf, (0, HEIGHT - 60))
 
-        coin_text = small_font.render(f"Coins: {coins_collected}", True, YELLOW)
-        screen.blit(coin_text, (20, HEIGHT - 50))
+        hud.blit(screen, small_font, f"Coins: {coins_collected}", YELLOW, (20, HEIGHT - 50))
 
         pygame.draw.rect(screen, (100, 0, 0), (20, HEIGHT - 30, 200, 20))
         pygame.draw.rect(screen, HEALTH_BAR, (20, HEIGHT - 30, int(200 * mario_health / 100), 20))
 
         if settings['show_fps']:
-            fps_text = small_font.render(f"FPS: {int(clock.get_fps())}", True, CHECKER_LIGHT)
-            screen.blit(fps_text, (WIDTH - 110, HEIGHT - 50))
+            hud.blit(screen, small_font, f"FPS: {int(clock.get_fps())}", CHECKER_LIGHT,
+                     (WIDTH - 110, HEIGHT - 50))
 
-        castle_text = small_font.render("Peach's Castle", True, (255, 200, 200))
-        screen.blit(castle_text, (WIDTH - 250, HEIGHT - 30))
+        hud.blit(screen, small_font, "Peach's Castle", (255, 200, 200), (WIDTH - 250, HEIGHT - 30))
 
+        t_hud = now()
+        if profiler.enabled:
+            profiler.draw(screen, engine.font('Arial', 13), 1000 / FPS)
+        t_flip = now()
         pygame.display.flip()
+        if profiler.enabled:
+            profiler.record((t_events - t_start, t_sim - t_events, t_render - t_sim,
+                             t_sort - t_render, t_draw - t_sort, t_hud - t_draw,
+                             now() - t_flip), (drawn + culled, culled, drawn))
 
     return "menu"
 
@@ -539,11 +499,12 @@ def draw_centered_text(surface, text, font, y, color=WHITE):
     rect = s.get_rect(center=(WIDTH // 2, y))
     surface.blit(s, rect)
 
-def menu_loop(screen, clock, settings):
+def menu_loop(engine, settings):
     """Returns 'start' to run game, or 'quit'."""
-    title_font = pygame.font.SysFont('Arial', 44, bold=True)
-    big_font = pygame.font.SysFont('Arial', 28, bold=True)
-    small_font = pygame.font.SysFont('Arial', 18)
+    screen, clock = engine.screen, engine.clock
+    title_font = engine.font('Arial', 44, bold=True)
+    big_font = engine.font('Arial', 28, bold=True)
+    small_font = engine.font('Arial', 18)
 
     state = "title"   # 'title' -> 'main' -> 'options'
     selected = 0
@@ -667,11 +628,35 @@ def menu_loop(screen, clock, settings):
 #  PROGRAM ENTRYPOINT
 # ============================================================
 
+def run_headless(argv):
+    """--headless [--no-render] [--ticks N] [--seed S]: soak/bench run."""
+    def opt(flag, default):
+        return int(argv[argv.index(flag) + 1]) if flag in argv else default
+
+    engine = Engine((WIDTH, HEIGHT), CAPTION, headless=True)
+    settings = {
+        'show_fps': False,
+        'rotation_speed': DEFAULT_ROTATION_SPEED,
+        'move_speed': DEFAULT_MOVE_SPEED,
+    }
+    stats = {}
+    started = time.perf_counter()
+    run_game(engine, settings, RandomWalkInput(opt("--seed", 0), SOAK_MOVES),
+             headless=True, draw="--no-render" not in argv,
+             max_ticks=opt("--ticks", 3600), stats=stats)
+    elapsed = time.perf_counter() - started
+    ticks = min(stats['ticks'], opt("--ticks", 3600))
+    print(f"headless: {ticks} ticks in {elapsed:.2f}s "
+          f"({ticks / elapsed:.0f} ticks/s), {stats['mario'].coins} coins")
+    engine.quit()
+
+
 def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("AC'S SM64 PY PORT 1.X")
-    clock = pygame.time.Clock()
+    if "--headless" in sys.argv:
+        run_headless(sys.argv)
+        sys.exit()
+
+    engine = Engine((WIDTH, HEIGHT), CAPTION)
 
     settings = {
         'show_fps': True,
@@ -680,16 +665,16 @@ def main():
     }
 
     while True:
-        action = menu_loop(screen, clock, settings)
+        action = menu_loop(engine, settings)
         if action == "quit":
             break
         if action == "start":
-            result = run_game(screen, clock, settings)
+            result = run_game(engine, settings)
             if result == "quit":
                 break
             # else goes back to menu
 
-    pygame.quit()
+    engine.quit()
     sys.exit()
 
 
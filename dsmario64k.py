@@ -1,18 +1,41 @@
 import pygame
 import math
+import os
 import sys
 from random import randint
 
+from sm64engine import (CollectiblePool, Engine, Entities, Entity, FixedStep,
+                        Mesh, ProfileCapture, Solid, SweepAndPrune, TextCache,
+                        make_renderer)
+
 # --- CONFIGURATION ---
 WIDTH, HEIGHT = 800, 600
 FPS = 60
+CAPTION = "SUPER MARIO 64DD - PEACH'S CASTLE"
 FOV = 500
-VIEW_DISTANCE = 5000
+VIEW_DISTANCE = 5000  # far plane; fog reaches the sky color here
 ROTATION_SPEED = 0.05
+# Camera pitch (radians, positive looks down) stays within these;
+# Up/Down tilt it
+PITCH_MIN, PITCH_MAX = -0.3, 0.9
 MOVE_SPEED = 12
 JUMP_FORCE = 18
 GRAVITY = 0.9
 COIN_ROTATION_SPEED = 0.1
+# Coins and goombas this far from the camera sleep: they are not
+# animated, and goombas patrol in strides (see sm64engine.entities)
+SLEEP_DISTANCE = VIEW_DISTANCE * 1.5
+
+# Fixed simulation rate (speeds above are per tick) and how many ticks a
+# slow frame may catch up before the remaining time is dropped.
+TICK_RATE = 60
+MAX_CATCHUP_STEPS = 5
+TICK_MS = 1000 / TICK_RATE
+
+# F4 (or SM64_PROFILE_FRAMES=N in the environment, from the first frame)
+# captures cProfile stats and sampled stacks for PROFILE_FRAMES frames.
+PROFILE_FRAMES = 120
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
 
 # --- COLORS ---
 DD_SKY = (20, 20, 60)
@@ -35,76 +58,12 @@ GOOMBA_PUPIL = (0, 0, 0)
 COIN_COLOR = (255, 215, 0)
 HEALTH_BAR = (220, 20, 60)
 
-# --- 3D MATH UTILITIES ---
-
-class Vector3:
-    __slots__ = ('x', 'y', 'z')
-    def __init__(self, x, y, z):
-        self.x = x
-        self.y = y
-        self.z = z
-
-class Face:
-    __slots__ = ('indices', 'color', 'avg_z', 'normal')
-    def __init__(self, indices, color):
-        self.indices = indices
-        self.color = color
-        self.avg_z = 0
-        self.normal = None
-
-def normalize(vx, vy, vz):
-    length = math.sqrt(vx*vx + vy*vy + vz*vz)
-    if length == 0:
-        return (0, 0, 1)
-    return (vx/length, vy/length, vz/length)
-
-def cross(ax, ay, az, bx, by, bz):
-    return (ay*bz - az*by, az*bx - ax*bz, ax*by - ay*bx)
-
-# --- BASE MESH CLASS ---
-
-class Mesh:
-    def __init__(self, x=0, y=0, z=0):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.yaw = 0
-        self.vertices = []
-        self.faces = []
-        self.active = True
-
-    def add_cube(self, w, h, d, offset_x, offset_y, offset_z, color):
-        """Add a cube to the mesh at local offset."""
-        start_idx = len(self.vertices)
-        hw, hh, hd = w/2, h/2, d/2
-        corners = [
-            (-hw, -hh, -hd), ( hw, -hh, -hd), ( hw,  hh, -hd), (-hw,  hh, -hd), # back
-            (-hw, -hh,  hd), ( hw, -hh,  hd), ( hw,  hh,  hd), (-hw,  hh,  hd)  # front
-        ]
-        for cx, cy, cz in corners:
-            self.vertices.append(Vector3(cx + offset_x, cy + offset_y, cz + offset_z))
-
-        # Face definitions (indices relative to start_idx)
-        cube_faces = [
-            ([0,1,2,3], color), # back
-            ([5,4,7,6], color), # front
-            ([4,0,3,7], color), # left
-            ([1,5,6,2], color), # right
-            ([3,2,6,7], color), # top
-            ([4,5,1,0], color)  # bottom
-        ]
-        for idx_list, col in cube_faces:
-            shifted = [i + start_idx for i in idx_list]
-            face = Face(shifted, col)
-            # Precompute face normal for backface culling (world space, not rotated yet)
-            v0 = self.vertices[shifted[0]]
-            v1 = self.vertices[shifted[1]]
-            v2 = self.vertices[shifted[2]]
-            ax, ay, az = v1.x - v0.x, v1.y - v0.y, v1.z - v0.z
-            bx, by, bz = v2.x - v0.x, v2.y - v0.y, v2.z - v0.z
-            nx, ny, nz = cross(ax, ay, az, bx, by, bz)
-            face.normal = normalize(nx, ny, nz)
-            self.faces.append(face)
+# --- 3D CORE ---
+# Vector3, Face and Mesh come from sm64engine, shared with the other
+# ports; meshes are built with Mesh.add_cube. SM64_RENDERER=python|numpy
+# picks the renderer backend, which turns the camera dict's yaw and pitch
+# and each mesh's yaw and position into one view matrix per mesh.
+RENDERER = make_renderer((WIDTH, HEIGHT), FOV)
 
 # --- SPECIFIC GAME OBJECTS ---
 
@@ -169,11 +128,10 @@ class Mario(Mesh):
         self.x += dx
         self.z += dz
 
-class Coin(Mesh):
+class Coin(Entity):
     """Simple rotating coin."""
     def __init__(self, x, y, z):
         super().__init__(x, y, z)
-        self.angle = 0
         self.collected = False
         # Build a flat octagon to look like a coin
         self.build_coin()
@@ -184,13 +142,12 @@ class Coin(Mesh):
         self.add_cube(10, 2, 10, 0, 2, 0, YELLOW)
         self.add_cube(8, 2, 8, 0, 4, 0, YELLOW)
 
-    def update(self):
-        self.angle += COIN_ROTATION_SPEED
-        if self.angle > 2*math.pi:
-            self.angle -= 2*math.pi
-        self.yaw = self.angle
+    @staticmethod
+    def animate(coins):
+        """Spin every awake coin in the ``coins`` store."""
+        coins.spin(COIN_ROTATION_SPEED)
 
-class Goomba(Mesh):
+class Goomba(Entity):
     """Simple enemy that walks back and forth."""
     def __init__(self, x, y, z):
         super().__init__(x, y, z)
@@ -213,19 +170,25 @@ class Goomba(Mesh):
         self.add_cube(8, 4, 12, -8, 0, 0, BROWN)
         self.add_cube(8, 4, 12,  8, 0, 0, BROWN)
 
-    def update(self, dt):
-        self.x += self.direction * self.speed * (dt / 16.67)
-        # Simple patrol boundary
-        if self.x > 600:
-            self.direction = -1
-        elif self.x < -600:
-            self.direction = 1
+    @staticmethod
+    def patrol(walkers, dt):
+        """Walk every goomba in the ``walkers`` store back and forth."""
+        walkers.patrol(dt / 16.67, -600, 600)
 
 class Level(Mesh):
     def __init__(self):
         super().__init__(0, 0, 0)
+        self.solids = []
         self.build_castle()
 
+    def add_cube(self, w, h, d, offset_x, offset_y, offset_z, color):
+        super().add_cube(w, h, d, offset_x, offset_y, offset_z, color)
+        # Anything standing on the courtyard blocks walkers
+        bottom, top = offset_y - h/2, offset_y + h/2
+        if bottom <= 5 and top > 0:
+            self.solids.append(Solid(offset_x - w/2, offset_x + w/2, bottom, top,
+                                     offset_z - d/2, offset_z + d/2))
+
     def build_castle(self):
         """Construct Peach's Castle using cubes."""
         # --- Ground / Courtyard ---
@@ -291,157 +254,62 @@ class Level(Mesh):
         self.add_cube(10, 60, 10, 0, 400, 0, YELLOW)
         self.add_cube(60, 10, 10, 0, 400, 0, YELLOW)
 
-# --- COLLISION DETECTION (simple AABB) ---
-def aabb_collide(obj1, obj2, margin=0):
-    # Placeholder – actual collision would use bounding boxes
-    return False
-
-# --- MAIN RENDERER ---
-def project_vertex(vx, vy, vz, cam_x, cam_y, cam_z, cam_yaw, cam_pitch, fov, cx, cy):
-    """Transform world vertex to camera space and project to screen."""
-    # Translate
-    tx = vx - cam_x
-    ty = vy - cam_y
-    tz = vz - cam_z
-
-    # Rotate around Y (yaw)
-    c_y = math.cos(-cam_yaw)
-    s_y = math.sin(-cam_yaw)
-    rx = tx * c_y - tz * s_y
-    rz = tx * s_y + tz * c_y
-    ry = ty
-
-    # Rotate around X (pitch) – simplified, we'll skip for clarity
-    # For now, keep pitch at 0 for simplicity
-
-    if rz < 1:  # near clip
-        return None
-    scale = fov / rz
-    sx = int(rx * scale + cx)
-    sy = int(-ry * scale + cy)
-    return (sx, sy, rz)
-
-def render_mesh(mesh, cam, render_list):
-    """Process a mesh: transform vertices, cull, and add to render list."""
-    if not mesh.active:
-        return
-    world_x, world_y, world_z = mesh.x, mesh.y, mesh.z
-    yaw = mesh.yaw
-
-    # Precompute object rotation
-    c_yaw = math.cos(yaw)
-    s_yaw = math.sin(yaw)
-
-    # Camera params
-    cx, cy = cam['cx'], cam['cy']
-    cam_x, cam_y, cam_z = cam['x'], cam['y'], cam['z']
-    cam_yaw = cam['yaw']
-    # For now, we ignore pitch for simplicity
-
-    # Precompute camera rotation
-    c_cam = math.cos(-cam_yaw)
-    s_cam = math.sin(-cam_yaw)
-
-    for face in mesh.faces:
-        # 1. Transform vertices to camera space
-        cam_verts = []
-        valid = True
-        for idx in face.indices:
-            v = mesh.vertices[idx]
-            # Object rotation
-            rx = v.x * c_yaw - v.z * s_yaw
-            rz = v.x * s_yaw + v.z * c_yaw
-            ry = v.y
-            # World position
-            wx = rx + world_x
-            wy = ry + world_y
-            wz = rz + world_z
-            # Camera transform
-            tx = wx - cam_x
-            ty = wy - cam_y
-            tz = wz - cam_z
-            # Rotate by camera
-            dx = tx * c_cam - tz * s_cam
-            dz = tx * s_cam + tz * c_cam
-            dy = ty
-            if dz < 1:
-                valid = False
-                break
-            cam_verts.append((dx, dy, dz))
-
-        if not valid or len(cam_verts) < 3:
-            continue
-
-        # 2. Backface culling in screen space (using projected area sign)
-        # Project to screen
-        screen_pts = []
-        avg_z = 0
-        for dx, dy, dz in cam_verts:
-            scale = FOV / dz
-            sx = int(dx * scale + cx)
-            sy = int(-dy * scale + cy)
-            screen_pts.append((sx, sy))
-            avg_z += dz
-        avg_z /= len(cam_verts)
-
-        # Compute signed area
-        area = 0
-        n = len(screen_pts)
-        for i in range(n):
-            x1, y1 = screen_pts[i]
-            x2, y2 = screen_pts[(i+1)%n]
-            area += (x2 - x1) * (y2 + y1)
-        if area <= 0:  # backface (clockwise in Pygame's coordinate system)
-            continue
-
-        # 3. Frustum culling (simple: check if all points are off-screen)
-        off_screen = True
-        for sx, sy in screen_pts:
-            if 0 <= sx < WIDTH and 0 <= sy < HEIGHT:
-                off_screen = False
-                break
-        if off_screen:
-            continue
-
-        # 4. Add to render list
-        render_list.append({
-            'poly': screen_pts,
-            'depth': avg_z,
-            'color': face.color
-        })
+# --- COLLISION DETECTION (sweep-and-prune broadphase) ---
+
+# Box half-extents; Mario + coin/goomba add up to the 40-unit pickup and
+# hit radius used by the narrowphase.
+MARIO_HALF = 28
+COIN_HALF = 12
+GOOMBA_HALF = 12
+
 
 # --- GAME INITIALIZATION ---
 def main():
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("SUPER MARIO 64DD - PEACH'S CASTLE")
-    clock = pygame.time.Clock()
-    font = pygame.font.SysFont('Arial', 24, bold=True)
-    small_font = pygame.font.SysFont('Arial', 18)
+    engine = Engine((WIDTH, HEIGHT), CAPTION)
+    screen, clock = engine.screen, engine.clock
+    small_font = engine.font('Arial', 18)
+    hud = TextCache()
 
     # Create game objects
     mario = Mario(0, 20, 0)
     level = Level()
-    coins = [Coin(randint(-500,500), 50, randint(-500,500)) for _ in range(5)]
+    coins = CollectiblePool([Coin(randint(-500,500), 50, randint(-500,500)) for _ in range(5)], 40,
+                            system=Coin.animate, sleep_radius=SLEEP_DISTANCE)
     goombas = [Goomba(randint(-400,400), 0, randint(-400,400)) for _ in range(3)]
+    walkers = Entities(goombas, SLEEP_DISTANCE)
+
+    # Broadphase: every dynamic entity plus the castle's standing solids
+    broadphase = SweepAndPrune()
+    broadphase.add(mario, 'mario', MARIO_HALF)
+    for coin in coins:
+        broadphase.add(coin, 'coin', COIN_HALF)
+    for goomba in goombas:
+        broadphase.add(goomba, 'goomba', GOOMBA_HALF, oy=GOOMBA_HALF)
+    for solid in level.solids:
+        broadphase.add_solid(solid)
 
     # Camera
     camera = {
         'x': 0, 'y': 300, 'z': 800,
-        'yaw': 0, 'pitch': 0.2,
-        'cx': WIDTH//2, 'cy': HEIGHT//2
+        'yaw': 0, 'pitch': 0.2
     }
 
     # Game state
     coins_collected = 0
     mario_health = 100
 
+    stepper = FixedStep(TICK_RATE, MAX_CATCHUP_STEPS)
+    prev_pos = (mario.x, mario.y, mario.z)
+    prev_cam = dict(camera)
+
+    capture = ProfileCapture(PROFILE_DIR)
+    if os.environ.get("SM64_PROFILE_FRAMES"):
+        capture.start(int(os.environ["SM64_PROFILE_FRAMES"]), "Peach's Castle", camera)
+
     running = True
     while running:
-        dt = clock.tick(FPS)
-        # Cap dt to avoid large jumps
-        if dt > 50:
-            dt = 16
+        clock.tick(FPS)
+        capture.frame()
 
         # --- EVENTS ---
         for event in pygame.event.get():
@@ -452,120 +320,155 @@ def main():
                     mario.jump()
                 if event.key == pygame.K_ESCAPE:
                     running = False
+                if event.key == pygame.K_F4:
+                    capture.start(PROFILE_FRAMES, "Peach's Castle", camera)
+
+        # --- SIMULATION (fixed ticks; keep the previous tick's state) ---
+        for _ in range(stepper.advance()):
+            prev_pos = (mario.x, mario.y, mario.z)
+            prev_cam = dict(camera)
+
+            keys = pygame.key.get_pressed()
+
+            # --- CAMERA ROTATION ---
+            if keys[pygame.K_a]:
+                camera['yaw'] -= ROTATION_SPEED
+            if keys[pygame.K_d]:
+                camera['yaw'] += ROTATION_SPEED
+            if keys[pygame.K_UP]:
+                camera['pitch'] = max(PITCH_MIN, camera['pitch'] - ROTATION_SPEED)
+            if keys[pygame.K_DOWN]:
+                camera['pitch'] = min(PITCH_MAX, camera['pitch'] + ROTATION_SPEED)
+
+            # --- MARIO MOVEMENT ---
+            move_x, move_z = 0, 0
+            if keys[pygame.K_w]:
+                move_z -= MOVE_SPEED
+            if keys[pygame.K_s]:
+                move_z += MOVE_SPEED
+            if keys[pygame.K_q]:
+                move_x -= MOVE_SPEED
+            if keys[pygame.K_e]:
+                move_x += MOVE_SPEED
 
-        keys = pygame.key.get_pressed()
-
-        # --- CAMERA ROTATION ---
-        if keys[pygame.K_a]:
-            camera['yaw'] -= ROTATION_SPEED
-        if keys[pygame.K_d]:
-            camera['yaw'] += ROTATION_SPEED
-
-        # --- MARIO MOVEMENT ---
-        move_x, move_z = 0, 0
-        if keys[pygame.K_w]:
-            move_z -= MOVE_SPEED
-        if keys[pygame.K_s]:
-            move_z += MOVE_SPEED
-        if keys[pygame.K_q]:
-            move_x -= MOVE_SPEED
-        if keys[pygame.K_e]:
-            move_x += MOVE_SPEED
-
-        if move_x != 0 or move_z != 0:
-            # Camera-relative movement
-            world_dx = move_x * math.cos(camera['yaw']) - move_z * math.sin(camera['yaw'])
-            world_dz = move_x * math.sin(camera['yaw']) + move_z * math.cos(camera['yaw'])
-            mario.move(world_dx, world_dz)
-            # Rotate Mario to face movement direction
             if move_x != 0 or move_z != 0:
-                mario.yaw = math.atan2(world_dx, world_dz)
-
-        # --- PHYSICS UPDATE ---
-        mario.update(dt)
-        for coin in coins:
-            coin.update()
-        for goomba in goombas:
-            goomba.update(dt)
-
-        # --- COLLISION DETECTION (simple distance-based) ---
-        # Mario vs coins
-        for coin in coins[:]:
-            if not coin.collected:
-                dx = mario.x - coin.x
-                dz = mario.z - coin.z
-                dy = mario.y - coin.y
-                dist = math.sqrt(dx*dx + dz*dz + dy*dy)
-                if dist < 40:
-                    coin.collected = True
-                    coins_collected += 1
-                    mario.coins += 1
-        coins = [c for c in coins if not c.collected]
-
-        # Mario vs goombas
-        for goomba in goombas[:]:
-            dx = mario.x - goomba.x
-            dz = mario.z - goomba.z
-            dy = mario.y - goomba.y
-            dist = math.sqrt(dx*dx + dz*dz + dy*dy)
-            if dist < 40:
-                mario_health -= 10
-                if mario_health <= 0:
-                    print("Game Over!")
-                    running = False
-                # knockback
-                mario.x += dx * 2
-                mario.z += dz * 2
-                goomba.health -= 1
-                if goomba.health <= 0:
-                    goombas.remove(goomba)
-
-        # Keep Mario within castle bounds (approximate)
-        margin = 400
-        if mario.x > 900:
-            mario.x = 900
-        if mario.x < -900:
-            mario.x = -900
-        if mario.z > 900:
-            mario.z = 900
-        if mario.z < -900:
-            mario.z = -900
-
-        # --- CAMERA FOLLOW ---
-        target_cam_x = mario.x - math.sin(camera['yaw']) * 500
-        target_cam_z = mario.z - math.cos(camera['yaw']) * 500
-        target_cam_y = mario.y + 200
-
-        camera['x'] += (target_cam_x - camera['x']) * 0.08
-        camera['y'] += (target_cam_y - camera['y']) * 0.08
-        camera['z'] += (target_cam_z - camera['z']) * 0.08
+                # Camera-relative movement
+                world_dx = move_x * math.cos(camera['yaw']) - move_z * math.sin(camera['yaw'])
+                world_dz = move_x * math.sin(camera['yaw']) + move_z * math.cos(camera['yaw'])
+                mario.move(world_dx, world_dz)
+                # Rotate Mario to face movement direction
+                if move_x != 0 or move_z != 0:
+                    mario.yaw = math.atan2(world_dx, world_dz)
+
+            # --- PHYSICS UPDATE ---
+            mario.update(TICK_MS)
+            coins.animate(camera['x'], camera['z'])
+            walkers.tick(camera['x'], camera['z'])
+            Goomba.patrol(walkers, TICK_MS)
+
+            # --- COLLISION DETECTION ---
+            # Only pairs whose boxes overlap reach the narrowphase below
+            for a, b in broadphase.pairs():
+                if a.kind > b.kind:
+                    a, b = b, a
+                kinds = (a.kind, b.kind)
+
+                if kinds == ('coin', 'mario'):
+                    coin = a.obj
+                    if coin.collected:
+                        continue
+                    dx = mario.x - coin.x
+                    dz = mario.z - coin.z
+                    dy = mario.y - coin.y
+                    dist = math.sqrt(dx*dx + dz*dz + dy*dy)
+                    if dist < 40:
+                        coin.collected = True
+                        coins.remove(coin)
+                        broadphase.remove(coin)
+                        coins_collected += 1
+                        mario.coins += 1
+
+                elif kinds == ('goomba', 'mario'):
+                    goomba = a.obj
+                    if goomba.health <= 0:
+                        continue
+                    dx = mario.x - goomba.x
+                    dz = mario.z - goomba.z
+                    dy = mario.y - goomba.y
+                    dist = math.sqrt(dx*dx + dz*dz + dy*dy)
+                    if dist < 40:
+                        mario_health -= 10
+                        if mario_health <= 0:
+                            print("Game Over!")
+                            running = False
+                        # knockback
+                        mario.x += dx * 2
+                        mario.z += dz * 2
+                        goomba.health -= 1
+                        if goomba.health <= 0:
+                            goombas.remove(goomba)
+                            walkers.kill(goomba)
+                            broadphase.remove(goomba)
+
+                elif kinds == ('goomba', 'goomba'):
+                    # Walk apart
+                    left, right = sorted((a.obj, b.obj), key=lambda g: g.x)
+                    left.direction = -1
+                    right.direction = 1
+
+                elif kinds == ('goomba', 'wall'):
+                    # Step back out of the wall and turn around
+                    goomba, wall = a.obj, b
+                    if goomba.x < wall.obj.x:
+                        goomba.x = wall.minx - GOOMBA_HALF
+                        goomba.direction = -1
+                    else:
+                        goomba.x = wall.maxx + GOOMBA_HALF
+                        goomba.direction = 1
+
+            # Keep Mario within castle bounds (approximate)
+            margin = 400
+            if mario.x > 900:
+                mario.x = 900
+            if mario.x < -900:
+                mario.x = -900
+            if mario.z > 900:
+                mario.z = 900
+            if mario.z < -900:
+                mario.z = -900
+
+            # --- CAMERA FOLLOW ---
+            target_cam_x = mario.x - math.sin(camera['yaw']) * 500
+            target_cam_z = mario.z - math.cos(camera['yaw']) * 500
+            target_cam_y = mario.y + 200
+
+            camera['x'] += (target_cam_x - camera['x']) * 0.08
+            camera['y'] += (target_cam_y - camera['y']) * 0.08
+            camera['z'] += (target_cam_z - camera['z']) * 0.08
+
+        # Draw Mario and the camera between the last two ticks
+        alpha = stepper.alpha
+        view = {k: prev_cam[k] + (camera[k] - prev_cam[k]) * alpha for k in camera}
+        sim_pos = (mario.x, mario.y, mario.z)
+        mario.x, mario.y, mario.z = (p + (c - p) * alpha
+                                     for p, c in zip(prev_pos, sim_pos))
 
         # --- RENDERING ---
         screen.fill(DD_SKY)
 
-        render_list = []
+        polys = []
 
-        # Process all meshes
-        render_mesh(level, camera, render_list)
-        render_mesh(mario, camera, render_list)
-        for coin in coins:
-            render_mesh(coin, camera, render_list)
-        for goomba in goombas:
-            render_mesh(goomba, camera, render_list)
+        # Process all meshes: near plane, view distance, back faces and
+        # off-screen faces are culled
+        for mesh in (level, mario, *coins, *goombas):
+            RENDERER.render(mesh, view, polys, VIEW_DISTANCE, backface=True, clip=True)
+        mario.x, mario.y, mario.z = sim_pos
 
         # Sort by depth (far to near)
-        render_list.sort(key=lambda x: x['depth'], reverse=True)
-
-        # Draw polygons with fog
-        for item in render_list:
-            depth = item['depth']
-            fog = min(1.0, depth / VIEW_DISTANCE)
-            r, g, b = item['color']
-            sr, sg, sb = DD_SKY
-            fr = int(r + (sr - r) * fog)
-            fg = int(g + (sg - g) * fog)
-            fb = int(b + (sb - b) * fog)
-            pygame.draw.polygon(screen, (fr, fg, fb), item['poly'])
+        RENDERER.sort(polys)
+
+        # Draw polygons with fog reaching the sky color at VIEW_DISTANCE
+        RENDERER.draw(screen, polys, (0, VIEW_DISTANCE, DD_SKY))
 
         # --- HUD ---
         hud_surf = pygame.Surface((WIDTH, 60))
@@ -574,24 +477,23 @@ def main():
         screen.blit(hud_surf, (0, HEIGHT-60))
 
         # Coin count
-        coin_text = small_font.render(f"Coins: {coins_collected}", True, YELLOW)
-        screen.blit(coin_text, (20, HEIGHT-50))
+        hud.blit(screen, small_font, f"Coins: {coins_collected}", YELLOW, (20, HEIGHT-50))
 
         # Health bar
         pygame.draw.rect(screen, (100,0,0), (20, HEIGHT-30, 200, 20))
         pygame.draw.rect(screen, HEALTH_BAR, (20, HEIGHT-30, int(200 * mario_health/100), 20))
 
         # FPS
-        fps_text = small_font.render(f"FPS: {int(clock.get_fps())}", True, CHECKER_LIGHT)
-        screen.blit(fps_text, (WIDTH-100, HEIGHT-50))
+        hud.blit(screen, small_font, f"FPS: {int(clock.get_fps())}", CHECKER_LIGHT, (WIDTH-100, HEIGHT-50))
 
         # Castle name
-        castle_text = small_font.render("Peach's Castle", True, (255, 200, 200))
-        screen.blit(castle_text, (WIDTH-250, HEIGHT-30))
+        hud.blit(screen, small_font, "Peach's Castle", (255, 200, 200), (WIDTH-250, HEIGHT-30))
 
         pygame.display.flip()
 
-    pygame.quit()
+    capture.finish()
+    print(stepper.summary())
+    engine.quit()
     sys.exit()
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@ import pygame
 import sys
 import math
 
-pygame.init()
+from sm64engine import Engine, compose_card, fade, show_card
 
 # =====================================================
 # CONFIG
@@ -11,9 +11,7 @@ pygame.init()
 WIDTH, HEIGHT = 900, 600
 FPS = 60
 
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Ultra Mario 3D Bros")
-clock = pygame.time.Clock()
+CAPTION = "Ultra Mario 3D Bros"
 
 # =====================================================
 # COLORS
@@ -24,37 +22,15 @@ WHITE = (255, 255, 255)
 RED = (220, 20, 60)
 BLUE = (0, 0, 205)
 YELLOW = (255, 215, 0)
-PARCHMENT = (245, 235, 205)
-PARCHMENT_BORDER = (190, 150, 100)
-INK = (70, 40, 25)
-
-# =====================================================
-# FADE SYSTEM
-# =====================================================
-
-def fade(mode="out", duration=300):
-    overlay = pygame.Surface((WIDTH, HEIGHT))
-    overlay.fill((0, 0, 0))
-
-    t = 0
-    while t < duration:
-        dt = clock.tick(FPS)
-        t += dt
-        p = min(1, t/duration)
-
-        alpha = int(255*p) if mode == "out" else int(255*(1-p))
-        overlay.set_alpha(alpha)
-
-        screen.blit(overlay, (0,0))
-        pygame.display.flip()
 
 # =====================================================
 # TITLE SCREEN
 # =====================================================
 
-def title_screen():
-    title_font = pygame.font.SysFont("Arial", 64, bold=True)
-    small_font = pygame.font.SysFont("Arial", 20)
+def title_screen(engine):
+    screen, clock = engine.screen, engine.clock
+    title_font = engine.font("Arial", 64, bold=True)
+    small_font = engine.font("Arial", 20)
     pulse = 0
 
     while True:
@@ -94,10 +70,10 @@ def title_screen():
 # DEAR MARIO LETTER
 # =====================================================
 
-def dear_mario():
-    title_font = pygame.font.SysFont("Times New Roman", 36, bold=True)
-    body_font = pygame.font.SysFont("Times New Roman", 26)
-    small_font = pygame.font.SysFont("Arial", 18)
+def dear_mario(engine):
+    title_font = engine.font("Times New Roman", 36, bold=True)
+    body_font = engine.font("Times New Roman", 26)
+    small_font = engine.font("Arial", 18)
 
     lines = [
         "Dear Mario,",
@@ -109,69 +85,47 @@ def dear_mario():
         "Princess Toadstool"
     ]
 
-    fade_val = 0
-
-    while True:
-        dt = clock.tick(FPS)
-        fade_val = min(255, fade_val + dt*0.8)
-
-        for e in pygame.event.get():
-            if e.type == pygame.QUIT:
-                return "quit"
-            if e.type == pygame.KEYDOWN:
-                if e.key in (pygame.K_RETURN, pygame.K_SPACE):
-                    return "continue"
-
-        screen.fill(SKY)
-
-        card = pygame.Surface((600, 380), pygame.SRCALPHA)
-        card.fill(PARCHMENT)
-        pygame.draw.rect(card, PARCHMENT_BORDER, card.get_rect(), 6)
-
-        y = 50
-        for i, line in enumerate(lines):
-            if i == 0:
-                text = title_font.render(line, True, INK)
-                card.blit(text, (50, y))
-                y += 60
-            else:
-                text = body_font.render(line, True, INK)
-                card.blit(text, (50, y))
-                y += 35
-
-        hint = small_font.render("PRESS START TO CONTINUE", True, INK)
-        card.blit(hint, (150, 330))
+    texts = [(small_font, "PRESS START TO CONTINUE", (150, 330))]
+    y = 50
+    for i, line in enumerate(lines):
+        texts.append((title_font if i == 0 else body_font, line, (50, y)))
+        y += 60 if i == 0 else 35
+    card = compose_card((600, 380), texts)
 
-        card.set_alpha(fade_val)
-        screen.blit(card, (WIDTH//2 - 300, HEIGHT//2 - 190))
-
-        pygame.display.flip()
+    return "continue" if show_card(engine, card, SKY, rate=0.8, fps=FPS) else "quit"
 
 # =====================================================
 # MAIN LOOP
 # =====================================================
 
-while True:
+def main():
+    engine = Engine((WIDTH, HEIGHT), CAPTION)
+
+    while True:
 
-    result = title_screen()
-    if result == "quit":
-        break
+        result = title_screen(engine)
+        if result == "quit":
+            break
 
-    fade("out")
-    fade("in")
+        fade(engine, "out")
+        fade(engine, "in")
 
-    letter = dear_mario()
-    if letter == "quit":
-        break
+        letter = dear_mario(engine)
+        if letter == "quit":
+            break
+
+        fade(engine, "out")
+
+        # Placeholder for game start
+        engine.screen.fill((0,0,0))
+        pygame.display.flip()
+        pygame.time.wait(800)
 
-    fade("out")
+        fade(engine, "in")
 
-    # Placeholder for game start
-    screen.fill((0,0,0))
-    pygame.display.flip()
-    pygame.time.wait(800)
+    pygame.quit()
+    sys.exit()
 
-    fade("in")
 
-pygame.quit()
-sys.exit()
+if __name__ == "__main__":
+    main()
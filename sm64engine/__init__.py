@@ -0,0 +1,38 @@
+"""Engine code shared by every Super Mario 64 port script.
+
+The window and fonts (``Engine``), the mesh classes, the column store
+for animated entities and pooled collectibles, the renderer backends,
+the menu/card/HUD helpers, trigger volumes, the collision broadphase,
+the fixed timestep, the profilers and the input controllers live here,
+so a fix or speed-up made once reaches every entry script. The scripts
+keep their own levels, game objects and loops.
+"""
+
+from .collision import Box, Solid, SweepAndPrune
+from .engine import Engine
+from .entities import CollectiblePool, Entities, Entity
+from .input import HeldKeys, LiveInput, RandomWalkInput
+from .loop import FixedStep
+from .mesh import BakedMesh, Face, Mesh, Vec3, Vector3
+from .profile import FrameProfiler, ProfileCapture
+from .render import RENDERERS, NumpyRenderer, Renderer, make_renderer
+from .triggers import Trigger, TriggerGrid
+from .ui import INK, PARCHMENT, PARCHMENT_BORDER, TextCache, compose_card, fade, show_card
+
+try:  # importing it registers the "raster" backend
+    from .raster import RasterRenderer
+except ImportError:  # needs numpy
+    RasterRenderer = None
+
+__all__ = [
+    "Box", "Solid", "SweepAndPrune",
+    "Engine",
+    "CollectiblePool", "Entities", "Entity",
+    "HeldKeys", "LiveInput", "RandomWalkInput",
+    "FixedStep",
+    "BakedMesh", "Face", "Mesh", "Vec3", "Vector3",
+    "FrameProfiler", "ProfileCapture",
+    "RENDERERS", "NumpyRenderer", "RasterRenderer", "Renderer", "make_renderer",
+    "Trigger", "TriggerGrid",
+    "INK", "PARCHMENT", "PARCHMENT_BORDER", "TextCache", "compose_card", "fade", "show_card",
+]
@@ -0,0 +1,91 @@
+"""Sweep-and-prune broadphase over the boxes of moving entities."""
+
+
+class Box:
+    """Axis-aligned box following an entity (or fixed, for static solids)."""
+    __slots__ = ('obj', 'kind', 'hx', 'hy', 'hz', 'oy', 'static', 'dead',
+                 'minx', 'maxx', 'miny', 'maxy', 'minz', 'maxz')
+
+    def __init__(self, obj, kind, hx, hy, hz, oy=0, static=False):
+        self.obj = obj
+        self.kind = kind
+        self.hx, self.hy, self.hz = hx, hy, hz
+        self.oy = oy
+        self.static = static
+        self.dead = False
+        self.refresh()
+
+    def refresh(self):
+        o = self.obj
+        self.minx, self.maxx = o.x - self.hx, o.x + self.hx
+        self.miny, self.maxy = o.y + self.oy - self.hy, o.y + self.oy + self.hy
+        self.minz, self.maxz = o.z - self.hz, o.z + self.hz
+
+
+class Solid:
+    """Static obstacle for the broadphase, from a level cube."""
+    def __init__(self, minx, maxx, miny, maxy, minz, maxz):
+        self.x = (minx + maxx) / 2
+        self.y = (miny + maxy) / 2
+        self.z = (minz + maxz) / 2
+        self.half = ((maxx - minx) / 2, (maxy - miny) / 2, (maxz - minz) / 2)
+
+
+class SweepAndPrune:
+    """Sweep-and-prune broadphase over entity AABBs along the X axis.
+
+    Boxes stay sorted by min X from one frame to the next, so the
+    insertion sort in pairs() only moves the few boxes that swapped
+    places and the pass stays close to linear in the number of entities.
+    Only pairs whose boxes overlap on all three axes are returned;
+    static-static pairs are skipped.
+    """
+    def __init__(self):
+        self.boxes = []
+
+    def add(self, obj, kind, hx, hy=None, hz=None, oy=0):
+        box = Box(obj, kind, hx, hx if hy is None else hy, hx if hz is None else hz, oy)
+        self.boxes.append(box)
+        return box
+
+    def add_solid(self, solid, kind='wall'):
+        hx, hy, hz = solid.half
+        box = Box(solid, kind, hx, hy, hz, static=True)
+        self.boxes.append(box)
+        return box
+
+    def remove(self, obj):
+        """Drop obj's box; it is pruned on the next pairs() pass."""
+        for box in self.boxes:
+            if box.obj is obj:
+                box.dead = True
+
+    def pairs(self):
+        boxes = [b for b in self.boxes if not b.dead]
+        for b in boxes:
+            if not b.static:
+                b.refresh()
+
+        # Insertion sort: nearly sorted input from last frame -> ~O(n)
+        for i in range(1, len(boxes)):
+            b = boxes[i]
+            key = b.minx
+            j = i - 1
+            while j >= 0 and boxes[j].minx > key:
+                boxes[j + 1] = boxes[j]
+                j -= 1
+            boxes[j + 1] = b
+        self.boxes = boxes
+
+        found = []
+        active = []
+        for b in boxes:
+            active = [a for a in active if a.maxx >= b.minx]
+            for a in active:
+                if a.static and b.static:
+                    continue
+                if (a.miny <= b.maxy and b.miny <= a.maxy
+                        and a.minz <= b.maxz and b.minz <= a.maxz):
+                    found.append((a, b))
+            active.append(b)
+        return found
@@ -0,0 +1,56 @@
+"""The window, frame clock and fonts shared by every entry script."""
+
+import os
+
+import pygame
+
+
+class Engine:
+    """The window, frame clock and fonts for one run of a game script.
+
+    Nothing here happens at import: entry points create the engine, so
+    meshes, level builders and renderers can be imported by tools and
+    worker processes without opening a window. ``headless`` uses SDL's
+    dummy video and audio drivers instead of real devices.
+    """
+
+    def __init__(self, size, caption, headless=False):
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+            os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+        self.headless = headless
+        pygame.init()
+        self.screen = pygame.display.set_mode(size)
+        pygame.display.set_caption(caption)
+        self.clock = pygame.time.Clock()
+        self.fonts = {}
+
+    @property
+    def size(self):
+        return self.screen.get_size()
+
+    def font(self, name, size, bold=False):
+        """SysFont lookups are slow, so each face is resolved once."""
+        key = (name, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pygame.font.SysFont(name, size, bold=bold)
+        return font
+
+    def font_or_default(self, name, size, bold=False):
+        """The face if already resolved, else pygame's bundled font.
+
+        Loading the bundled font needs no system font scan, so screens
+        shown while fonts are still being resolved can draw text at once.
+        """
+        font = self.fonts.get((name, size, bold))
+        if font is None:
+            key = (None, size, bold)
+            font = self.fonts.get(key)
+            if font is None:
+                font = self.fonts[key] = pygame.font.Font(None, size)
+                font.bold = bold
+        return font
+
+    def quit(self):
+        pygame.quit()
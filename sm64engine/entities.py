@@ -0,0 +1,328 @@
+"""Many small animated meshes kept as columns, updated a column at a time.
+
+An ``Entities`` store owns the placement (x, y, z, yaw) and the walking
+state (direction, speed) of every ``Entity`` added to it, one flat array
+per field. The entity's own attributes read and write its row, so game
+code and renderers use it like any other Mesh, while the systems (spin,
+bob, patrol) update the rows of every entity at once with numpy instead
+of calling a method per object.
+
+Entities more than the sleep radius from the camera are asleep: systems
+skip them, so thousands cost little more than the few in view. Spinning
+and bobbing are closed forms of the tick count, so a sleeper that wakes
+is exactly where it would have been; walkers asleep move in one stride
+every ``SLEEP_STRIDE`` ticks instead of every tick. Which entities are
+awake is only reconsidered once per stride, too.
+
+``CollectiblePool`` keeps coins or stars in such a store and adds
+pickup tests over the whole pool.
+"""
+
+import array
+import math
+
+from .mesh import Mesh
+
+try:
+    import numpy as np
+except ImportError:  # the systems fall back to Python loops
+    np = None
+
+# Ticks between sleep checks, and between the strides of sleeping walkers
+SLEEP_STRIDE = 8
+
+# Per-entity fields and their defaults
+COLUMNS = {"x": 0.0, "y": 0.0, "z": 0.0, "yaw": 0.0, "direction": 1.0, "speed": 0.0}
+
+TAU = 2 * math.pi
+
+
+def column(name):
+    """Attribute stored in the entity's row of column ``name``."""
+    def get(self):
+        return self._columns[name][self._row]
+
+    def set(self, value):
+        self._columns[name][self._row] = value
+
+    return property(get, set)
+
+
+class Entity(Mesh):
+    """A Mesh whose fields live in an Entities store once it is added.
+
+    Until then it keeps them in one-element lists of its own, so an
+    entity can be built, moved and baked before any store exists.
+    """
+
+    x = column("x")
+    y = column("y")
+    z = column("z")
+    yaw = column("yaw")
+    direction = column("direction")
+    speed = column("speed")
+
+    def __init__(self, x=0, y=0, z=0):
+        self._columns = {name: [value] for name, value in COLUMNS.items()}
+        self._row = 0
+        super().__init__(x, y, z)
+
+
+class Entities:
+    """Column store and systems for a set of entities.
+
+    Rows are stable: ``kill`` only marks one dead, and dead rows never
+    wake. ``tick`` advances the store's clock once per simulation step;
+    the systems called after it update the awake rows.
+    """
+
+    def __init__(self, entities=(), sleep_radius=math.inf):
+        self.columns = {name: array.array("d") for name in COLUMNS}
+        self.home = array.array("d")     # y when added: the rest height for bob
+        self.born = array.array("d")     # clock reading when added
+        self.alive = array.array("b")
+        self.entities = []
+        self.sleep_radius = sleep_radius
+        self.ticks = 0
+        # Awake rows and the living rows that are not (arrays with numpy)
+        self.awake, self.asleep = ((np.empty(0, np.intp), np.empty(0, np.intp))
+                                   if np is not None else ([], []))
+        self._sorted = False            # awake/asleep cover every row
+        self._arrays = None
+        for entity in entities:
+            self.add(entity)
+
+    def __len__(self):
+        return len(self.entities)
+
+    def add(self, entity):
+        """Move ``entity``'s fields into a new row; returns the row."""
+        # numpy views export the buffers, which then can't grow
+        self._arrays = None
+        row = len(self.entities)
+        for name, col in self.columns.items():
+            col.append(entity._columns[name][entity._row])
+        entity._columns, entity._row = self.columns, row
+        self.home.append(entity.y)
+        self.born.append(self.ticks)
+        self.alive.append(1)
+        self.entities.append(entity)
+        self._sorted = False
+        return row
+
+    def kill(self, entity):
+        """Stop updating ``entity``; its row keeps its last values."""
+        row = entity._row
+        if self.alive[row]:
+            self.alive[row] = 0
+            if np is not None:
+                self.awake = self.awake[self.awake != row]
+                self.asleep = self.asleep[self.asleep != row]
+            else:
+                for rows in (self.awake, self.asleep):
+                    if row in rows:
+                        rows.remove(row)
+
+    def arrays(self):
+        """numpy views of the columns (plus home, born, alive), by name."""
+        if self._arrays is None:
+            views = {name: np.frombuffer(col, float) for name, col in self.columns.items()}
+            views["home"] = np.frombuffer(self.home, float)
+            views["born"] = np.frombuffer(self.born, float)
+            views["alive"] = np.frombuffer(self.alive, np.int8).view(bool)
+            self._arrays = views
+        return self._arrays
+
+    def awake_entities(self):
+        """The awake entities, for drawing: the others are out of sight.
+
+        Before the first ``tick`` every living entity counts as awake.
+        """
+        entities = self.entities
+        if not self._sorted:
+            return [e for e, alive in zip(entities, self.alive) if alive]
+        rows = self.awake.tolist() if np is not None else self.awake
+        return [entities[row] for row in rows]
+
+    def tick(self, x, z):
+        """Advance the clock one step, watching from (x, z).
+
+        Every SLEEP_STRIDE ticks, the living entities within the sleep
+        radius of (x, z) on the ground plane wake and the rest sleep.
+        """
+        self.ticks += 1
+        if self.ticks % SLEEP_STRIDE and self._sorted:
+            return
+        self._sorted = True
+        r2 = self.sleep_radius * self.sleep_radius
+        if np is not None:
+            a = self.arrays()
+            dx = a["x"] - x
+            dz = a["z"] - z
+            near = dx * dx + dz * dz <= r2
+            self.awake = np.flatnonzero(near & a["alive"])
+            self.asleep = np.flatnonzero(~near & a["alive"])
+        else:
+            xs, zs, alive = self.columns["x"], self.columns["z"], self.alive
+            self.awake, self.asleep = [], []
+            for row in range(len(self.entities)):
+                if alive[row]:
+                    dx, dz = xs[row] - x, zs[row] - z
+                    (self.awake if dx * dx + dz * dz <= r2 else self.asleep).append(row)
+
+    def spin(self, rate):
+        """Turn awake entities ``rate`` radians per tick since they were
+        added, wrapped to [0, 2*pi)."""
+        rows = self.awake
+        if not len(rows):
+            return
+        if np is not None:
+            a = self.arrays()
+            a["yaw"][rows] = ((self.ticks - a["born"][rows]) * rate) % TAU
+        else:
+            yaw, born = self.columns["yaw"], self.born
+            for row in rows:
+                yaw[row] = ((self.ticks - born[row]) * rate) % TAU
+
+    def bob(self, rate, amplitude):
+        """Raise awake entities as if ``y += amplitude * sin(k * rate)``
+        had run on ticks k = 1, 2, ... since they were added.
+
+        That sum has a closed form, so sleepers need no catching up.
+        """
+        rows = self.awake
+        if not len(rows):
+            return
+        half = rate / 2
+        k = amplitude / (2 * math.sin(half))
+        c = math.cos(half)
+        if np is not None:
+            a = self.arrays()
+            n = self.ticks - a["born"][rows]
+            a["y"][rows] = a["home"][rows] + k * (c - np.cos((n + 0.5) * rate))
+        else:
+            y, home, born = self.columns["y"], self.home, self.born
+            for row in rows:
+                n = self.ticks - born[row]
+                y[row] = home[row] + k * (c - math.cos((n + 0.5) * rate))
+
+    def patrol(self, step, low, high):
+        """Walk entities along x by ``direction * speed * step`` a tick,
+        turning back past ``low`` and ``high``.
+
+        Awake entities walk every tick; sleepers take SLEEP_STRIDE steps
+        at once every SLEEP_STRIDE ticks.
+        """
+        groups = [(self.awake, step)]
+        if self.ticks % SLEEP_STRIDE == 0:
+            groups.append((self.asleep, step * SLEEP_STRIDE))
+        for rows, dt in groups:
+            if not len(rows):
+                continue
+            if np is not None:
+                a = self.arrays()
+                d = a["direction"][rows]
+                x = a["x"][rows] + d * a["speed"][rows] * dt
+                a["x"][rows] = x
+                a["direction"][rows] = np.where(x > high, -1.0, np.where(x < low, 1.0, d))
+            else:
+                xs, ds, ss = (self.columns[n] for n in ("x", "direction", "speed"))
+                for row in rows:
+                    xs[row] += ds[row] * ss[row] * dt
+                    if xs[row] > high:
+                        ds[row] = -1.0
+                    elif xs[row] < low:
+                        ds[row] = 1.0
+
+
+class CollectiblePool:
+    """Coins or stars in an Entities store, with a list of the live ones.
+
+    Pickup is a single distance test over the whole pool (vectorized with
+    numpy when it is installed): a cylinder of ``radius`` and half-height
+    ``height`` around Mario, or a sphere when ``height`` is None.
+    Collecting kills the item's row and swap-removes it from the live
+    list, so nothing is copied per frame. An item's index in the pool is
+    its row in the pool's Entities store (``entities``), stable for the
+    lifetime of the level. Iterating yields live items.
+
+    Pickup tests read the store's x, y and z columns, so they follow any
+    motion a system makes. ``animate`` steps the store with the ``system``
+    function (say, one calling ``entities.spin``); items beyond
+    ``sleep_radius`` of the camera sleep.
+    """
+
+    def __init__(self, items, radius, height=None, system=None,
+                 sleep_radius=math.inf):
+        self.items = list(items)
+        self.radius = radius
+        self.height = height
+        self.system = system
+        self.entities = Entities(self.items, sleep_radius)
+        n = len(self.items)
+        self.live = list(range(n))      # live indices, unordered
+        self.slot = list(range(n))      # index -> position in self.live
+        self.index = {id(o): i for i, o in enumerate(self.items)}
+
+    def __len__(self):
+        return len(self.live)
+
+    def __iter__(self):
+        items = self.items
+        return (items[i] for i in self.live)
+
+    def kill(self, i):
+        if not self.entities.alive[i]:
+            return
+        self.entities.kill(self.items[i])
+        s = self.slot[i]
+        last = self.live.pop()
+        if last != i:
+            self.live[s] = last
+            self.slot[last] = s
+
+    def remove(self, item):
+        self.kill(self.index[id(item)])
+
+    def dead(self):
+        alive = self.entities.alive
+        return {i for i in range(len(self.items)) if not alive[i]}
+
+    def collect(self, x, y, z):
+        """Kill and return every live item within reach of (x, y, z)."""
+        if not self.live:
+            return []
+        r2 = self.radius * self.radius
+        h = self.height
+        if np is not None:
+            a = self.entities.arrays()
+            dx, dy, dz = a["x"] - x, a["y"] - y, a["z"] - z
+            flat = dx * dx + dz * dz
+            if h is None:
+                hit = flat + dy * dy < r2
+            else:
+                hit = (flat < r2) & (np.abs(dy) < h)
+            hits = np.flatnonzero(hit & a["alive"]).tolist()
+        else:
+            xs, ys, zs = (self.entities.columns[n] for n in ("x", "y", "z"))
+            hits = []
+            for i in self.live:
+                dx, dy, dz = xs[i] - x, ys[i] - y, zs[i] - z
+                if h is None:
+                    if dx * dx + dy * dy + dz * dz < r2:
+                        hits.append(i)
+                elif dx * dx + dz * dz < r2 and abs(dy) < h:
+                    hits.append(i)
+        for i in hits:
+            self.kill(i)
+        return [self.items[i] for i in hits]
+
+    def awake(self):
+        """Live items near enough the camera to be drawn."""
+        return self.entities.awake_entities()
+
+    def animate(self, x, z):
+        """Run the system over items awake around a camera at (x, z)."""
+        self.entities.tick(x, z)
+        if self.system is not None:
+            self.system(self.entities)
@@ -0,0 +1,58 @@
+"""Controllers: where a game loop gets its events and held keys.
+
+A controller has ``events()``, the pygame events since the last call,
+and ``pressed()``, the held keys indexable by key code like
+pygame.key.get_pressed().
+"""
+
+from random import Random
+
+import pygame
+
+
+class HeldKeys(frozenset):
+    """Set of held keys, indexable like pygame.key.get_pressed()."""
+
+    def __getitem__(self, key):
+        return key in self
+
+
+class LiveInput:
+    """Keyboard and window events straight from pygame."""
+
+    def events(self):
+        return pygame.event.get()
+
+    def pressed(self):
+        return pygame.key.get_pressed()
+
+
+class RandomWalkInput:
+    """Seeded stand-in for a player, for headless soak runs.
+
+    Holds a random key combination from ``moves`` (WASD walking by
+    default) for a random number of ticks and hops now and then, so it
+    wanders through pickups and portals.
+    """
+
+    MOVES = [(), (pygame.K_w,), (pygame.K_s,), (pygame.K_a,), (pygame.K_d,),
+             (pygame.K_w, pygame.K_a), (pygame.K_w, pygame.K_d),
+             (pygame.K_s, pygame.K_a), (pygame.K_s, pygame.K_d)]
+
+    def __init__(self, seed=0, moves=MOVES):
+        self.rng = Random(seed)
+        self.moves = moves
+        self.held = HeldKeys()
+        self.hold = 0
+
+    def events(self):
+        if self.rng.random() < 0.02:
+            return [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE)]
+        return []
+
+    def pressed(self):
+        if self.hold <= 0:
+            self.held = HeldKeys(self.rng.choice(self.moves))
+            self.hold = self.rng.randint(10, 90)
+        self.hold -= 1
+        return self.held
@@ -0,0 +1,63 @@
+"""Fixed-timestep game loop support."""
+
+import time
+
+# Defaults for FixedStep: ticks per second, and how many ticks a slow
+# frame may catch up before the remaining time is dropped
+TICK_RATE = 60
+MAX_CATCHUP_STEPS = 5
+
+
+class FixedStep:
+    """Accumulator that turns variable frame times into fixed ticks.
+
+    ``advance`` returns how many ticks to simulate this frame. When the
+    renderer falls behind, several ticks run back to back (frames are
+    skipped, the game does not slow down); beyond ``max_steps`` the excess
+    time is dropped. ``alpha`` is how far the next tick is, for
+    interpolating what gets drawn.
+    """
+
+    def __init__(self, rate=TICK_RATE, max_steps=MAX_CATCHUP_STEPS):
+        self.rate = rate
+        self.dt = 1.0 / rate
+        self.max_steps = max_steps
+        self.acc = 0.0
+        self.last = None
+        self.ticks = 0
+        self.frames = 0
+        self.late_ticks = 0      # ticks run as catch-up after a slow frame
+        self.dropped_ticks = 0   # ticks discarded past max_steps
+
+    @property
+    def alpha(self):
+        return self.acc / self.dt
+
+    def advance(self, now=None):
+        now = time.perf_counter() if now is None else now
+        self.frames += 1
+        if self.last is None:
+            self.last = now
+            return 0
+        self.acc += now - self.last
+        self.last = now
+        steps = int(self.acc / self.dt)
+        if steps > self.max_steps:
+            self.dropped_ticks += steps - self.max_steps
+            self.acc -= (steps - self.max_steps) * self.dt
+            steps = self.max_steps
+        if steps > 1:
+            self.late_ticks += steps - 1
+        self.acc -= steps * self.dt
+        self.ticks += steps
+        return steps
+
+    def pause(self):
+        """Stop accumulating time (e.g. while the map is open)."""
+        self.last = None
+        self.acc = 0.0
+
+    def summary(self):
+        return (f"timestep: {self.ticks} ticks at {self.rate} Hz over "
+                f"{self.frames} frames, {self.late_ticks} late, "
+                f"{self.dropped_ticks} dropped")
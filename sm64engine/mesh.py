@@ -0,0 +1,128 @@
+"""Vertices, faces and the meshes built from them."""
+
+import math
+
+
+class Vec3:
+    __slots__ = ("x", "y", "z")
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+# The DS and V0 scripts' name for it
+Vector3 = Vec3
+
+
+class Face:
+    __slots__ = ("idx", "col")
+    def __init__(self, idx, col):
+        self.idx = idx
+        self.col = col
+
+
+class Mesh:
+    """Vertices and faces in mesh space, placed at (x, y, z) and turned
+    ``yaw`` radians about the vertical axis.
+
+    ``surfaces`` collects the walkable top of every box and ramp for
+    floor lookups, and ``radius`` bounds the mesh for whole-mesh culling.
+    ``active`` meshes are drawn; the others are skipped by renderers.
+    """
+
+    def __init__(self, x=0, y=0, z=0):
+        self.x, self.y, self.z = x, y, z
+        self.yaw = 0
+        self.verts = []
+        self.faces = []
+        self.active = True
+        # Walkable tops in mesh space: (x1, x2, z1, z2, y at z1, y at z2)
+        self.surfaces = []
+        # Distance from the origin to the farthest vertex
+        self.radius = 0
+
+    @property
+    def face_count(self):
+        return len(self.faces)
+
+    def _grow_radius(self, start):
+        for v in self.verts[start:]:
+            self.radius = max(self.radius, math.sqrt(v.x * v.x + v.y * v.y + v.z * v.z))
+
+    def cube(self, w, h, d, ox, oy, oz, col):
+        """Add a box centered at (ox, oy, oz) relative to the mesh's origin."""
+        s = len(self.verts)
+        hw, hh, hd = w / 2, h / 2, d / 2
+        pts = [
+            (-hw, -hh, -hd), (hw, -hh, -hd), (hw, hh, -hd), (-hw, hh, -hd),
+            (-hw, -hh, hd), (hw, -hh, hd), (hw, hh, hd), (-hw, hh, hd),
+        ]
+        for px, py, pz in pts:
+            self.verts.append(Vec3(px + ox, py + oy, pz + oz))
+        for f in [
+            [0, 1, 2, 3], [5, 4, 7, 6], [4, 0, 3, 7],
+            [1, 5, 6, 2], [3, 2, 6, 7], [4, 5, 1, 0],
+        ]:
+            self.faces.append(Face([i + s for i in f], col))
+        self.surfaces.append((ox - hw, ox + hw, oz - hd, oz + hd, oy + hh, oy + hh))
+        self._grow_radius(s)
+
+    # The DS and V0 scripts build with this name
+    add_cube = cube
+
+    def wedge(self, w, h, d, ox, oy, oz, col):
+        """Triangular prism for ramps/slopes."""
+        s = len(self.verts)
+        hw, hd = w / 2, d / 2
+        self.verts.append(Vec3(-hw + ox, oy, -hd + oz))       # 0 base front-left
+        self.verts.append(Vec3(hw + ox, oy, -hd + oz))        # 1 base front-right
+        self.verts.append(Vec3(hw + ox, oy, hd + oz))         # 2 base back-right
+        self.verts.append(Vec3(-hw + ox, oy, hd + oz))        # 3 base back-left
+        self.verts.append(Vec3(-hw + ox, oy + h, hd + oz))    # 4 top back-left
+        self.verts.append(Vec3(hw + ox, oy + h, hd + oz))     # 5 top back-right
+        for f in [
+            [s, s+1, s+2, s+3],     # bottom
+            [s+3, s+2, s+5, s+4],   # back wall
+            [s, s+3, s+4, s+4],     # left triangle (degenerate quad)
+            [s+1, s+5, s+5, s+2],   # right triangle
+            [s, s+1, s+5, s+4],     # slope face
+        ]:
+            self.faces.append(Face(f, col))
+        self.surfaces.append((ox - hw, ox + hw, oz - hd, oz + hd, oy, oy + h))
+        self._grow_radius(s)
+
+
+class BakedMesh:
+    """Static mesh backed by flat arrays, e.g. from a baked level file.
+
+    ``xyz`` holds 3 floats per vertex, face ``f`` uses the vertex numbers
+    ``index[starts[f]:starts[f + 1]]`` and is drawn in ``palette[colors[f]]``.
+    The arrays may be memoryviews into a mapped file, so nothing is parsed
+    or allocated per vertex. Pass the bounding ``radius`` when it is known
+    (a bake stores it); otherwise it takes a pass over every vertex.
+    """
+
+    def __init__(self, xyz, index, starts, colors, palette, surfaces=(),
+                 radius=None):
+        self.x = self.y = self.z = 0
+        self.yaw = 0
+        self.active = True
+        self.xyz = xyz
+        self.index = index
+        self.starts = starts
+        self.colors = colors
+        self.palette = palette
+        self.surfaces = surfaces
+        if radius is None:
+            radius = math.sqrt(max(
+                (x * x + y * y + z * z for x, y, z in zip(xyz[0::3], xyz[1::3], xyz[2::3])),
+                default=0))
+        self.radius = radius
+
+    @property
+    def face_count(self):
+        return len(self.colors)
+
+    @property
+    def nbytes(self):
+        return (self.xyz.nbytes + self.index.nbytes + self.starts.nbytes
+                + self.colors.nbytes)
@@ -0,0 +1,193 @@
+"""Frame-time overlay and cProfile/stack-sampling captures."""
+
+import array
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+
+import pygame
+
+
+class FrameProfiler:
+    """Rolling per-stage frame timings, drawn as a toggleable overlay.
+
+    Each stage keeps the last ``size`` samples in a ring buffer. Nothing
+    is recorded or drawn while the overlay is hidden, so the cost when it
+    is off is the handful of perf_counter() calls the loop makes anyway.
+    """
+
+    BUCKET_MS = 2       # frame-time histogram bucket width
+    BUCKETS = 16        # the last bucket also holds anything slower
+
+    def __init__(self, stages, size=120):
+        self.stages = stages
+        self.size = size
+        self.times = [array.array("d", bytes(8 * size)) for _ in stages]
+        self.totals = array.array("d", bytes(8 * size))
+        self.counts = (0, 0, 0)
+        self.n = 0
+        self.enabled = False
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.n = 0
+
+    def record(self, times, counts):
+        """Store one frame: seconds per stage, (faces, culled, drawn)."""
+        i = self.n % self.size
+        for buf, t in zip(self.times, times):
+            buf[i] = t
+        self.totals[i] = sum(times)
+        self.counts = counts
+        self.n += 1
+
+    def draw(self, surface, font, budget_ms=1000 / 60):
+        """Bar per stage (scaled so the panel width is one frame budget),
+        face counts and a frame-time histogram, top-right of ``surface``,
+        in ``font`` (say, ``engine.font("Arial", 13)``)."""
+        n = min(self.n, self.size)
+        if not n:
+            return
+        line = 16
+        bar_w = 140
+        w = 300
+        h = line * (len(self.stages) + 2) + 60
+        panel = pygame.Surface((w, h), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+
+        y = 4
+        for name, buf in zip(self.stages, self.times):
+            ms = 1000 * sum(buf[:n]) / n
+            panel.blit(font.render(f"{name:<9} {ms:6.2f} ms", True,
+                                        (230, 230, 230)), (6, y))
+            width = min(bar_w, int(bar_w * ms / budget_ms))
+            pygame.draw.rect(panel, (90, 200, 90) if ms < budget_ms / 4
+                             else (230, 180, 40), (w - bar_w - 6, y + 3, width, line - 6))
+            y += line
+
+        total = 1000 * sum(self.totals[:n]) / n
+        faces, culled, drawn = self.counts
+        panel.blit(font.render(
+            f"frame {total:.2f} ms   faces {faces}  culled {culled}  drawn {drawn}",
+            True, (255, 255, 255)), (6, y))
+        y += line + 4
+
+        # Histogram of frame times; the line marks the frame budget
+        buckets = [0] * self.BUCKETS
+        for t in self.totals[:n]:
+            buckets[min(self.BUCKETS - 1, int(1000 * t / self.BUCKET_MS))] += 1
+        tallest = max(buckets)
+        col_w = (w - 12) // self.BUCKETS
+        hist_h = h - y - 6
+        for b, count in enumerate(buckets):
+            bh = hist_h * count // tallest
+            pygame.draw.rect(panel, (120, 160, 255),
+                             (6 + b * col_w, y + hist_h - bh, col_w - 1, bh))
+        bx = 6 + int(col_w * budget_ms / self.BUCKET_MS)
+        pygame.draw.line(panel, (255, 80, 80), (bx, y), (bx, y + hist_h))
+
+        surface.blit(panel, (surface.get_width() - w - 10, 48))
+
+
+def _stack_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class ProfileCapture:
+    """cProfile plus a stack sampler over the next few frames.
+
+    ``start()`` begins a capture tagged with the level and camera; the
+    loop calls ``frame()`` once per frame and after the requested number
+    the capture is written to ``directory`` as <stamp>-<level>.pstats
+    (cProfile stats), .folded (sampled main-thread stacks, one
+    "outer;inner count" line each, for flamegraph tools) and .json (tags).
+    The stamp goes down to the millisecond, and a capture that still
+    finds its name taken gets a -2, -3, ... suffix rather than
+    overwriting another.
+    """
+
+    def __init__(self, directory, interval=0.001):
+        self.directory = directory
+        self.interval = interval
+        self.profile = None
+
+    @property
+    def active(self):
+        return self.profile is not None
+
+    def start(self, frames, level, cam):
+        if self.active:
+            return
+        self.remaining = frames
+        self.meta = {
+            "level": level,
+            "camera": {k: cam[k] for k in ("x", "y", "z", "yaw", "pitch") if k in cam},
+            "frames": frames,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self.stacks = {}
+        self.stopping = threading.Event()
+        self.sampler = threading.Thread(target=self._sample,
+                                        args=(threading.get_ident(),), daemon=True)
+        self.sampler.start()
+        self.began = time.perf_counter()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def _sample(self, ident):
+        stacks = self.stacks
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(ident)
+            names = []
+            while frame is not None:
+                names.append(_stack_name(frame))
+                frame = frame.f_back
+            key = ";".join(reversed(names))
+            stacks[key] = stacks.get(key, 0) + 1
+
+    def frame(self):
+        if self.active:
+            self.remaining -= 1
+            if self.remaining <= 0:
+                self.finish()
+
+    def finish(self):
+        """Stop early or on schedule and write the capture; returns the
+        path prefix of the files written."""
+        if not self.active:
+            return None
+        self.profile.disable()
+        self.stopping.set()
+        self.sampler.join()
+        self.meta["frames"] -= max(self.remaining, 0)
+        self.meta["seconds"] = time.perf_counter() - self.began
+        self.meta["samples"] = sum(self.stacks.values())
+
+        slug = "".join(ch if ch.isalnum() else "_" for ch in self.meta["level"].lower())
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now % 1 * 1000):03d}"
+        base = os.path.join(self.directory, f"{stamp}-{slug}")
+        # Creating the .json exclusively claims the name for all three files
+        prefix, n = base, 1
+        while True:
+            try:
+                f = open(prefix + ".json", "x")
+                break
+            except FileExistsError:
+                n += 1
+                prefix = f"{base}-{n}"
+        with f:
+            json.dump(self.meta, f, indent=2)
+        self.profile.dump_stats(prefix + ".pstats")
+        with open(prefix + ".folded", "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        self.profile = None
+        print(f"profile: {self.meta['frames']} frames of {self.meta['level']} "
+              f"({self.meta['samples']} samples) written to {prefix}.*")
+        return prefix
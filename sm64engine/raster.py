@@ -0,0 +1,243 @@
+"""Tile-binned rasterizer running on a pool of worker processes.
+
+The screen is cut into tiles ``TILE`` rows high and as wide as the
+screen. Each frame the main process writes the sorted polygons into a
+shared-memory polygon buffer and bins them by the tiles their bounding
+boxes touch, then tells every worker how many there are; worker ``k`` of
+``n`` owns tiles ``k, k + n, k + 2n, ...`` (an interleave, so a busy
+region of the screen is spread over all of them). pygame walks every row
+of a polygon however it is clipped, so tiles span the full width: a
+polygon is walked once per tile it crosses vertically, not once per
+tile it covers.
+
+A worker clears its tiles and fills each tile's polygons, clipped to the
+tile, straight into a shared-memory RGBA framebuffer. The main process
+wraps that buffer in a pygame surface once and blits it over the target.
+
+Nothing per frame is pickled except a tuple naming the buffers and the
+polygon count: polygons, bins and pixels never leave shared memory.
+Binning keeps every tile's polygons in draw order, far to near, so each
+tile comes out exactly as the painter's algorithm would draw it.
+"""
+
+import atexit
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pygame
+
+from .render import RENDERERS, NumpyRenderer
+
+TILE = 128
+MAX_VERTS = 8
+
+
+def _attach(name):
+    """Attach to a block the main process owns.
+
+    The main process unlinks its blocks, so workers opt out of tracking
+    them where Python allows it; before 3.13 they share the main
+    process's resource tracker, where registering twice is harmless.
+    """
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name)
+
+
+def _views(poly_buf, capacity, pairs, tiles):
+    """numpy views of the polygon block; the same on both sides."""
+    off = 0
+    out = {}
+    for name, shape, dtype in (("verts", (capacity, MAX_VERTS, 2), np.float32),
+                               ("count", (capacity,), np.int32),
+                               ("rgba", (capacity, 4), np.uint8),
+                               ("bins", (pairs,), np.int32),
+                               ("starts", (tiles + 1,), np.int32)):
+        out[name] = np.ndarray(shape, dtype, poly_buf, off)
+        off += out[name].nbytes
+    return out
+
+
+def _poly_bytes(capacity, pairs, tiles):
+    return capacity * (MAX_VERTS * 2 * 4 + 8) + pairs * 4 + (tiles + 1) * 4
+
+
+def _worker(conn, index, count):
+    """Worker ``index`` of ``count``: fill its tiles on request."""
+    layout = None
+    blocks = ()
+    frame = polys = None
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        new_layout, n = msg
+        if new_layout != layout:
+            frame = polys = None
+            for shm in blocks:
+                shm.close()
+            layout = new_layout
+            frame_name, poly_name, width, height, capacity, pairs = layout
+            blocks = (_attach(frame_name), _attach(poly_name))
+            tiles = -(-height // TILE)
+            frame = pygame.image.frombuffer(blocks[0].buf[:width * height * 4],
+                                             (width, height), "BGRA")
+            polys = _views(blocks[1].buf, capacity, pairs, tiles)
+        verts, counts, rgba = polys["verts"], polys["count"], polys["rgba"]
+        bins, starts = polys["bins"], polys["starts"]
+        points = {}
+        for tile in range(index, tiles, count):
+            rect = pygame.Rect(0, tile * TILE, width, TILE)
+            frame.set_clip(rect)
+            frame.fill((0, 0, 0, 0), rect)
+            for p in bins[starts[tile]:starts[tile + 1]].tolist():
+                pts = points.get(p)
+                if pts is None:
+                    pts = points[p] = verts[p, :counts[p]].tolist()
+                pygame.draw.polygon(frame, rgba[p], pts)
+        frame.set_clip(None)
+        conn.send(n)
+    frame = polys = None
+    for shm in blocks:
+        shm.close()
+
+
+class RasterRenderer(NumpyRenderer):
+    """Renderer backend that fills polygons on ``workers`` processes.
+
+    Projection and culling are the numpy backend's; only ``draw`` differs.
+    Workers (one per core by default) start on the first draw, so merely
+    selecting this backend, or importing a script that does, spawns
+    nothing; the script must keep its start-up under
+    ``if __name__ == "__main__"``, as worker processes import it.
+
+    Packing and binning cost the main process about as much as filling
+    does at window size, so this pays off at high resolutions, where the
+    fill dominates and is split across cores.
+    """
+
+    name = "raster"
+
+    def __init__(self, size, fov, workers=None):
+        super().__init__(size, fov)
+        self.workers = workers or os.cpu_count() or 1
+        self.pipes = []
+        self.frame = self.poly = None
+        self.layout = None
+        self.surface = None
+        self.views = None
+
+    def _start(self):
+        # forkserver children are forked from a clean server process, not
+        # from a game that has a window and threads open
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn")
+        for k in range(self.workers):
+            ours, theirs = ctx.Pipe()
+            ctx.Process(target=_worker, args=(theirs, k, self.workers),
+                        name=f"raster-{k}", daemon=True).start()
+            self.pipes.append(ours)
+        atexit.register(self.close)
+
+    def _buffers(self, width, height, n, pairs):
+        """(Re)allocate the shared blocks when the target or load grows."""
+        if self.layout is not None:
+            _, _, w, h, capacity, max_pairs = self.layout
+            if (w, h) == (width, height) and n <= capacity and pairs <= max_pairs:
+                return
+        else:
+            capacity = max_pairs = 0
+        tiles = -(-height // TILE)
+        capacity = max(n, capacity, 256)
+        max_pairs = max(pairs, max_pairs, 4 * capacity)
+        # Views and the surface export the old buffers, which can't be
+        # closed while they are alive
+        self.views = None
+        if self.frame is None or self.layout[2:4] != (width, height):
+            self.surface = None
+            self._free(self.frame)
+            self.frame = shared_memory.SharedMemory(create=True, size=width * height * 4)
+            self.surface = pygame.image.frombuffer(self.frame.buf[:width * height * 4],
+                                                   (width, height), "BGRA")
+        self._free(self.poly)
+        self.poly = shared_memory.SharedMemory(
+            create=True, size=_poly_bytes(capacity, max_pairs, tiles))
+        self.layout = (self.frame.name, self.poly.name, width, height, capacity, max_pairs)
+        self.views = _views(self.poly.buf, capacity, max_pairs, tiles)
+
+    def draw(self, target, polys, fog=None):
+        polys = [p for p in polys if len(p[1]) >= 3]
+        if not polys:
+            return 0
+        if not self.pipes:
+            self._start()
+        width, height = target.get_size()
+        tiles = -(-height // TILE)
+        n = len(polys)
+
+        # Pack: points padded to MAX_VERTS by repeating the last one
+        z = np.fromiter((p[0] for p in polys), float, n)
+        count = np.fromiter((len(p[1]) for p in polys), np.int32, n)
+        verts = np.empty((n, MAX_VERTS, 2), np.float32)
+        for i, (_, pts, _) in enumerate(polys):
+            verts[i, :len(pts)] = pts[:MAX_VERTS]
+            verts[i, len(pts):] = pts[-1]
+        rgb = np.array([p[2] for p in polys], float)
+        if fog is not None:
+            fog_near, fog_far, sky = fog
+            f = np.clip((z - fog_near) / (fog_far - fog_near), 0, None)[:, None]
+            rgb += (np.array(sky, float) - rgb) * f
+
+        # Bin by the tiles each bounding box touches, keeping draw order
+        y = verts[..., 1]
+        first = np.clip(np.floor(y.min(axis=1) / TILE), 0, tiles - 1).astype(np.int32)
+        last = np.clip(np.floor(y.max(axis=1) / TILE), 0, tiles - 1).astype(np.int32)
+        spans = last - first + 1
+        poly = np.repeat(np.arange(n, dtype=np.int32), spans)
+        tile = (np.repeat(first, spans) + np.arange(len(poly))
+                - np.repeat(np.cumsum(spans) - spans, spans))
+        order = np.argsort(tile, kind="stable")
+
+        self._buffers(width, height, n, len(poly))
+        v = self.views
+        v["verts"][:n] = verts
+        v["count"][:n] = count
+        v["rgba"][:n, :3] = rgb
+        v["rgba"][:n, 3] = 255
+        v["bins"][:len(poly)] = poly[order]
+        v["starts"][:] = np.searchsorted(tile[order], np.arange(tiles + 1))
+
+        for pipe in self.pipes:
+            pipe.send((self.layout, n))
+        for pipe in self.pipes:
+            pipe.recv()
+        target.blit(self.surface, (0, 0))
+        return n
+
+    @staticmethod
+    def _free(shm):
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def close(self):
+        """Stop the workers and release the shared blocks."""
+        for pipe in self.pipes:
+            try:
+                pipe.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.pipes = []
+        self.surface = None
+        self.views = None
+        self._free(self.frame)
+        self._free(self.poly)
+        self.frame = self.poly = None
+        self.layout = None
+
+
+RENDERERS["raster"] = RasterRenderer
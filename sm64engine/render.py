@@ -0,0 +1,297 @@
+"""Renderer backends: project meshes, cull faces and draw polygons.
+
+Every backend has the same three steps, so a game loop can time and
+tune them separately:
+
+- ``transform(mesh, cam, scale)`` projects every vertex once and returns
+  ``(pts, depth)`` in whatever form the backend's ``cull`` expects;
+- ``cull(mesh, pts, depth, polys, ...)`` appends the faces that survive
+  to ``polys`` as ``(average depth, screen points, color)`` and returns
+  how many did not;
+- ``sort(polys)`` orders them far to near for the painter's algorithm;
+- ``draw(target, polys, ...)`` fills them in that order.
+
+``cam`` is a dict with ``x``, ``y``, ``z`` and optionally ``yaw``
+(radians about the vertical axis) and ``pitch`` (radians, positive looks
+down). Points are for a screen ``scale`` times the renderer's ``size``.
+
+``make_renderer`` picks a backend by name, defaulting to the
+SM64_RENDERER environment variable and then to the fastest one that can
+run here.
+"""
+
+import math
+import os
+from operator import itemgetter
+
+import pygame
+
+from .mesh import BakedMesh
+
+try:
+    import numpy as np
+except ImportError:  # only the pure Python renderer is available
+    np = None
+
+
+# ============================================================
+# PURE PYTHON (reference)
+# ============================================================
+
+class Renderer:
+    """Reference backend: plain Python loops, one vertex at a time.
+
+    Each vertex is transformed once however many faces share it, and
+    vertices at or behind the near plane get ``None`` instead of a
+    screen position. Other backends must match its output.
+    """
+
+    name = "python"
+
+    def __init__(self, size, fov):
+        self.size = size
+        self.fov = fov
+
+    def _view(self, mesh, cam, scale):
+        """The mesh-to-camera matrix and the projection constants.
+
+        The matrix is 3x4, row-major, as 12 floats: rows give camera x
+        (right), y (up) and z (depth) of a mesh-space vertex. It composes
+        the mesh's yaw and position with the camera's position, yaw and
+        pitch once per mesh, so every vertex then costs one multiply
+        whatever the camera does. Object and camera yaw are both turns
+        about the vertical axis and fold into one angle.
+        """
+        w, h = self.size
+        cam_yaw = cam.get("yaw", 0)
+        pitch = cam.get("pitch", 0)
+        c, s = math.cos(mesh.yaw - cam_yaw), math.sin(mesh.yaw - cam_yaw)
+        cp, sp = math.cos(pitch), math.sin(pitch)
+        # The mesh's origin relative to the camera, turned by -cam_yaw...
+        ox = mesh.x - cam["x"]
+        oy = mesh.y - cam["y"]
+        oz = mesh.z - cam["z"]
+        if cam_yaw:
+            cc, sc = math.cos(-cam_yaw), math.sin(-cam_yaw)
+            ox, oz = ox * cc - oz * sc, ox * sc + oz * cc
+        # ...then everything tilted by the pitch about camera x
+        matrix = (c, 0.0, -s, ox,
+                  sp * s, cp, sp * c, oy * cp + oz * sp,
+                  cp * s, -sp, cp * c, oz * cp - oy * sp)
+        return matrix, self.fov * scale, w // 2 * scale, h // 2 * scale
+
+    def transform(self, mesh, cam, scale=1.0):
+        """Screen position and camera depth of every vertex of ``mesh``."""
+        m, fov, half_w, half_h = self._view(mesh, cam, scale)
+        m00, m01, m02, m03, m10, m11, m12, m13, m20, m21, m22, m23 = m
+        if isinstance(mesh, BakedMesh):
+            xyz = mesh.xyz
+            coords = zip(xyz[0::3], xyz[1::3], xyz[2::3])
+        else:
+            coords = ((v.x, v.y, v.z) for v in mesh.verts)
+        pts = []
+        depth = []
+        for vx, vy, vz in coords:
+            wz = vx * m20 + vy * m21 + vz * m22 + m23
+            depth.append(wz)
+            if wz <= 1:
+                pts.append(None)
+                continue
+            k = fov / wz
+            pts.append(((vx * m00 + vy * m01 + vz * m02 + m03) * k + half_w,
+                        -(vx * m10 + vy * m11 + vz * m12 + m13) * k + half_h))
+        return pts, depth
+
+    def cull(self, mesh, pts, depth, polys, far=math.inf, backface=False,
+             clip=False, scale=1.0):
+        """Append faces with every vertex in front of the camera and an
+        average depth within ``far`` to ``polys``; returns how many were
+        not. ``backface`` also drops faces wound clockwise on screen and
+        ``clip`` those whose bounding box misses the screen."""
+        culled = 0
+        w, h = self.size[0] * scale, self.size[1] * scale
+        for idx, col in _faces(mesh):
+            face_pts = [pts[i] for i in idx]
+            if None in face_pts:
+                culled += 1
+                continue
+            avgz = 0
+            for i in idx:
+                avgz += depth[i]
+            avgz /= len(face_pts)
+            if avgz > far:
+                culled += 1
+                continue
+            if backface:
+                area = 0
+                x1, y1 = face_pts[-1]
+                for x2, y2 in face_pts:
+                    area += (x2 - x1) * (y2 + y1)
+                    x1, y1 = x2, y2
+                if area <= 0:
+                    culled += 1
+                    continue
+            if clip:
+                xs = [p[0] for p in face_pts]
+                ys = [p[1] for p in face_pts]
+                if max(xs) < 0 or min(xs) >= w or max(ys) < 0 or min(ys) >= h:
+                    culled += 1
+                    continue
+            polys.append((avgz, face_pts, col))
+        return culled
+
+    def render(self, mesh, cam, polys, far=math.inf, backface=False, clip=False):
+        """Transform and cull in one call; returns the number culled."""
+        if not mesh.active:
+            return 0
+        pts, depth = self.transform(mesh, cam)
+        return self.cull(mesh, pts, depth, polys, far, backface, clip)
+
+    def sort(self, polys):
+        """Far to near by average depth; equal depths keep their order.
+
+        Only the depth is compared, which is cheaper than comparing whole
+        tuples and works whatever type a backend uses for the points.
+        """
+        polys.sort(key=_DEPTH, reverse=True)
+
+    def draw(self, target, polys, fog=None):
+        """Fill ``polys`` (sorted far to near) into ``target``.
+
+        ``fog`` is ``(start, end, sky)``: faces past ``start`` are blended
+        toward ``sky``, reaching it at ``end``. Returns the number drawn.
+        """
+        fog_near, fog_far, sky = fog or (math.inf, math.inf, (0, 0, 0))
+        fog_span = fog_far - fog_near
+        sr, sg, sb = sky
+        drawn = 0
+        for avgz, pts, col in polys:
+            if len(pts) >= 3:
+                if avgz > fog_near:
+                    f = (avgz - fog_near) / fog_span
+                    r, g, b = col
+                    col = (int(r + (sr - r) * f), int(g + (sg - g) * f),
+                           int(b + (sb - b) * f))
+                pygame.draw.polygon(target, col, pts)
+                drawn += 1
+        return drawn
+
+
+_DEPTH = itemgetter(0)
+
+
+def _faces(mesh):
+    """(vertex numbers, color) for every face of a Mesh or BakedMesh."""
+    if isinstance(mesh, BakedMesh):
+        index, starts = mesh.index, mesh.starts
+        palette, colors = mesh.palette, mesh.colors
+        return ((index[starts[f]:starts[f + 1]], palette[colors[f]])
+                for f in range(len(colors)))
+    return ((face.idx, face.col) for face in mesh.faces)
+
+
+# ============================================================
+# NUMPY (vectorized)
+# ============================================================
+
+class NumpyRenderer(Renderer):
+    """Vectorized backend: whole-mesh numpy array arithmetic.
+
+    A mesh's vertices, face indices and colors are packed into arrays the
+    first time it is drawn and cached on the mesh. Transforming and
+    culling are then a few array operations per mesh instead of a Python
+    loop per vertex and face. Meshes under ``min_verts`` vertices (64 by
+    default: coins and the like) cost less through the reference path,
+    as do meshes whose faces have differing vertex counts.
+    """
+
+    name = "numpy"
+
+    def __init__(self, size, fov, min_verts=64):
+        super().__init__(size, fov)
+        self.min_verts = min_verts
+
+    def transform(self, mesh, cam, scale=1.0):
+        arrays = _mesh_arrays(mesh)
+        if arrays is None or arrays[0].shape[1] < self.min_verts:
+            return super().transform(mesh, cam, scale)
+        m, fov, half_w, half_h = self._view(mesh, cam, scale)
+        # One (3, 4) x (4, N) product for the whole mesh
+        x, y, depth = np.array(m).reshape(3, 4).dot(arrays[0])
+        k = fov / np.maximum(depth, 1)
+        pts = np.empty((len(depth), 2))
+        pts[:, 0] = x * k + half_w
+        pts[:, 1] = half_h - y * k
+        return pts, depth
+
+    def cull(self, mesh, pts, depth, polys, far=math.inf, backface=False,
+             clip=False, scale=1.0):
+        if not isinstance(depth, np.ndarray):
+            return super().cull(mesh, pts, depth, polys, far, backface, clip, scale)
+        _, index, colors = _mesh_arrays(mesh)
+        d = depth[index]
+        avgz = d.mean(axis=1)
+        keep = (d > 1).all(axis=1) & (avgz <= far)
+        p = pts[index]
+        if backface:
+            x, y = p[..., 0], p[..., 1]
+            x0, y0 = np.roll(x, 1, axis=1), np.roll(y, 1, axis=1)
+            keep &= ((x - x0) * (y + y0)).sum(axis=1) > 0
+        if clip:
+            w, h = self.size[0] * scale, self.size[1] * scale
+            lo, hi = p.min(axis=1), p.max(axis=1)
+            keep &= (hi[:, 0] >= 0) & (lo[:, 0] < w) & (hi[:, 1] >= 0) & (lo[:, 1] < h)
+        faces = np.flatnonzero(keep)
+        polys.extend(zip(avgz[faces].tolist(), p[faces].tolist(),
+                         [colors[f] for f in faces]))
+        return len(index) - len(faces)
+
+
+def _mesh_arrays(mesh):
+    """(vertices, face index, face colors) as arrays, cached on the mesh.
+
+    Vertices are homogeneous and stored by coordinate, shape (4, N), so
+    the view matrix applies to all of them in one contiguous product.
+    The cache is keyed on the vertex and face counts, so a mesh that is
+    still being built is repacked. None when faces differ in length.
+    """
+    key = (mesh.face_count, len(mesh.xyz) if isinstance(mesh, BakedMesh) else len(mesh.verts))
+    cached = getattr(mesh, "_arrays", None)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    faces = list(_faces(mesh))
+    arrays = None
+    if faces and len({len(idx) for idx, _ in faces}) == 1:
+        if isinstance(mesh, BakedMesh):
+            xyz = np.asarray(mesh.xyz, dtype=float).reshape(-1, 3)
+        else:
+            xyz = np.array([(v.x, v.y, v.z) for v in mesh.verts], dtype=float)
+        xyzw = np.ones((4, len(xyz)))
+        xyzw[:3] = xyz.T
+        index = np.array([list(idx) for idx, _ in faces], dtype=np.intp)
+        arrays = (xyzw, index, [col for _, col in faces])
+    mesh._arrays = (key, arrays)
+    return arrays
+
+
+# ============================================================
+# BACKEND SELECTION
+# ============================================================
+
+RENDERERS = {"python": Renderer}
+if np is not None:
+    RENDERERS["numpy"] = NumpyRenderer
+
+
+def make_renderer(size, fov, name=None):
+    """The named backend, else SM64_RENDERER, else the fastest available.
+
+    Asking for a backend whose optional dependency is missing falls back
+    to the reference renderer; an unknown name is an error.
+    """
+    name = name or os.environ.get("SM64_RENDERER") or ("numpy" if np is not None else "python")
+    if name == "numpy" and np is None:
+        name = "python"
+    if name not in RENDERERS:
+        raise ValueError(f"unknown renderer {name!r} (choose from {', '.join(RENDERERS)})")
+    return RENDERERS[name](size, fov)
@@ -0,0 +1,88 @@
+"""Axis-aligned trigger volumes (portals, hazards) in a grid spatial hash."""
+
+import math
+
+# Default cell size of a TriggerGrid
+TRIGGER_CELL = 128
+
+
+class Trigger:
+    __slots__ = ("kind", "x1", "x2", "y1", "y2", "z1", "z2", "data")
+
+    def __init__(self, kind, x1, x2, z1, z2, y1, y2, data):
+        self.kind = kind
+        self.x1, self.x2 = x1, x2
+        self.y1, self.y2 = y1, y2
+        self.z1, self.z2 = z1, z2
+        self.data = data
+
+    def contains(self, x, y, z):
+        return (self.x1 <= x <= self.x2 and self.z1 <= z <= self.z2
+                and self.y1 <= y <= self.y2)
+
+
+class TriggerGrid:
+    """Axis-aligned trigger volumes bucketed into square XZ cells.
+
+    Each trigger is listed in every cell its rectangle overlaps, so a
+    point query only tests the triggers sharing Mario's cell. ``update``
+    turns those tests into enter/exit events; nothing is tested when
+    Mario has not moved. Any ``kind`` of trigger can be added without
+    costing the other kinds anything.
+    """
+
+    def __init__(self, cell=TRIGGER_CELL):
+        self.cell = cell
+        self.cells = {}         # (cx, cz) -> [Trigger]
+        self.inside = set()
+        self.last_pos = None
+
+    def add(self, kind, x1, x2, z1, z2, y1=-math.inf, y2=math.inf, data=None):
+        trig = Trigger(kind, x1, x2, z1, z2, y1, y2, data)
+        c = self.cell
+        for cx in range(math.floor(x1 / c), math.floor(x2 / c) + 1):
+            for cz in range(math.floor(z1 / c), math.floor(z2 / c) + 1):
+                self.cells.setdefault((cx, cz), []).append(trig)
+        return trig
+
+    def at(self, x, y, z):
+        """Triggers containing the point."""
+        c = self.cell
+        bucket = self.cells.get((math.floor(x / c), math.floor(z / c)), ())
+        return {t for t in bucket if t.contains(x, y, z)}
+
+    def near(self, x, z, radius, kind=None):
+        """(distance, trigger) pairs within ``radius`` on the XZ plane."""
+        c = self.cell
+        seen = set()
+        found = []
+        for cx in range(math.floor((x - radius) / c), math.floor((x + radius) / c) + 1):
+            for cz in range(math.floor((z - radius) / c), math.floor((z + radius) / c) + 1):
+                for t in self.cells.get((cx, cz), ()):
+                    if t in seen or (kind is not None and t.kind != kind):
+                        continue
+                    seen.add(t)
+                    d = math.hypot(max(t.x1 - x, 0, x - t.x2),
+                                   max(t.z1 - z, 0, z - t.z2))
+                    if d <= radius:
+                        found.append((d, t))
+        return found
+
+    def update(self, x, y, z):
+        """Return (entered, exited) triggers since the previous update."""
+        pos = (x, y, z)
+        if pos == self.last_pos:
+            return (), ()
+        self.last_pos = pos
+        now = self.at(x, y, z)
+        entered = now - self.inside
+        exited = self.inside - now
+        self.inside = now
+        return entered, exited
+
+    def place(self, x, y, z):
+        """Put Mario at (x, y, z) without reporting any event, e.g. when
+        he arrives in the level. Triggers around the spawn point count as
+        already occupied, so one only fires after he leaves and returns."""
+        self.inside = self.at(x, y, z)
+        self.last_pos = (x, y, z)
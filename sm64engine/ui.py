@@ -0,0 +1,97 @@
+"""Screen fades, the Dear Mario card and cached HUD text."""
+
+from collections import OrderedDict
+
+import pygame
+
+PARCHMENT = (245, 235, 205)
+PARCHMENT_BORDER = (190, 150, 100)
+INK = (70, 40, 25)
+
+
+def fade(engine, mode="out", duration=300, fps=60):
+    """Fade the screen to black (``"out"``) or back from it (``"in"``)."""
+    screen, clock = engine.screen, engine.clock
+    overlay = pygame.Surface(screen.get_size())
+    overlay.fill((0, 0, 0))
+
+    t = 0
+    while t < duration:
+        dt = clock.tick(fps)
+        t += dt
+        p = min(1, t / duration)
+
+        alpha = int(255 * p) if mode == "out" else int(255 * (1 - p))
+        overlay.set_alpha(alpha)
+
+        screen.blit(overlay, (0, 0))
+        pygame.display.flip()
+
+
+def compose_card(size, texts):
+    """A parchment card with ``texts``, (font, line, (x, y)) triples,
+    rendered in ink. Composite it once and hand it to ``show_card``."""
+    card = pygame.Surface(size, pygame.SRCALPHA)
+    card.fill(PARCHMENT)
+    pygame.draw.rect(card, PARCHMENT_BORDER, card.get_rect(), 6)
+    for font, line, pos in texts:
+        card.blit(font.render(line, True, INK), pos)
+    return card.convert_alpha()
+
+
+def show_card(engine, card, sky, pos=None, rate=0.7, fps=60):
+    """Fade ``card`` in over ``sky`` until Enter or Space is pressed.
+
+    ``pos`` is the card's top-left corner (centered by default) and
+    ``rate`` the alpha gained per millisecond. Returns False if the
+    window was closed instead.
+    """
+    screen = engine.screen
+    if pos is None:
+        pos = card.get_rect(center=screen.get_rect().center).topleft
+
+    alpha = 0
+    while True:
+        dt = engine.clock.tick(fps)
+        alpha = min(255, alpha + dt * rate)
+
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                return False
+            if e.type == pygame.KEYDOWN and e.key in (pygame.K_RETURN, pygame.K_SPACE):
+                return True
+
+        screen.fill(sky)
+        card.set_alpha(int(alpha))
+        screen.blit(card, pos)
+        pygame.display.flip()
+
+
+class TextCache:
+    """Rendered text surfaces, reused while the text stays the same.
+
+    HUD counters change a few times a minute but are drawn every frame;
+    font rendering is the expensive part, so surfaces are kept for the
+    ``size`` most recently drawn (font, text, color) combinations.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = font.render(text, True, color)
+            if len(self.surfaces) > self.size:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
+
+    def blit(self, surface, font, text, color, pos):
+        """Draw ``text`` at ``pos``; returns the text's surface."""
+        label = self.render(font, text, color)
+        surface.blit(label, pos)
+        return label
@@ -0,0 +1,42 @@
+"""Shared fixtures: the entry scripts are loaded as modules by file name."""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The scripts import sm64engine from beside them, as when run directly
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def _load(filename):
+    spec = importlib.util.spec_from_file_location(
+        filename.strip("#$").split(".")[0].replace("'", ""), os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def load_script():
+    """Import an entry script by file name (they are not valid module
+    names), once per session."""
+    loaded = {}
+
+    def load(filename):
+        if filename not in loaded:
+            loaded[filename] = _load(filename)
+        return loaded[filename]
+    return load
+
+
+@pytest.fixture(scope="session")
+def hdr(load_script):
+    """The HDR port, #AC'SPYPORTSM64HDRV0.py."""
+    return load_script("#AC'SPYPORTSM64HDRV0.py")
@@ -0,0 +1,114 @@
+"""Baked levels round-trip, follow their builder's source and never block a load."""
+
+import os
+
+import pytest
+
+NAME = "Test Level"
+
+
+@pytest.fixture(autouse=True)
+def bake_dir(hdr, tmp_path, monkeypatch):
+    monkeypatch.setattr(hdr, "BAKE_DIR", str(tmp_path / "baked"))
+    return tmp_path / "baked"
+
+
+def small_level(hdr, slope):
+    terrain = hdr.Mesh()
+    terrain.cube(200, 20, 200, 0, -10, 0, (10, 200, 10))
+    terrain.wedge(100, slope, 100, 300, 0, 0, (200, 10, 10))
+    level = hdr.Level(NAME, terrain, [hdr.Star(0, 100, 0)],
+                      [hdr.Coin(50, 20, 50), hdr.Coin(-50, 20, 50)], (0, 0, 90))
+    level.add_portal(-20, 20, -20, 20, "Peach's Castle", (0, 0, -700))
+    return level
+
+
+def faces(mesh):
+    """(vertex positions, colour) of every face, from either kind of mesh."""
+    if hasattr(mesh, "xyz"):
+        xyz, index, starts = mesh.xyz, mesh.index, mesh.starts
+        return [([tuple(xyz[3 * i:3 * i + 3]) for i in index[starts[f]:starts[f + 1]]],
+                 mesh.palette[mesh.colors[f]]) for f in range(mesh.face_count)]
+    return [([(mesh.verts[i].x, mesh.verts[i].y, mesh.verts[i].z) for i in face.idx],
+             tuple(face.col)) for face in mesh.faces]
+
+
+def test_bake_round_trip(hdr):
+    def build():
+        return small_level(hdr, 40)
+
+    built = build()
+    level = hdr.baked_builder(NAME, build)()
+    assert isinstance(level.terrain, hdr.BakedMesh)
+    assert faces(level.terrain) == faces(built.terrain)
+    assert level.terrain.surfaces == built.terrain.surfaces
+    assert level.terrain.radius == pytest.approx(built.terrain.radius)
+    assert level.portals == built.portals
+    assert level.entry_point == built.entry_point
+    for pool in ("coins", "stars"):
+        assert ([(o.x, o.y, o.z) for o in getattr(level, pool).items]
+                == [(o.x, o.y, o.z) for o in getattr(built, pool).items])
+    assert level.floor_at(300, 100, 25) == built.floor_at(300, 100, 25) == 30
+
+
+def test_rebakes_when_the_builder_source_changes(hdr):
+    def build():
+        return small_level(hdr, 40)
+    old_key = hdr.bake_key(build)
+    hdr.baked_builder(NAME, build)()
+
+    def build():    # same name, edited body
+        return small_level(hdr, 80)
+    new_key = hdr.bake_key(build)
+    assert new_key != old_key
+
+    level = hdr.baked_builder(NAME, build)()
+    assert isinstance(level.terrain, hdr.BakedMesh)
+    assert level.floor_at(300, 100, 25) == 60
+    path = hdr.bake_path(NAME)
+    assert hdr.load_baked_level(path, old_key) is None
+    assert hdr.load_baked_level(path, new_key) is not None
+
+
+@pytest.mark.parametrize("damage", ["metadata", "truncated", "empty"])
+def test_damaged_bake_is_rebuilt(hdr, damage):
+    def build():
+        return small_level(hdr, 40)
+    key = hdr.bake_key(build)
+    hdr.baked_builder(NAME, build)()
+    path = hdr.bake_path(NAME)
+    with open(path, "r+b") as f:
+        if damage == "metadata":
+            f.seek(hdr.BAKE_HEADER.size)
+            f.write(b"\xff" * 16)
+        else:
+            f.truncate(os.path.getsize(path) // 2 if damage == "truncated" else 0)
+    assert hdr.load_baked_level(path, key) is None
+
+    level = hdr.baked_builder(NAME, build)()
+    assert faces(level.terrain) == faces(build().terrain)
+    assert hdr.load_baked_level(path, key) is not None     # and re-baked
+
+
+def test_unwritable_bake_falls_back_to_the_built_level(hdr, bake_dir):
+    def build():
+        return small_level(hdr, 40)
+    bake_dir.write_text("a file where the bake directory should be")
+    level = hdr.baked_builder(NAME, build)()
+    assert isinstance(level.terrain, hdr.Mesh)
+    assert faces(level.terrain) == faces(build().terrain)
+
+
+def test_corrupt_bake_that_cannot_be_rewritten_uses_the_built_level(hdr, monkeypatch):
+    def build():
+        return small_level(hdr, 40)
+    hdr.baked_builder(NAME, build)()
+    with open(hdr.bake_path(NAME), "r+b") as f:
+        f.truncate(hdr.BAKE_HEADER.size + 4)
+
+    def refuse(level, key, path):
+        raise OSError("read-only")
+    monkeypatch.setattr(hdr, "bake_level", refuse)
+    level = hdr.baked_builder(NAME, build)()
+    assert isinstance(level.terrain, hdr.Mesh)
+    assert level.floor_at(300, 100, 25) == 30
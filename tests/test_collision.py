@@ -0,0 +1,71 @@
+"""SweepAndPrune reports exactly the overlapping pairs a brute-force check finds."""
+
+from random import Random
+
+from sm64engine import Solid, SweepAndPrune
+
+
+class Thing:
+    def __init__(self, x, y, z):
+        self.x, self.y, self.z = x, y, z
+
+
+def overlap(a, b):
+    return (a.minx <= b.maxx and b.minx <= a.maxx
+            and a.miny <= b.maxy and b.miny <= a.maxy
+            and a.minz <= b.maxz and b.minz <= a.maxz)
+
+
+def brute_force(boxes):
+    live = [b for b in boxes if not b.dead]
+    return {frozenset((id(a), id(b)))
+            for i, a in enumerate(live) for b in live[i + 1:]
+            if not (a.static and b.static) and overlap(a, b)}
+
+
+def found(broadphase):
+    return {frozenset((id(a), id(b))) for a, b in broadphase.pairs()}
+
+
+def test_pairs_match_brute_force_as_things_move():
+    rng = Random(3)
+    broadphase = SweepAndPrune()
+    things = [Thing(rng.uniform(-500, 500), rng.uniform(0, 50), rng.uniform(-500, 500))
+              for _ in range(150)]
+    boxes = [broadphase.add(t, "thing", rng.uniform(5, 30), oy=rng.uniform(0, 10))
+             for t in things]
+    for _ in range(10):
+        lo = rng.uniform(-500, 400)
+        boxes.append(broadphase.add_solid(
+            Solid(lo, lo + 100, 0, 40, -500, 500)))
+
+    for _ in range(30):
+        pairs = found(broadphase)
+        assert pairs == brute_force(boxes)
+        for t in things:
+            t.x += rng.uniform(-20, 20)
+            t.z += rng.uniform(-20, 20)
+
+
+def test_static_pairs_are_skipped_and_removed_boxes_dropped():
+    broadphase = SweepAndPrune()
+    broadphase.add_solid(Solid(0, 10, 0, 10, 0, 10))
+    broadphase.add_solid(Solid(5, 15, 0, 10, 0, 10))
+    mario, coin = Thing(8, 5, 5), Thing(9, 5, 5)
+    broadphase.add(mario, "mario", 2)
+    broadphase.add(coin, "coin", 2)
+    kinds = sorted(tuple(sorted((a.kind, b.kind))) for a, b in broadphase.pairs())
+    assert kinds == [("coin", "mario"), ("coin", "wall"), ("coin", "wall"),
+                     ("mario", "wall"), ("mario", "wall")]
+
+    broadphase.remove(coin)
+    kinds = sorted(tuple(sorted((a.kind, b.kind))) for a, b in broadphase.pairs())
+    assert kinds == [("mario", "wall"), ("mario", "wall")]
+    assert all(b.obj is not coin for b in broadphase.boxes)
+
+
+def test_touching_boxes_count_as_overlapping():
+    broadphase = SweepAndPrune()
+    broadphase.add(Thing(0, 0, 0), "a", 5)
+    broadphase.add(Thing(10, 0, 0), "b", 5)
+    assert len(broadphase.pairs()) == 1
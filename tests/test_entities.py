@@ -0,0 +1,106 @@
+"""Entities and CollectiblePool, with numpy and with the plain-Python fallback."""
+
+import math
+
+import pytest
+
+from sm64engine import entities
+from sm64engine.entities import SLEEP_STRIDE, CollectiblePool, Entities, Entity
+
+
+@pytest.fixture(params=["numpy", "python"], autouse=True)
+def backend(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(entities, "np", None)
+    return request.param
+
+
+def row(*xs, y=20, z=0):
+    return [Entity(x, y, z) for x in xs]
+
+
+def test_collect_in_a_cylinder():
+    items = row(0, 30, 60) + [Entity(0, 100, 0)]
+    pool = CollectiblePool(items, radius=40, height=40)
+    assert pool.collect(0, 20, 0) == items[:2]      # 60 away; 80 above
+    assert len(pool) == 2
+    assert pool.dead() == {0, 1}
+    assert pool.collect(0, 20, 0) == []             # already collected
+
+
+def test_collect_in_a_sphere():
+    items = row(0, 30) + [Entity(30, 50, 0)]
+    pool = CollectiblePool(items, radius=40)
+    assert pool.collect(0, 20, 0) == items[:2]      # 30 up, 30 across: 42 > 40
+
+
+def test_collect_follows_entities_that_move():
+    items = row(0, 500)
+    pool = CollectiblePool(items, radius=40, height=40)
+    items[1].x = 10
+    items[0].z = 500
+    assert pool.collect(0, 20, 0) == [items[1]]
+
+
+def test_remove_and_iterate_live_items():
+    items = row(0, 100, 200, 300)
+    pool = CollectiblePool(items, radius=40)
+    pool.remove(items[1])
+    pool.kill(1)                                    # again: no-op
+    assert sorted(o.x for o in pool) == [0, 200, 300]
+    assert len(pool) == 3 and pool.dead() == {1}
+
+
+def test_animate_runs_the_system_on_awake_items_only():
+    items = row(0, 10000)
+    pool = CollectiblePool(items, radius=40, system=lambda e: e.spin(0.1),
+                           sleep_radius=1000)
+    for _ in range(10):
+        pool.animate(0, 0)
+    assert items[0].yaw == pytest.approx(1.0)
+    assert items[1].yaw == 0
+    assert pool.awake() == [items[0]]
+
+
+def test_sleepers_wake_where_they_would_have_been():
+    near, far = row(0, 5000, y=0)
+    store = Entities([near, far], sleep_radius=1000)
+    for _ in range(3 * SLEEP_STRIDE):
+        store.tick(0, 0)
+        store.bob(0.03, 0.5)
+    assert far.y == 0                               # asleep: untouched
+    for _ in range(SLEEP_STRIDE):                   # camera moves over to it
+        store.tick(5000, 0)
+        store.bob(0.03, 0.5)
+
+    def bobbed(ticks):
+        return sum(0.5 * math.sin(k * 0.03) for k in range(1, ticks + 1))
+    assert far.y == pytest.approx(bobbed(4 * SLEEP_STRIDE))
+    assert near.y == pytest.approx(bobbed(4 * SLEEP_STRIDE - 1))   # now asleep
+
+
+def test_sleeping_walkers_move_in_strides():
+    near, far = row(0, 5000, y=0)
+    for e in (near, far):
+        e.speed = 2
+    store = Entities([near, far], sleep_radius=1000)
+    for tick in range(1, 2 * SLEEP_STRIDE + 1):
+        store.tick(0, 0)
+        store.patrol(1.0, -10000, 10000)
+        if tick == SLEEP_STRIDE - 1:
+            assert far.x == 5000                    # waiting for its stride
+    assert near.x == 2 * 2 * SLEEP_STRIDE
+    assert far.x == 5000 + 2 * 2 * SLEEP_STRIDE     # same distance in total
+
+
+def test_killed_entities_never_wake():
+    items = row(0, 10)
+    store = Entities(items)
+    store.kill(items[0])
+    for _ in range(SLEEP_STRIDE + 1):
+        store.tick(0, 0)
+        store.spin(0.1)
+    assert store.awake_entities() == [items[1]]
+    assert items[0].yaw == 0
@@ -0,0 +1,70 @@
+"""FloorIndex finds the highest walkable surface under a point."""
+
+from random import Random
+
+import pytest
+
+
+def stack(hdr, *tops):
+    """Slabs 200 wide centred on the origin, their tops at ``tops``."""
+    mesh = hdr.Mesh()
+    for top in tops:
+        mesh.cube(200, 10, 200, 0, top - 5, 0, (0, 0, 0))
+    return mesh
+
+
+def test_stacked_floors(hdr):
+    floors = hdr.FloorIndex(stack(hdr, 0, 100, 200).surfaces)
+    assert floors.floor_at(0, 250, 0) == 200
+    assert floors.floor_at(0, 150, 0) == 100
+    assert floors.floor_at(0, 100, 0) == 100      # standing exactly on it
+    assert floors.floor_at(0, 50, 0) == 0
+    assert floors.floor_at(0, -10, 0) is None
+    assert floors.floor_at(500, 250, 0) is None   # outside every slab
+
+
+def test_sloped_floor(hdr):
+    mesh = hdr.Mesh()
+    mesh.wedge(100, 100, 200, 0, 0, 0, (0, 0, 0))   # rises 0 -> 100 along z
+    floors = hdr.FloorIndex(mesh.surfaces)
+    assert floors.floor_at(0, 1000, -100) == 0
+    assert floors.floor_at(0, 1000, 0) == 50
+    assert floors.floor_at(0, 1000, 50) == 75
+    assert floors.floor_at(0, 1000, 100) == 100
+    assert floors.floor_at(0, 40, 0) is None        # below the slope there
+
+
+def test_slope_under_a_ceiling_slab(hdr):
+    mesh = stack(hdr, 300)
+    mesh.wedge(100, 100, 200, 0, 0, 0, (0, 0, 0))
+    floors = hdr.FloorIndex(mesh.surfaces)
+    assert floors.floor_at(0, 299, 50) == 75
+    assert floors.floor_at(0, 300, 50) == 300
+
+
+@pytest.mark.parametrize("rise, climbs", [(10, True), (24, True), (25, False)])
+def test_step_height(hdr, rise, climbs):
+    """Level.floor_at steps Mario up onto anything within STEP_HEIGHT."""
+    assert hdr.STEP_HEIGHT == 24
+    level = hdr.Level("Steps", stack(hdr, 0, rise), [], [])
+    assert level.floor_at(0, 0, 0) == (rise if climbs else 0)
+
+
+def test_matches_a_linear_scan(hdr):
+    rng = Random(5)
+    mesh = hdr.Mesh()
+    for _ in range(200):
+        w, d = rng.uniform(20, 400), rng.uniform(20, 400)
+        x, y, z = rng.uniform(-800, 800), rng.uniform(-50, 600), rng.uniform(-800, 800)
+        if rng.random() < 0.3:
+            mesh.wedge(w, rng.uniform(10, 200), d, x, y, z, (0, 0, 0))
+        else:
+            mesh.cube(w, 10, d, x, y, z, (0, 0, 0))
+    floors = hdr.FloorIndex(mesh.surfaces)
+
+    for _ in range(2000):
+        x, y, z = rng.uniform(-900, 900), rng.uniform(-100, 900), rng.uniform(-900, 900)
+        heights = [hdr.surface_height(s, z) for s in mesh.surfaces
+                   if s[0] <= x <= s[1] and s[2] <= z <= s[3]]
+        below = [h for h in heights if h <= y]
+        assert floors.floor_at(x, y, z) == (max(below) if below else None)
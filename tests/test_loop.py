@@ -0,0 +1,51 @@
+"""FixedStep turns frame times into whole ticks, catching up and dropping."""
+
+import pytest
+
+from sm64engine import FixedStep
+
+DT = 1 / 8      # exact in binary, so tick counts are not at the mercy of rounding
+
+
+def test_first_frame_only_starts_the_clock():
+    step = FixedStep(8)
+    assert step.advance(100.0) == 0
+    assert step.ticks == 0 and step.frames == 1
+
+
+def test_one_tick_per_frame_at_the_tick_rate():
+    step = FixedStep(8)
+    step.advance(0.0)
+    for i in range(1, 9):
+        assert step.advance(i * DT) == 1
+    assert step.ticks == 8 and step.late_ticks == 0 and step.dropped_ticks == 0
+
+
+def test_slow_frame_catches_up_and_keeps_the_remainder():
+    step = FixedStep(8, max_steps=5)
+    step.advance(0.0)
+    assert step.advance(3.5 * DT) == 3
+    assert step.late_ticks == 2
+    assert step.alpha == pytest.approx(0.5)
+    assert step.advance(4 * DT) == 1       # the half tick carried over
+    assert step.alpha == pytest.approx(0.0)
+
+
+def test_long_stall_drops_ticks_past_the_cap():
+    step = FixedStep(8, max_steps=5)
+    step.advance(0.0)
+    assert step.advance(20 * DT) == 5
+    assert step.dropped_ticks == 15
+    assert step.late_ticks == 4
+    assert step.advance(21 * DT) == 1       # back to real time, not 15 behind
+    assert step.ticks == 6
+
+
+def test_pause_discards_the_time_away():
+    step = FixedStep(8)
+    step.advance(0.0)
+    step.advance(0.5 * DT)
+    step.pause()
+    assert step.advance(100.0) == 0
+    assert step.advance(100.0 + DT) == 1
+    assert step.dropped_ticks == 0
@@ -0,0 +1,30 @@
+"""Castle portals take Mario to their level and leave him there."""
+
+import collections
+
+
+def test_castle_portal_does_not_bounce_back(hdr):
+    levels = hdr.LevelRegistry(hdr.LEVEL_BUILDERS)     # built in memory, not baked
+    world = hdr.World(levels)
+    try:
+        world.mario.x, world.mario.z = -150, -248     # on the Bob-omb Battlefield portal
+        idle = collections.defaultdict(bool)
+        world.tick(idle)
+        assert world.level.name == "Bob-omb Battlefield"
+        # The spawn point lies inside the course's return portal
+        for _ in range(60):
+            world.tick(idle)
+        assert world.level.name == "Bob-omb Battlefield"
+    finally:
+        world.prefetch.stop()
+
+
+def test_place_counts_spawn_triggers_as_occupied(hdr):
+    grid = hdr.TriggerGrid()
+    portal = grid.add("portal", -120, 120, 380, 430)
+    grid.place(0, 0, 400)
+    assert grid.update(0, 5, 400) == (set(), set())
+    entered, exited = grid.update(0, 0, 500)
+    assert not entered and exited == {portal}
+    entered, _ = grid.update(0, 0, 400)
+    assert entered == {portal}
@@ -0,0 +1,58 @@
+"""LevelRegistry builds levels on demand and evicts the least recently visited."""
+
+BOB, WHOMP, JRB = "Bob-omb Battlefield", "Whomp's Fortress", "Jolly Roger Bay"
+
+
+def sizes(hdr, *names):
+    return [hdr.level_bytes(hdr.LEVEL_BUILDERS[n]()) for n in names]
+
+
+def test_levels_are_built_once_on_first_visit(hdr):
+    levels = hdr.LevelRegistry(hdr.LEVEL_BUILDERS)
+    assert not levels.is_resident(BOB)
+    level = levels.get(BOB)
+    assert level.name == BOB and levels.is_resident(BOB)
+    assert levels.get(BOB) is level
+    assert levels.builds == 1
+    assert levels.get("Nowhere") is None
+
+
+def test_least_recently_visited_level_is_evicted(hdr):
+    budget = sum(sizes(hdr, BOB, WHOMP, JRB)) - 1     # one of them must go
+    levels = hdr.LevelRegistry(hdr.LEVEL_BUILDERS, budget)
+    levels.get(BOB)
+    levels.get(WHOMP)
+    levels.get(BOB)             # Whomp's Fortress is now the oldest visit
+    levels.get(JRB)
+    assert list(levels.resident) == [BOB, JRB]
+    assert levels.evictions == 1
+
+
+def test_current_level_is_never_evicted(hdr):
+    levels = hdr.LevelRegistry(hdr.LEVEL_BUILDERS, budget=0)
+    levels.get(BOB)
+    assert levels.is_resident(BOB)
+    levels.load(WHOMP)          # preloaded, but BOB stays current
+    assert levels.is_resident(BOB) and levels.is_resident(WHOMP)
+    levels.get(JRB)
+    assert list(levels.resident) == [JRB]
+
+
+def test_collected_items_stay_collected_after_eviction(hdr):
+    levels = hdr.LevelRegistry(hdr.LEVEL_BUILDERS, budget=0)
+    level = levels.get(BOB)
+    coins, stars = len(level.coins), len(level.stars)
+    level.coins.kill(0)
+    level.coins.kill(3)
+    level.stars.kill(1)
+    levels.get(WHOMP)
+    assert not levels.is_resident(BOB)
+
+    rebuilt = levels.get(BOB)
+    assert rebuilt is not level and levels.builds == 3
+    assert rebuilt.coins.dead() == {0, 3}
+    assert rebuilt.stars.dead() == {1}
+    assert len(rebuilt.coins) == coins - 2 and len(rebuilt.stars) == stars - 1
+    # Nothing that was collected can be collected again
+    coin = rebuilt.coins.items[0]
+    assert coin not in rebuilt.coins.collect(coin.x, coin.y, coin.z)
@@ -0,0 +1,22 @@
+"""--bench --stress builds seeded levels and rejects kinds it doesn't know."""
+
+import pytest
+
+
+def test_stress_level_is_seeded(hdr):
+    a = hdr.make_stress_level("field", 200, seed=3)
+    b = hdr.make_stress_level("field", 200, seed=3)
+    assert hdr.level_cubes(a) == hdr.level_cubes(b)
+    assert [v.x for v in a.terrain.verts] == [v.x for v in b.terrain.verts]
+
+
+def test_unknown_stress_kind_raises(hdr):
+    with pytest.raises(ValueError, match="unknown stress kind 'forest'"):
+        hdr.make_stress_level("forest", 200)
+
+
+def test_bench_rejects_unknown_stress_kind(hdr, capsys):
+    assert hdr.run_benchmark(["--bench", "--stress", "field,forest"]) == 2
+    err = capsys.readouterr().err
+    assert "'forest'" in err
+    assert "field, city, tower, coins" in err